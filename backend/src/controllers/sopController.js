@@ -1,4 +1,5 @@
 const axios = require('axios');
+const { readArtifactText } = require('../services/artifactFiles');
 
 /**
  * Controller to handle SOP generation by proxying to the Python gen_service.
@@ -77,10 +78,12 @@ exports.handleGenerateSopBlended = async (req, res) => {
       return res.status(404).json({ message: `File ${filename} not found for org ${org_name}.` });
     }
     // Load and parse events
-    let raw = fs.readFileSync(filePath, 'utf8');
+    let raw = readArtifactText(filePath);
     let events;
     try {
-      events = JSON.parse(raw);
+      events = filename.endsWith('.ndjson')
+        ? raw.split('\n').filter((line) => line.trim()).map((line) => JSON.parse(line))
+        : JSON.parse(raw);
     } catch (e) {
       return res.status(500).json({ message: `Error parsing JSON: ${e.message}` });
     }
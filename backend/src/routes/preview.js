@@ -1,6 +1,7 @@
 const express = require('express');
 const fs = require('fs');
 const path = require('path');
+const { readArtifactText, writeArtifactText } = require('../services/artifactFiles');
 
 
 const router = express.Router();
@@ -20,7 +21,8 @@ router.get('/organizations', (req, res) => {
       return res.status(500).json({ error: 'Failed to read organizations' });
     }
     const organizations = entries
-      .filter((entry) => entry.isDirectory())
+      // Hidden directories (e.g. the .store of deduplicated artifacts) are not organizations
+      .filter((entry) => entry.isDirectory() && !entry.name.startsWith('.'))
       .map((entry) => entry.name);
     res.json({ organizations });
   });
@@ -43,13 +45,14 @@ router.get('/files/:org', (req, res) => {
 router.get('/preview/:org/:file', (req, res) => {
   const { org, file } = req.params;
   const filePath = path.join(generatedFilesDir, org, file);
-  fs.readFile(filePath, 'utf8', (err, data) => {
-    if (err) {
-      console.error(`Error reading file ${filePath}:`, err);
-      return res.status(500).json({ error: 'Failed to read file' });
-    }
-    res.json({ content: data });
-  });
+  let data;
+  try {
+    data = readArtifactText(filePath);
+  } catch (err) {
+    console.error(`Error reading file ${filePath}:`, err);
+    return res.status(500).json({ error: 'Failed to read file' });
+  }
+  res.json({ content: data });
 });
 
 // Save updated file content
@@ -57,7 +60,7 @@ router.post('/preview/:org/:file', (req, res) => {
   const { org, file } = req.params;
   const content = req.body.content;
   const filePath = path.join(generatedFilesDir, org, file);
-  fs.writeFile(filePath, content, 'utf8', (err) => {
+  writeArtifactText(filePath, content, (err) => {
     if (err) {
       console.error(`Error writing file ${filePath}:`, err);
       return res.status(500).json({ error: 'Failed to write file' });
@@ -70,11 +73,16 @@ router.post('/preview/:org/:file', (req, res) => {
 router.get('/download/:org/:file', (req, res) => {
   const { org, file } = req.params;
   const filePath = path.join(generatedFilesDir, org, file);
-  res.download(filePath, file, (err) => {
-    if (err) {
-      console.error(`Error downloading file ${filePath}:`, err);
-    }
-  });
+  let content;
+  try {
+    // Decompresses artifacts the Python service stored compressed
+    content = readArtifactText(filePath);
+  } catch (err) {
+    console.error(`Error downloading file ${filePath}:`, err);
+    return res.status(404).json({ error: 'File not found' });
+  }
+  res.attachment(file);
+  res.send(content);
 });
 
 // Export events JSON as a Postman collection, preserving routing_key and timing metadata
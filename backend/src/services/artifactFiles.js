@@ -0,0 +1,31 @@
+const fs = require('fs');
+const zlib = require('zlib');
+
+/**
+ * Read a generated artifact as UTF-8 text. The Python service can store artifacts
+ * gzip-compressed (ARTIFACT_COMPRESSION=gzip); those are decompressed transparently.
+ */
+exports.readArtifactText = (filePath) => {
+  const buffer = fs.readFileSync(filePath);
+  if (buffer.length >= 2 && buffer[0] === 0x1f && buffer[1] === 0x8b) {
+    return zlib.gunzipSync(buffer).toString('utf8');
+  }
+  if (buffer.length >= 4 && buffer.readUInt32LE(0) === 0xfd2fb528) {
+    throw new Error(`${filePath} is zstd-compressed; use ARTIFACT_COMPRESSION=gzip to share files with the backend.`);
+  }
+  return buffer.toString('utf8');
+};
+
+/**
+ * Replace an artifact atomically (temporary file + rename). Identical artifacts share
+ * one hard-linked file, so they must never be rewritten in place.
+ */
+exports.writeArtifactText = (filePath, content, callback) => {
+  const tmpPath = `${filePath}.part`;
+  fs.writeFile(tmpPath, content, 'utf8', (err) => {
+    if (err) {
+      return callback(err);
+    }
+    fs.rename(tmpPath, filePath, callback);
+  });
+};
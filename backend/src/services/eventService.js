@@ -1,4 +1,5 @@
 const axios = require('axios');
+const { readArtifactText } = require('./artifactFiles');
 // Template engine and faker support
 const { faker } = require('@faker-js/faker');
 // Ensure faker.datatype.uuid() alias for backward compatibility
@@ -16,10 +17,13 @@ exports.loadEvents = async (organization, filename) => {
   // This function should mimic your previous file-based approach
   // and parse the events JSON.
   // Example:
-  const fs = require('fs');
   const path = require('path');
   const filePath = path.join(__dirname, '..', '..', 'generated_files', organization, filename);
-  const content = fs.readFileSync(filePath, 'utf-8').trim();
+  const raw = readArtifactText(filePath).trim();
+  // NDJSON event files (one event object per line) are joined into an array first
+  const content = filename.endsWith('.ndjson')
+    ? `[${raw.split('\n').filter((line) => line.trim()).join(',')}]`
+    : raw;
 
   // Basic cleanup (improve as needed)
   const start_index = content.indexOf('[');
@@ -97,7 +97,7 @@ const Diagnostics = () => {
   };
 
   // Filter JSON files matching selected scenario
-  const allJsonFiles = files.filter(f => f.toLowerCase().endsWith('.json'));
+  const allJsonFiles = files.filter(f => /\.n?json$/i.test(f));
   const scenarioJsonFiles = selectedScenario
     ? allJsonFiles.filter(f => f.startsWith(`${selectedScenario}_`))
     : [];
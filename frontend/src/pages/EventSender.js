@@ -214,7 +214,7 @@ const EventSender = () => {
             {files
               .filter((file) => {
                 const f = file.toLowerCase();
-                return f.endsWith('.json') && f.includes('events') && !f.includes('change');
+                return (f.endsWith('.json') || f.endsWith('.ndjson')) && f.includes('events') && !f.includes('change');
               })
               .map((file) => (
                 <option key={file} value={file}>{formatFileLabel(file)}</option>
@@ -313,7 +313,7 @@ const EventSender = () => {
             {files
               .filter((file) => {
                 const f = file.toLowerCase();
-                return f.endsWith('.json') && f.includes('change_events');
+                return (f.endsWith('.json') || f.endsWith('.ndjson')) && f.includes('change_events');
               })
               .map((file) => (
                 <option key={file} value={file}>{formatFileLabel(file)}</option>
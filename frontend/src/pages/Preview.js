@@ -113,7 +113,7 @@ const Preview = () => {
               Download
             </button>
             {/* Export events JSON as Postman collection */}
-            {selectedFile.toLowerCase().endsWith('.json') && (
+            {/\.n?json$/i.test(selectedFile) && (
               <button
                 className="btn btn-info ml-2"
                 onClick={() =>
@@ -120,7 +120,7 @@ const SopGenerator = () => {
   };
 
   // Filter JSON event files
-  const jsonFiles = files.filter(f => f.toLowerCase().endsWith('.json'));
+  const jsonFiles = files.filter(f => /\.n?json$/i.test(f));
 
   return (
     <div>
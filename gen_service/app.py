@@ -1,29 +1,151 @@
-from flask import Flask, render_template, request, send_from_directory, redirect, url_for, make_response
+from flask import Flask, render_template, request, send_from_directory, send_file, redirect, url_for, make_response, Response, stream_with_context, g
 import json
-from event_sender import event_sender, get_files, event_sender_summary, event_sender_send, load_event_file, PAGERDUTY_API_URL
-from sop_generator import generate_sop, generate_sop_blended
+from event_sender import event_sender, get_files, event_sender_summary, event_sender_send
+from sop_generator import generate_sop, generate_sop_blended, stream_sop, stream_sop_blended
 from diagnostic_generator import generate_diagnostics
+from sop_prefetch import sop_prefetcher
+import io
 import os
 import datetime
+import unicodedata
+from urllib.parse import quote
 import utils
-from generators.custom_generator import generate_custom
+from generators.custom_generator import generate_custom, stream_custom
+from structured_output import parse_json_output, JSONStringFieldStreamer
+from postman_export import iter_collection, rendered_events, export_key, postman_cache
+from org_bundle import iter_org_zip
+from http_cache import conditional, strip_encoded_etags, finalize_response
+from scenario_files import generate_scenario_files, record_scenario_builds, sanitize_org
+from event_model import dumps_events, as_dict
+from event_files import read_events, iter_events, write_events_file, events_extension, encode_events, format_of, is_event_file, FORMAT_EXTENSIONS
+from event_offsets import read_event_slice, read_event, project, PREVIEW_PAGE_SIZE, PREVIEW_MAX_PAGE_SIZE
+from retry_policy import DeadlineExceeded, enter_deadline, exit_deadline
+from llm_limiter import LLMOverloaded, BATCH, INTERACTIVE, enter_llm_context, exit_llm_context, limiter
+from task_profiles import output_stats
+from sop_cache import sop_cache
+from event_cache import event_cache
+from artifact_index import get_index
+from artifact_graph import get_graph
+from artifact_store import write_text, read_text, compression_of, store_stats
+from artifact_retention import get_compactor, RetentionPolicy
 
 app = Flask(__name__)
 # Store generated files in the backend service directory so they are shared
 backend_gen_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'generated_files'))
 app.config['GENERATED_FOLDER'] = backend_gen_dir
-app.add_url_rule('/get_files/<org>', 'get_files', get_files)
+
+def generated_path(*parts):
+    return os.path.join(app.config['GENERATED_FOLDER'], *parts)
+
+def set_attachment(resp, filename):
+    """Mark a response as a download of filename, quoted (RFC 5987-encoded when not ASCII) as send_file does."""
+    try:
+        filename.encode('ascii')
+        resp.headers.set('Content-Disposition', 'attachment', filename=filename)
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        resp.headers.set('Content-Disposition', 'attachment', filename=fallback,
+                         **{'filename*': "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")})
+    return resp
+
+# Listings and previews are revalidated from directory / file metadata (see http_cache)
+app.add_url_rule('/get_files/<org>', 'get_files', conditional(lambda org: [generated_path(org)])(get_files))
 app.add_url_rule('/event_sender', 'event_sender', event_sender, methods=['GET', 'POST'])
 app.add_url_rule('/event_sender/summary', 'event_sender_summary', event_sender_summary, methods=['POST'])
 app.add_url_rule('/event_sender/send', 'event_sender_send', event_sender_send, methods=['POST'])
 
+# Bulk generation endpoints are scheduled behind interactive ones for LLM capacity
+BATCH_ENDPOINTS = {'index', 'api_generate', 'api_generate_change_events', 'api_generate_diagnostics',
+                   'api_artifacts_rebuild_stale'}
+
+def request_org():
+    """Best-effort organization of the current request, used for fair LLM scheduling."""
+    data = request.get_json(silent=True) if request.is_json else None
+    org = (data or {}).get('org_name') if isinstance(data, dict) else None
+    org = org or request.form.get('org_name') or request.form.get('organization')
+    return sanitize_org(org) if org else None
+
+app.before_request(strip_encoded_etags)
+app.after_request(finalize_response)
+
+@app.before_request
+def start_llm_deadline():
+    # Every LLM call made while serving this request shares one overall deadline
+    g.llm_deadline_token = enter_deadline()
+    priority = BATCH if request.endpoint in BATCH_ENDPOINTS else INTERACTIVE
+    g.llm_context_tokens = enter_llm_context(priority=priority, org=request_org())
+
+@app.teardown_request
+def end_llm_deadline(exc=None):
+    token = g.pop('llm_deadline_token', None)
+    context_tokens = g.pop('llm_context_tokens', None)
+    try:
+        if context_tokens:
+            exit_llm_context(context_tokens)
+        if token is not None:
+            exit_deadline(token)
+    except ValueError:
+        # Tokens were created in a different context (e.g. streamed response)
+        pass
+
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(e):
+    app.logger.error(f"LLM deadline exceeded: {e}")
+    return {"message": "Generation timed out. Please retry."}, 504
+
+@app.errorhandler(LLMOverloaded)
+def handle_llm_overloaded(e):
+    # Shed load quickly instead of letting every queued request time out
+    app.logger.warning(f"Rejecting request, LLM capacity exhausted: {e}")
+    return {"message": "Generation capacity is saturated. Please retry later."}, 503, {"Retry-After": str(e.retry_after)}
+
 # Ensure the main generated_files folder exists
 if not os.path.exists(app.config['GENERATED_FOLDER']):
     os.makedirs(app.config['GENERATED_FOLDER'])
 
-def sanitize_org(org_name):
-    # Basic sanitization: remove spaces and non-alphanumeric characters
-    return "".join(c for c in org_name if c.isalnum())
+def artifact_index():
+    return get_index(app.config['GENERATED_FOLDER'])
+
+def index_artifacts(*paths):
+    """Record freshly written files in the artifact index (missing paths are dropped from it)."""
+    index = artifact_index()
+    for path in paths:
+        try:
+            index.record(path)
+        except Exception as e:
+            app.logger.warning(f"Could not index {path}: {e}")
+
+def artifact_graph():
+    return get_graph(app.config['GENERATED_FOLDER'])
+
+def schedule_sop_prefetch(events):
+    """Queue background SOP generation for freshly generated events (no-op unless enabled)."""
+    if not sop_prefetcher.enabled or not events:
+        return
+    queued = sop_prefetcher.schedule([as_dict(ev) for ev in events])
+    if queued:
+        app.logger.info(f"Queued {queued} SOPs for background prefetch")
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message with a JSON-encoded data field."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_error(e, message):
+    """SSE error event; carries retry_after when LLM capacity is saturated."""
+    data = {'message': message}
+    if isinstance(e, LLMOverloaded):
+        data = {'message': 'Generation capacity is saturated. Please retry later.', 'retry_after': e.retry_after}
+    return sse_event('error', data)
+
+# Sent instead of `done` when the model produced no SOP text even after retrying
+EMPTY_SOP_MESSAGE = 'The model returned an empty SOP. Please retry.'
+
+def sse_response(events):
+    """Wrap a generator of SSE messages in a non-buffered event-stream response."""
+    resp = Response(stream_with_context(events), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -47,6 +169,15 @@ def index():
             elif scenario == 'well':
                 service_names = "Storage"
         
+        # Create a subdirectory for the organization (sanitize org name)
+        org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
+        if not os.path.exists(org_folder):
+            os.makedirs(org_folder)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        # Events are streamed straight into this file by the event generators
+        events_filename = f"{scenario}_events_{timestamp}{events_extension()}"
+        events_path = os.path.join(org_folder, events_filename)
+
         # Generate narrative content and events based on the selected scenario
         if scenario == 'major':
             # Get structured narrative with summary, details, and context
@@ -57,14 +188,10 @@ def index():
             outage_summary = result['outage_summary']
             incident_details = result['incident_details']
             # Generate incident events and change events
-            events = utils.generate_major_events(
-                org_name, api_key, itsm_tools, observability_tools,
+            events, change_events = utils.generate_scenario_events(
+                'major', org_name, api_key, itsm_tools, observability_tools,
                 outage_summary, service_names, incident_details,
-                unique_alerts, max_events
-            )
-            change_events = utils.generate_major_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
+                unique_alerts, max_events, output_path=events_path
             )
         elif scenario == 'partial':
             # Generate structured narrative and root-cause change event for partial scenario
@@ -74,15 +201,11 @@ def index():
             narrative = result['narrative']
             outage_summary = result['outage_summary']
             incident_details = result['incident_details']
-            # Generate incident events and one change event representing the root cause
-            events = utils.generate_partial_events(
-                org_name, api_key, itsm_tools, observability_tools,
+            # Generate incident events and change events
+            events, change_events = utils.generate_scenario_events(
+                'partial', org_name, api_key, itsm_tools, observability_tools,
                 outage_summary, service_names, incident_details,
-                unique_alerts, max_events
-            )
-            change_events = utils.generate_partial_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
+                unique_alerts, max_events, output_path=events_path
             )
         elif scenario == 'well':
             # Generate structured narrative, events, and root-cause change event for well-understood scenario
@@ -92,48 +215,44 @@ def index():
             narrative = result['narrative']
             outage_summary = result['outage_summary']
             incident_details = result['incident_details']
-            # Generate incident events
-            events = utils.generate_well_events(
-                org_name, api_key, itsm_tools, observability_tools,
+            # Generate incident events and change events
+            events, change_events = utils.generate_scenario_events(
+                'well', org_name, api_key, itsm_tools, observability_tools,
                 outage_summary, service_names, incident_details,
-                unique_alerts, max_events
-            )
-            # Generate change event for automated remediation
-            change_events = utils.generate_well_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
+                unique_alerts, max_events, output_path=events_path
             )
         else:
             narrative = "Invalid scenario selected."
-            events = ""
-        
-        # Create a subdirectory for the organization (sanitize org name)
-        org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
-        if not os.path.exists(org_folder):
-            os.makedirs(org_folder)
+            events = []
         
         # Save narrative content to a file with a timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         narrative_filename = f"{scenario}_{timestamp}.txt"
         narrative_path = os.path.join(org_folder, narrative_filename)
-        with open(narrative_path, 'w') as f:
-            f.write(narrative)
+        write_text(narrative_path, narrative)
         
-        # Save events content to a separate file (JSON)
-        events_filename = f"{scenario}_events_{timestamp}.json"
-        events_path = os.path.join(org_folder, events_filename)
-        with open(events_path, 'w') as f:
-            f.write(events)
+        # Events file was written by the generator; save it here only if it was not
+        if events and not os.path.exists(events_path):
+            write_events_file(events_path, events)
+        schedule_sop_prefetch(events)
+        outputs = [('events', events_filename)]
         # If major, partial, or well-understood scenario, also save change events
         if scenario in ('major', 'partial', 'well'):
-            change_filename = f"{scenario}_change_events_{timestamp}.json"
+            change_filename = f"{scenario}_change_events_{timestamp}{events_extension()}"
             change_path = os.path.join(org_folder, change_filename)
             try:
-                with open(change_path, 'w') as cf:
-                    cf.write(change_events)
+                write_events_file(change_path, change_events)
             except NameError:
                 # change_events not generated
                 pass
+            index_artifacts(change_path)
+            outputs.append(('change_events', change_filename))
+            record_scenario_builds(org_folder, narrative_filename, outputs, {
+                'scenario': scenario, 'org_name': org_name, 'itsm_tools': itsm_tools,
+                'observability_tools': observability_tools, 'service_names': service_names,
+                'outage_summary': outage_summary, 'incident_details': incident_details,
+                'unique_alerts': unique_alerts, 'max_events': max_events,
+            })
+        index_artifacts(narrative_path, events_path)
         
         # Redirect to the preview page for this organization (listing all files)
         return redirect(url_for('preview_org', org=sanitize_org(org_name)))
@@ -141,57 +260,138 @@ def index():
     return render_template('index.html')
 
 @app.route('/preview/<org>/', methods=['GET'])
+@conditional(lambda org: [generated_path(org)])
 def preview_org(org):
-    # List all files for the organization subdirectory
-    org_folder = os.path.join(app.config['GENERATED_FOLDER'], org)
-    if not os.path.exists(org_folder):
-        files = []
-    else:
-        files = os.listdir(org_folder)
+    # List all files for the organization subdirectory (newest first, from the artifact index)
+    files = artifact_index().filenames(org)
     return render_template('preview.html', selected_org=org, files=files)
 
 @app.route('/preview/', methods=['GET'])
+@conditional(lambda: [generated_path()])
 def preview_orgs():
     # List all organization folders in the generated_files directory
-    orgs = []
-    base_dir = app.config['GENERATED_FOLDER']
-    if os.path.exists(base_dir):
-        for entry in os.listdir(base_dir):
-            path = os.path.join(base_dir, entry)
-            if os.path.isdir(path):
-                orgs.append(entry)
+    orgs = artifact_index().organizations()
     return render_template('preview.html', organizations=orgs)
 
 @app.route('/preview/<org>/<filename>', methods=['GET', 'POST'])
+@conditional(lambda org, filename: [generated_path(org, filename)])
 def preview_file(org, filename):
     file_path = os.path.join(app.config['GENERATED_FOLDER'], org, filename)
     # Handle edits
     if request.method == 'POST':
         edited_content = request.form.get('edited_content')
-        with open(file_path, 'w') as f:
-            f.write(edited_content)
+        write_text(file_path, edited_content)
+        event_cache.invalidate(file_path)
+        index_artifacts(file_path)
         return redirect(url_for('preview_file', org=org, filename=filename))
-    # On GET, load and cleanup JSON if needed
-    content = ''
-    if filename.lower().endswith('.json'):
-        try:
-            # Use load_event_file to parse and clean malformed JSON array
-            data = load_event_file(org, filename)
-            # Format JSON for preview (do not overwrite original file)
-            content = json.dumps(data, indent=2)
-        except Exception:
-            # Fallback to raw content
-            with open(file_path, 'r') as f:
-                content = f.read()
-    else:
-        with open(file_path, 'r') as f:
-            content = f.read()
+    # Event files are paged in by the browser (see api_preview_events); the full text is
+    # only loaded into the editor on request, so large files open instantly
+    if is_event_file(filename):
+        return render_template('preview.html', selected_org=org, selected_file=filename, paged=True,
+                               page_size=PREVIEW_PAGE_SIZE)
+    content = read_text(file_path)
     return render_template('preview.html', selected_org=org, selected_file=filename, content=content)
 
+def preview_event_path(org, filename):
+    """Path of an event file for the preview APIs, or (None, error_response)."""
+    file_path = os.path.join(app.config['GENERATED_FOLDER'], org, filename)
+    if not os.path.isfile(file_path):
+        return None, ({'message': f'File {filename} not found for org {org}.'}, 404)
+    if not is_event_file(filename):
+        return None, ({'message': f'{filename} is not an event file.'}, 400)
+    return file_path, None
+
+def preview_fields():
+    # ?fields=payload.summary,payload.severity (or repeated ?fields=...)
+    return [field.strip() for value in request.args.getlist('fields') for field in value.split(',') if field.strip()]
+
+@app.route('/api/preview/<org>/<filename>/events', methods=['GET'])
+@conditional(lambda org, filename: [generated_path(org, filename)])
+def api_preview_events(org, filename):
+    """
+    A page of an event file: ?offset (default 0), ?limit (default PREVIEW_PAGE_SIZE, at most
+    PREVIEW_MAX_PAGE_SIZE) and optional ?fields projection. Served from the file's offset
+    index, so the cost depends on the page size, not the file size.
+    """
+    file_path, error = preview_event_path(org, filename)
+    if error:
+        return error
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(0, request.args.get('limit', PREVIEW_PAGE_SIZE, type=int)), PREVIEW_MAX_PAGE_SIZE)
+    events, total = read_event_slice(file_path, offset, limit)
+    fields = preview_fields()
+    return {
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'events': [project(ev, fields) if isinstance(ev, dict) else ev for ev in events],
+    }, 200
+
+@app.route('/api/preview/<org>/<filename>/events/<int:index>', methods=['GET'])
+@conditional(lambda org, filename, index: [generated_path(org, filename)])
+def api_preview_event(org, filename, index):
+    """One event of an event file by index, with optional ?fields projection."""
+    file_path, error = preview_event_path(org, filename)
+    if error:
+        return error
+    try:
+        event = read_event(file_path, index)
+    except IndexError:
+        return {'message': f'event index {index} out of range.'}, 404
+    return {'index': index, 'event': project(event, preview_fields()) if isinstance(event, dict) else event}, 200
+
 @app.route('/download/<org>/<filename>')
+@conditional(lambda org, filename: [generated_path(org, filename)])
 def download(org, filename):
+    """
+    Download a generated file. For event files, ?format=json|ndjson converts between the
+    legacy array and NDJSON formats on the fly (streamed event by event). Files stored
+    compressed are sent decompressed.
+    """
     directory = os.path.join(app.config['GENERATED_FOLDER'], org)
-    return send_from_directory(directory, filename, as_attachment=True)
+    fmt = request.args.get('format', '').lower()
+    file_path = os.path.join(directory, filename)
+    if fmt not in FORMAT_EXTENSIONS or fmt == format_of(filename) or not os.path.isfile(file_path):
+        if os.path.isfile(file_path) and compression_of(file_path):
+            return send_file(io.BytesIO(read_text(file_path).encode('utf-8')), mimetype='application/octet-stream',
+                             as_attachment=True, download_name=filename)
+        return send_from_directory(directory, filename, as_attachment=True)
+    download_name = os.path.splitext(filename)[0] + FORMAT_EXTENSIONS[fmt]
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    resp = Response(stream_with_context(encode_events(iter_events(file_path), fmt)), mimetype=mimetype)
+    set_attachment(resp, download_name)
+    return resp
+
+@app.route('/download/<org>.zip')
+def download_org(org):
+    """
+    Stream a zip of an org's artifacts, built while it is sent. Optional filters as in
+    /api/artifacts: kind (repeatable), scenario, q (filename substring), plus file
+    (repeatable) to pick exact files. ?format=json|ndjson converts event files, and
+    ?postman=1 adds a Postman collection per event file (?render=1 / ?seed=N as in the export).
+    """
+    if not os.path.isdir(os.path.join(app.config['GENERATED_FOLDER'], org)):
+        return {'message': f'Organization {org} not found.'}, 404
+    artifacts = artifact_index().search(
+        org=org,
+        kinds=request.args.getlist('kind') or None,
+        scenario=request.args.get('scenario') or None,
+        text=request.args.get('q') or None,
+    )
+    selected = set(request.args.getlist('file'))
+    if selected:
+        artifacts = [artifact for artifact in artifacts if artifact['filename'] in selected]
+    fmt = request.args.get('format', '').lower()
+    chunks = iter_org_zip(
+        app.config['GENERATED_FOLDER'], org, artifacts,
+        event_format=fmt if fmt in FORMAT_EXTENSIONS else None,
+        postman=request.args.get('postman', '0').lower() in ('1', 'true', 'yes'),
+        render=request.args.get('render', '0').lower() in ('1', 'true', 'yes'),
+        seed=request.args.get('seed', type=int),
+    )
+    resp = Response(stream_with_context(chunks), mimetype='application/zip')
+    set_attachment(resp, f'{org}_artifacts.zip')
+    return resp
 
 # New API endpoint for generation (supports multiple scenarios)
 @app.route('/api/generate', methods=['POST'])
@@ -226,6 +426,8 @@ def api_generate():
     symptom = data.get('symptom')
     root_cause = data.get('root_cause')
     max_events = data.get('max_events')
+    # Optional seed making locally expanded high-volume event files reproducible
+    seed = data.get('seed')
     # Ensure output directory exists
     org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
     os.makedirs(org_folder, exist_ok=True)
@@ -236,121 +438,24 @@ def api_generate():
     change_events_map = {}
 
     for scenario in scenarios:
-        # Determine service_names for this scenario
-        if not user_services:
-            if scenario == 'major':
-                service_names = "User Authentication, API Nodes, Payment Processing"
-            elif scenario == 'partial':
-                service_names = "API Nodes, Database"
-            elif scenario == 'well':
-                service_names = "Storage"
-            else:
-                # Skip unknown scenario
-                continue
-        else:
-            service_names = user_services
-
-        # Generate narrative (structured JSON) and events
-        if scenario == 'major':
-            structured = utils.generate_major(
-                org_name, api_key, itsm_tools, observability_tools, service_names,
-                symptom, root_cause
-            )
-            narrative = structured['narrative']
-            outage_summary = structured['outage_summary']
-            incident_details = structured['incident_details']
-            events = utils.generate_major_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-            # Generate change events for major scenario
-            change_events = utils.generate_major_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-        elif scenario == 'partial':
-            # Generate structured narrative and root-cause change event for partial scenario
-            structured = utils.generate_partial(
-                org_name, api_key, itsm_tools, observability_tools, service_names,
-                symptom, root_cause
-            )
-            narrative = structured['narrative']
-            outage_summary = structured['outage_summary']
-            incident_details = structured['incident_details']
-            # Generate incident events
-            events = utils.generate_partial_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-            # Generate one change event for the ultimate root cause
-            change_events = utils.generate_partial_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-        elif scenario == 'well':
-            # Generate structured narrative, events, and change event for well-understood scenario
-            structured = utils.generate_well(
-                org_name, api_key, itsm_tools, observability_tools, service_names,
-                symptom, root_cause
-            )
-            narrative = structured['narrative']
-            outage_summary = structured['outage_summary']
-            incident_details = structured['incident_details']
-            # Generate incident events
-            events = utils.generate_well_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-            # Generate change event for automated remediation
-            change_events = utils.generate_well_change_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-        elif scenario == 'custom':
-            # Generate structured narrative based on custom overrides
-            # symptom and blast_radius may be provided in request body
-            symptom = data.get('symptom')
-            blast_radius = data.get('blast_radius')
-            structured = generate_custom(
-                org_name, api_key, itsm_tools, observability_tools,
-                service_names, symptom, blast_radius
-            )
-            narrative = structured.get('narrative')
-            outage_summary = structured.get('outage_summary')
-            incident_details = structured.get('incident_details')
-            # Generate events using major scenario template as fallback
-            events = utils.generate_major_events(
-                org_name, api_key, itsm_tools, observability_tools,
-                outage_summary, service_names, incident_details
-            )
-        else:
-            # Unknown scenario; skip
+        # Narrative, events and change events are written, indexed and recorded as builds
+        generated = generate_scenario_files(
+            org_folder, org_name, scenario, api_key, itsm_tools=itsm_tools,
+            observability_tools=observability_tools, service_names=user_services,
+            symptom=symptom, root_cause=root_cause, blast_radius=data.get('blast_radius'),
+            max_events=max_events, seed=seed, timestamp=timestamp,
+        )
+        if generated is None:
+            # Unknown scenario (or custom without service names); skip
             continue
+        schedule_sop_prefetch(generated['events'])
 
-        # Save narrative file
-        narrative_filename = f"{scenario}_{timestamp}.txt"
-        narrative_path = os.path.join(org_folder, narrative_filename)
-        with open(narrative_path, 'w') as f:
-            f.write(narrative)
-
-        # Save events file
-        events_filename = f"{scenario}_events_{timestamp}.json"
-        events_path = os.path.join(org_folder, events_filename)
-        with open(events_path, 'w') as f:
-            f.write(events)
-        # Save change events for major, partial, or well-understood scenario
-        if scenario in ('major', 'partial', 'well'):
-            change_filename = f"{scenario}_change_events_{timestamp}.json"
-            change_path = os.path.join(org_folder, change_filename)
-            with open(change_path, 'w') as cf:
-                cf.write(change_events)
-
-        # Collect in-memory outputs
-        narratives[scenario] = narrative
-        events_map[scenario] = events
+        # Collect in-memory outputs (the API returns events as JSON strings)
+        narratives[scenario] = generated['narrative']
+        events_map[scenario] = dumps_events(generated['events'])
         # Include change events for major, partial, and well-understood scenarios
-        if scenario in ('major', 'partial', 'well'):
-            change_events_map[scenario] = change_events
+        if generated['change_events'] is not None:
+            change_events_map[scenario] = dumps_events(generated['change_events'])
 
     result = {
         "message": f"Scenarios generated for organization: {org_name}",
@@ -397,21 +502,74 @@ def api_generate_custom():
             symptom,
             blast_radius
         )
+    except (LLMOverloaded, DeadlineExceeded):
+        # Handled by the app-level 503/504 error handlers
+        raise
     except Exception as e:
         app.logger.error(f"Error generating custom scenario: {e}")
         return {"message": "Error generating custom scenario."}, 500
     narrative = structured.get('narrative')
     if not narrative:
         return {"message": "No narrative returned from generator."}, 500
-    # Save narrative to a file
+    filename = save_custom_narrative(org_name, narrative)
+    return {"filename": filename}, 200
+
+def save_custom_narrative(org_name, narrative):
+    """Save a custom narrative under the org folder and return its filename."""
     org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
     os.makedirs(org_folder, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"custom_{timestamp}.txt"
     filepath = os.path.join(org_folder, filename)
-    with open(filepath, 'w') as f:
-        f.write(narrative)
-    return {"filename": filename}, 200
+    write_text(filepath, narrative)
+    index_artifacts(filepath)
+    return filename
+
+@app.route('/generate/custom/stream', methods=['POST'])
+def api_generate_custom_stream():
+    """
+    Streaming variant of /generate/custom over Server-Sent Events.
+    Emits `chunk` events with narrative text as it is generated, then a `done`
+    event with the saved filename and parsed result (or an `error` event).
+    """
+    data = request.get_json() or {}
+    org_name = data.get('org_name')
+    if not org_name:
+        return {"message": "Organization name is required."}, 400
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return {"message": "Server misconfiguration: missing API key."}, 500
+    chunks = stream_custom(
+        org_name,
+        api_key,
+        data.get('itsm_tools'),
+        data.get('observability_tools'),
+        data.get('service_names'),
+        data.get('symptom'),
+        data.get('blast_radius')
+    )
+
+    def generate():
+        parts = []
+        narrative_stream = JSONStringFieldStreamer('narrative')
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                text = narrative_stream.feed(chunk)
+                if text:
+                    yield sse_event('chunk', {'text': text})
+            structured = parse_json_output("".join(parts), expect=dict)
+            narrative = structured.get('narrative')
+            if not narrative:
+                yield sse_event('error', {'message': 'No narrative returned from generator.'})
+                return
+            filename = save_custom_narrative(org_name, narrative)
+            yield sse_event('done', {'filename': filename, 'result': structured})
+        except Exception as e:
+            app.logger.error(f"Error streaming custom scenario: {e}")
+            yield sse_error(e, 'Error generating custom scenario.')
+
+    return sse_response(generate())
 
 
 @app.route('/api/generate_change_events', methods=['POST'])
@@ -483,121 +641,167 @@ def api_generate_change_events():
     org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
     os.makedirs(org_folder, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"{scenario}_change_events_{timestamp}.json"
+    filename = f"{scenario}_change_events_{timestamp}{events_extension()}"
     filepath = os.path.join(org_folder, filename)
-    with open(filepath, 'w') as f:
-        f.write(change_events)
+    write_events_file(filepath, change_events)
+    index_artifacts(filepath)
+    change_events_json = dumps_events(change_events)
 
-    return {"filename": filename, "change_events": change_events}, 200
+    return {"filename": filename, "change_events": change_events_json}, 200
 
 @app.route('/preview/<org>/<filename>/postman', methods=['GET'])
 def export_postman(org, filename):
-    """Export the events JSON as a Postman collection."""
+    """
+    Export the events JSON as a Postman collection, streamed item by item.
+    Placeholders are kept as is unless ?render=1 renders them to concrete values; ?seed=N
+    makes the rendered values reproducible. Reproducible exports (raw, or rendered with a
+    seed) are cached per source content and carry an
+    ETag, so repeat downloads are answered from the cache or with 304 Not Modified.
+    """
     file_path = os.path.join(app.config['GENERATED_FOLDER'], org, filename)
-    # Load and parse JSON
-    try:
-        with open(file_path, 'r') as f:
-            raw = f.read()
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            data = load_event_file(org, filename)
-    except Exception as e:
-        return f"Error reading file: {e}", 500
-    if not isinstance(data, list):
-        data = [data]
-    # Build Postman collection
-    collection = {
-        "info": {
-            "name": f"{org}_{filename} Postman Collection",
-            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
-        },
-        "item": []
-    }
-    for idx, ev in enumerate(data):
-        # Prepare body, inject routing key variable
-        body_obj = dict(ev)
-        body_obj['routing_key'] = '{{routing_key}}'
-        body_str = json.dumps(body_obj, indent=2)
-        # Derive name
-        name = None
-        if isinstance(ev, dict) and isinstance(ev.get('payload'), dict):
-            name = ev['payload'].get('summary')
-        if not name:
-            name = f"Event {idx+1}"
-        # Append request item
-        collection['item'].append({
-            "name": name,
-            "request": {
-                "method": "POST",
-                "header": [{"key": "Content-Type", "value": "application/json"}],
-                "body": {"mode": "raw", "raw": body_str},
-                "url": {"raw": PAGERDUTY_API_URL, "protocol": "https", "host": ["events.pagerduty.com"], "path": ["v2", "enqueue"]}
-            }
-        })
-    # Return as downloadable JSON
-    resp = make_response(json.dumps(collection, indent=2))
-    resp.headers['Content-Type'] = 'application/json'
-    resp.headers['Content-Disposition'] = f'attachment; filename={org}_{filename}_postman_collection.json'
+    if not os.path.isfile(file_path):
+        return f"File {filename} not found for org {org}.", 404
+    # Optionally resolve {{ faker.* }} placeholders (Postman would treat them as its own variables)
+    render = request.args.get('render', '0').lower() in ('1', 'true', 'yes')
+    seed = request.args.get('seed', type=int)
+    name = f"{org}_{filename} Postman Collection"
+    download_name = f'{org}_{filename}_postman_collection.json'
+    root = app.config['GENERATED_FOLDER']
+    key = export_key(file_path, name, render, seed) if postman_cache.enabled else None
+    if key is not None:
+        cached = postman_cache.get(root, key)
+        if cached is not None:
+            resp = send_file(cached, mimetype='application/json', as_attachment=True, download_name=download_name,
+                             etag=key, conditional=True)
+            return resp
+        if request.if_none_match.contains(key):
+            # The client holds this exact export even though our cached copy was evicted
+            resp = make_response('', 304)
+            resp.set_etag(key)
+            return resp
+    chunks = iter_collection(name, rendered_events((ev.to_dict() for ev in read_events(file_path)), render, seed))
+    if key is not None:
+        chunks = postman_cache.store(root, key, chunks)
+    resp = Response(stream_with_context(chunks), mimetype='application/json')
+    set_attachment(resp, download_name)
+    if key is not None:
+        resp.set_etag(key)
+    else:
+        # Freshly rendered placeholder values on every export
+        resp.headers['Cache-Control'] = 'no-store'
     return resp
 
-@app.route('/api/generate_sop', methods=['POST'])
-def api_generate_sop():
+def load_sop_event(data):
     """
-    Generate a Standard Operating Procedure (SOP) for a specified alert file.
-    Request JSON must include:
-      - org_name: sanitized organization name
-      - filename: name of the JSON events file under generated_files/{org}
-      - event_index: optional zero-based index of the event in the array (default 0)
+    Resolve the alert payload for an SOP request body (org_name, filename, event_index).
+    Returns (event_payload, org_folder, filename, None) or (None, None, None, error_response).
     """
-    data = request.get_json() or {}
     org_name = data.get('org_name')
     filename = data.get('filename')
     event_index = data.get('event_index', 0)
     # Validate required parameters
     if not org_name or not filename:
-        return {'message': 'Both org_name and filename are required.'}, 400
+        return None, None, None, ({'message': 'Both org_name and filename are required.'}, 400)
     org_folder = os.path.join(app.config['GENERATED_FOLDER'], sanitize_org(org_name))
     file_path = os.path.join(org_folder, filename)
     if not os.path.isfile(file_path):
-        return {'message': f'File {filename} not found for org {org_name}.'}, 404
-    # Load the event JSON
-    try:
-        with open(file_path, 'r') as f:
-            raw = f.read()
-        try:
-            events = json.loads(raw)
-        except json.JSONDecodeError:
-            events = load_event_file(org_name, filename)
-    except Exception as e:
-        return {'message': f'Error reading file: {e}'}, 500
-    # Normalize to list
-    if not isinstance(events, list):
-        events_list = [events]
-    else:
-        events_list = events
+        return None, None, None, ({'message': f'File {filename} not found for org {org_name}.'}, 404)
     # Parse and validate event_index
     try:
         idx = int(event_index)
     except (ValueError, TypeError):
         idx = 0
-    if idx < 0 or idx >= len(events_list):
-        return {'message': f'event_index {idx} out of range.'}, 400
-    event_payload = events_list[idx]
-    # Generate the SOP text using the sop_generator
-    sop_text = generate_sop(event_payload)
-    # Persist SOP to a Markdown file alongside other artifacts
+    if idx < 0:
+        return None, None, None, ({'message': f'event_index {idx} out of range.'}, 400)
+    # Seek straight to the event through the file's offset index
+    try:
+        event = read_event(file_path, idx)
+    except IndexError:
+        return None, None, None, ({'message': f'event_index {idx} out of range.'}, 400)
+    except Exception as e:
+        return None, None, None, ({'message': f'Error reading file: {e}'}, 500)
+    if not isinstance(event, dict):
+        return None, None, None, ({'message': f'Event {idx} of {filename} is not valid JSON.'}, 500)
+    return event, org_folder, filename, None
+
+def save_sop(org_folder, filename, sop_text, event_index=0):
+    """Persist SOP Markdown alongside the source events file and return the SOP filename."""
     timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     base = os.path.splitext(filename)[0]
     sop_filename = f"{base}_sop_{timestamp}.md"
     sop_path = os.path.join(org_folder, sop_filename)
+    write_text(sop_path, sop_text)
+    index_artifacts(sop_path)
     try:
-        with open(sop_path, 'w') as f:
-            f.write(sop_text)
+        idx = int(event_index)
+    except (ValueError, TypeError):
+        idx = 0
+    try:
+        artifact_graph().record_build(os.path.basename(org_folder), sop_filename, 'sop', {}, [(filename, idx)])
+    except Exception as e:
+        app.logger.warning(f"Could not record dependencies of {sop_filename}: {e}")
+    return sop_filename
+
+@app.route('/api/generate_sop', methods=['POST'])
+def api_generate_sop():
+    """
+    Generate a Standard Operating Procedure (SOP) for a specified alert file.
+    Request JSON must include:
+      - org_name: sanitized organization name
+      - filename: name of the JSON events file under generated_files/{org}
+      - event_index: optional zero-based index of the event in the array (default 0)
+    """
+    data = request.get_json() or {}
+    event_payload, org_folder, filename, error = load_sop_event(data)
+    if error:
+        return error
+    # Generate the SOP text using the sop_generator
+    sop_text = generate_sop(event_payload)
+    # Persist SOP to a Markdown file alongside other artifacts
+    try:
+        sop_filename = save_sop(org_folder, filename, sop_text, data.get('event_index', 0))
     except Exception as e:
         return {'message': f'Error saving SOP file: {e}'}, 500
     return {'sop_text': sop_text, 'sop_filename': sop_filename}, 200
 
+@app.route('/api/generate_sop/stream', methods=['POST'])
+def api_generate_sop_stream():
+    """
+    Streaming variant of /api/generate_sop over Server-Sent Events.
+    Emits `chunk` events with Markdown text as it is generated, then a `done` event
+    with the persisted sop_filename (or an `error` event).
+    """
+    data = request.get_json() or {}
+    event_payload, org_folder, filename, error = load_sop_event(data)
+    if error:
+        return error
+
+    def generate():
+        parts = []
+        try:
+            for chunk in stream_sop(event_payload):
+                parts.append(chunk)
+                yield sse_event('chunk', {'text': chunk})
+            if not "".join(parts).strip():
+                yield sse_event('error', {'message': EMPTY_SOP_MESSAGE})
+                return
+            sop_filename = save_sop(org_folder, filename, "".join(parts), data.get('event_index', 0))
+            yield sse_event('done', {'sop_filename': sop_filename})
+        except Exception as e:
+            app.logger.error(f"Error streaming SOP: {e}")
+            yield sse_error(e, f'Error generating SOP: {e}')
+
+    return sse_response(generate())
+
+def inline_sop_events(data):
+    """
+    Return the list of alert payloads for an inline SOP request body:
+    either the "events" list or the body itself as a single event.
+    """
+    if 'events' in data and isinstance(data['events'], list) and data['events']:
+        return data['events']
+    return [data]
+
 @app.route('/api/generate_sop_inline', methods=['POST'])
 def api_generate_sop_inline():
     """
@@ -613,22 +817,49 @@ def api_generate_sop_inline():
     data = request.get_json() or {}
     if not isinstance(data, dict) or not data:
         return {'message': 'Invalid or empty payload. Please provide event data.'}, 400
-    # Determine if this is a blended request (multiple events)
+    events = inline_sop_events(data)
     try:
-        if 'events' in data and isinstance(data['events'], list) and len(data['events']) > 1:
+        if len(events) > 1:
             # Use blended SOP template for multiple events
-            sop_text = generate_sop_blended(data['events'])
+            sop_text = generate_sop_blended(events)
         else:
-            # Single event SOP
-            # If wrapped in {events: [...]}, extract first or treat entire object
-            if 'events' in data and isinstance(data['events'], list) and len(data['events']) == 1:
-                sop_text = generate_sop(data['events'][0])
-            else:
-                sop_text = generate_sop(data)
+            sop_text = generate_sop(events[0])
         return {'sop_text': sop_text}, 200
+    except (LLMOverloaded, DeadlineExceeded):
+        # Handled by the app-level 503/504 error handlers
+        raise
     except Exception as e:
         return {'message': f'Error generating SOP: {e}'}, 500
 
+@app.route('/api/generate_sop_inline/stream', methods=['POST'])
+def api_generate_sop_inline_stream():
+    """
+    Streaming variant of /api/generate_sop_inline over Server-Sent Events.
+    Emits `chunk` events with Markdown text, then `done` with the full sop_text.
+    Does not persist any file.
+    """
+    data = request.get_json() or {}
+    if not isinstance(data, dict) or not data:
+        return {'message': 'Invalid or empty payload. Please provide event data.'}, 400
+    events = inline_sop_events(data)
+    chunks = stream_sop_blended(events) if len(events) > 1 else stream_sop(events[0])
+
+    def generate():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event('chunk', {'text': chunk})
+            if not "".join(parts).strip():
+                yield sse_event('error', {'message': EMPTY_SOP_MESSAGE})
+                return
+            yield sse_event('done', {'sop_text': "".join(parts)})
+        except Exception as e:
+            app.logger.error(f"Error streaming inline SOP: {e}")
+            yield sse_error(e, f'Error generating SOP: {e}')
+
+    return sse_response(generate())
+
 @app.route('/api/generate_diagnostics', methods=['POST'])
 def api_generate_diagnostics():
     """
@@ -656,8 +887,7 @@ def api_generate_diagnostics():
     if not os.path.isfile(narrative_path):
         return {'message': f'Narrative file {narrative_file} not found for org {org_name}.'}, 404
     try:
-        with open(narrative_path, 'r') as nf:
-            narrative_content = nf.read()
+        narrative_content = read_text(narrative_path)
     except Exception as e:
         return {'message': f'Error reading narrative file: {e}'}, 500
     # Collect events from specified files
@@ -666,25 +896,30 @@ def api_generate_diagnostics():
         file_path = os.path.join(org_folder, filename)
         if not os.path.isfile(file_path):
             return {'message': f'File {filename} not found for org {org_name}.'}, 404
-        try:
-            parsed = load_event_file(sanitized_org, filename)
-        except Exception:
-            with open(file_path, 'r') as f:
-                parsed = json.load(f)
-        if isinstance(parsed, list):
-            events.extend(parsed)
-        else:
-            events.append(parsed)
+        events.extend(read_events(file_path))
     # Generate multiple diagnostics job specs
     try:
         result = generate_diagnostics(org_name, events, scenario, narrative_content)
         jobs = result.get('jobs', [])
+    except (LLMOverloaded, DeadlineExceeded):
+        # Handled by the app-level 503/504 error handlers
+        raise
     except Exception as e:
         app.logger.error(f'Error generating diagnostics: {e}')
         return {'message': f'Error generating diagnostics: {e}'}, 500
-    # Save each job spec to its own YAML file
-    output = {'jobs': []}
-    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    output = {'jobs': save_diagnostics_jobs(org_folder, scenario, jobs)}
+    try:
+        artifact_graph().record_build(
+            sanitized_org, [job['filename'] for job in output['jobs']], 'diagnostics',
+            {'org_name': org_name, 'scenario': scenario}, [narrative_file] + list(files)
+        )
+    except Exception as e:
+        app.logger.warning(f"Could not record diagnostics dependencies: {e}")
+    return output, 200
+
+def save_diagnostics_jobs(org_folder, scenario, jobs):
+    """Save each job spec to its own YAML file; returns [{index, filename, yaml}] for the saved ones."""
+    saved = []
     for job in jobs:
         idx = job.get('index')
         job_yaml = job.get('yaml', '')
@@ -693,14 +928,180 @@ def api_generate_diagnostics():
         filename = f'Event{event_num} - {scenario} Diagnostics.yaml'
         path = os.path.join(org_folder, filename)
         try:
-            with open(path, 'w') as f:
-                f.write(job_yaml)
+            write_text(path, job_yaml)
         except Exception as e:
             app.logger.error(f'Error saving diagnostics file {filename}: {e}')
             continue
-        output['jobs'].append({'index': idx, 'filename': filename, 'yaml': job_yaml})
-    return output, 200
+        index_artifacts(path)
+        saved.append({'index': idx, 'filename': filename, 'yaml': job_yaml})
+    return saved
+
+#########################
+# INCREMENTAL REBUILDS
+#########################
+# Builders re-run one recorded recipe (see artifact_graph) into its original filenames.
+# Scenario events are regenerated from the current narrative text: the incident details
+# and outage summary are taken from its sections, falling back to the values recorded at
+# generation time (or the whole text) when the narrative has no such section.
+
+def _narrative_args(org, params, narrative_file):
+    narrative = read_text(os.path.join(app.config['GENERATED_FOLDER'], org, narrative_file))
+    outage_summary = utils.extract_outage_summary(narrative) or params.get('outage_summary') or ''
+    incident_details = utils.extract_incident_details(narrative) or params.get('incident_details') or narrative
+    return (params.get('org_name') or org, utils.api_key, params.get('itsm_tools'), params.get('observability_tools'),
+            outage_summary, params.get('service_names'), incident_details)
+
+def _scenario_spec(params):
+    # Custom scenarios use the major incident templates, as in /api/generate
+    return utils.SCENARIO_EVENT_SPECS.get(params.get('scenario'), utils.SCENARIO_EVENT_SPECS['major'])
+
+def rebuild_events(org, params, inputs, outputs):
+    path = os.path.join(app.config['GENERATED_FOLDER'], org, outputs[0])
+    args = _narrative_args(org, params, inputs[0][0])
+    # The generators stream (or write) the events straight into the output file
+    _scenario_spec(params)['events'](
+        *args, params.get('unique_alerts'), params.get('max_events'), output_path=path, seed=params.get('seed')
+    )
+    index_artifacts(path)
+    return outputs
+
+def rebuild_change_events(org, params, inputs, outputs):
+    path = os.path.join(app.config['GENERATED_FOLDER'], org, outputs[0])
+    write_events_file(path, _scenario_spec(params)['change_events'](*_narrative_args(org, params, inputs[0][0])))
+    index_artifacts(path)
+    return outputs
+
+def rebuild_sop(org, params, inputs, outputs):
+    events_file, idx = inputs[0]
+    try:
+        event = read_event(os.path.join(app.config['GENERATED_FOLDER'], org, events_file), idx or 0)
+    except IndexError:
+        raise ValueError(f"event_index {idx} out of range in {events_file}")
+    path = os.path.join(app.config['GENERATED_FOLDER'], org, outputs[0])
+    write_text(path, generate_sop(event))
+    index_artifacts(path)
+    return outputs
+
+def rebuild_diagnostics(org, params, inputs, outputs):
+    org_folder = os.path.join(app.config['GENERATED_FOLDER'], org)
+    narrative_file, event_files = inputs[0][0], [name for name, _ in inputs[1:]]
+    narrative_content = read_text(os.path.join(org_folder, narrative_file))
+    events = []
+    for filename in event_files:
+        events.extend(read_events(os.path.join(org_folder, filename)))
+    result = generate_diagnostics(params.get('org_name') or org, events, params.get('scenario'), narrative_content)
+    saved = save_diagnostics_jobs(org_folder, params.get('scenario'), result.get('jobs', []))
+    return [job['filename'] for job in saved]
+
+ARTIFACT_BUILDERS = {
+    'events': rebuild_events,
+    'change_events': rebuild_change_events,
+    'sop': rebuild_sop,
+    'diagnostics': rebuild_diagnostics,
+}
+
+@app.route('/api/artifacts/store', methods=['GET'])
+def api_artifact_store():
+    """Content store usage: blobs, stored bytes and bytes saved by deduplication."""
+    return store_stats(app.config['GENERATED_FOLDER']), 200
+
+@app.route('/api/artifacts/retention', methods=['GET'])
+def api_artifact_retention():
+    """Configured retention policy, what it would drop now (dry run), and the last compaction report."""
+    compactor = get_compactor(app.config['GENERATED_FOLDER'])
+    return {
+        'policy': compactor.policy.to_dict(),
+        'pending': compactor.compact(dry_run=True),
+        'last_report': compactor.last_report,
+    }, 200
+
+@app.route('/api/artifacts/compact', methods=['POST'])
+def api_artifact_compact():
+    """
+    Apply retention now. Optional JSON body: org (one org instead of all), dry_run, and
+    keep_per_scenario / max_age_days / max_org_bytes / mode ("archive" or "delete") to
+    override the configured policy for this run. Returns the files dropped and bytes reclaimed.
+    """
+    data = request.get_json(silent=True) or {}
+    compactor = get_compactor(app.config['GENERATED_FOLDER'])
+    configured = compactor.policy
+    try:
+        policy = RetentionPolicy(
+            keep_per_scenario=int(data.get('keep_per_scenario', configured.keep_per_scenario)),
+            max_age_days=int(data.get('max_age_days', configured.max_age_days)),
+            max_org_bytes=int(data.get('max_org_bytes', configured.max_org_bytes)),
+            archive=data.get('mode', 'archive' if configured.archive else 'delete') != 'delete',
+        )
+    except (TypeError, ValueError):
+        return {'message': 'keep_per_scenario, max_age_days and max_org_bytes must be integers.'}, 400
+    org = data.get('org')
+    if org and not os.path.isdir(os.path.join(app.config['GENERATED_FOLDER'], org)):
+        return {'message': f'Organization {org} not found.'}, 404
+    return compactor.compact(orgs=[org] if org else None, policy=policy, dry_run=bool(data.get('dry_run'))), 200
+
+@app.route('/api/artifacts/<org>/stale', methods=['GET'])
+def api_artifacts_stale(org):
+    """Derived artifacts whose inputs changed since they were built, upstream first."""
+    return {'stale': artifact_graph().stale(org)}, 200
+
+@app.route('/api/artifacts/<org>/rebuild_stale', methods=['POST'])
+def api_artifacts_rebuild_stale(org):
+    """
+    Regenerate only the stale artifacts of an org, in dependency order (e.g. after a
+    narrative edit: its events and change events, then SOPs and diagnostics built from
+    events that actually changed). Everything else is reused as is.
+    """
+    if not os.path.isdir(os.path.join(app.config['GENERATED_FOLDER'], org)):
+        return {'message': f'Organization {org} not found.'}, 404
+    return artifact_graph().rebuild_stale(org, ARTIFACT_BUILDERS), 200
+
+@app.route('/api/artifacts', methods=['GET'])
+def api_artifacts():
+    """
+    Search the artifact index. Query parameters (all optional): org, kind (repeatable:
+    narrative, events, change_events, sop, diagnostics, other), scenario, q (filename
+    substring) and limit. Returns {"artifacts": [...]} newest first.
+    """
+    artifacts = artifact_index().search(
+        org=request.args.get('org') or None,
+        kinds=request.args.getlist('kind') or None,
+        scenario=request.args.get('scenario') or None,
+        text=request.args.get('q') or None,
+        limit=request.args.get('limit', type=int),
+    )
+    return {'artifacts': artifacts}, 200
+
+@app.route('/api/artifacts/<org>/<filename>/related', methods=['GET'])
+def api_artifact_related(org, filename):
+    """Files that belong with the given one (same generation, its SOPs, scenario diagnostics)."""
+    index = artifact_index()
+    artifact = index.get(org, filename)
+    if artifact is None:
+        return {'message': f'File {filename} not found for org {org}.'}, 404
+    graph = artifact_graph()
+    return {
+        'artifact': artifact,
+        'related': index.related(org, filename),
+        'depends_on': graph.dependencies(org, filename),
+        'dependents': graph.dependents(org, filename),
+    }, 200
+
+@app.route('/api/llm/stats', methods=['GET'])
+def api_llm_stats():
+    """
+    LLM usage snapshot: observed output sizes per task against their max_tokens
+    budgets (for tuning LLM_TASK_PROFILES), limiter state, SOP cache and event-file cache stats.
+    """
+    return {
+        'tasks': output_stats.summary(),
+        'limiter': limiter.stats(),
+        'sop_cache': sop_cache.stats(),
+        'event_cache': event_cache.stats(),
+    }, 200
 
 if __name__ == '__main__':
+    # Background retention (ARTIFACT_COMPACTION_INTERVAL); only in the serving process, not the reloader
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_compactor(app.config['GENERATED_FOLDER']).start()
     # Listen on all interfaces to allow Docker to map the port
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,255 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import datetime
+import threading
+from retry_policy import DeadlineExceeded
+from llm_limiter import LLMOverloaded
+
+#########################
+# ARTIFACT DEPENDENCIES
+#########################
+# Every derived artifact records the recipe that produced it: a builder name, the
+# parameters it was called with, and its inputs (whole files, or one event of an events
+# file). Each input is stored with a content signature taken at build time, so an
+# artifact is stale once any input's content differs, e.g. after a narrative edit.
+# One recipe can produce several files (diagnostics jobs).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    org TEXT NOT NULL,
+    recipe TEXT NOT NULL,
+    builder TEXT NOT NULL,
+    params TEXT NOT NULL,
+    built_at TEXT,
+    PRIMARY KEY (org, recipe)
+);
+CREATE TABLE IF NOT EXISTS build_outputs (
+    org TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    recipe TEXT NOT NULL,
+    PRIMARY KEY (org, filename)
+);
+CREATE TABLE IF NOT EXISTS build_inputs (
+    org TEXT NOT NULL,
+    recipe TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    event_index INTEGER,
+    signature TEXT
+);
+CREATE INDEX IF NOT EXISTS build_inputs_recipe ON build_inputs (org, recipe);
+CREATE INDEX IF NOT EXISTS build_inputs_file ON build_inputs (org, filename);
+"""
+
+def _normalize_inputs(inputs):
+    """Inputs are filenames or (filename, event_index) pairs."""
+    normalized = []
+    for item in inputs or []:
+        if isinstance(item, (tuple, list)):
+            normalized.append((item[0], None if item[1] is None else int(item[1])))
+        else:
+            normalized.append((item, None))
+    return normalized
+
+class ArtifactGraph:
+    """
+    Dependency graph between generated artifacts, stored next to the artifact index.
+    record_build() is called by the writers; stale() lists recipes whose inputs changed
+    (directly or through a stale upstream artifact) in dependency order, and
+    rebuild_stale() re-runs only those, reusing everything else.
+    """
+    def __init__(self, root, db_path=None):
+        self.root = root
+        self.db_path = db_path or os.path.join(root, ".artifact_index.sqlite3")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def _path(self, org, filename):
+        return os.path.join(self.root, org, filename)
+
+    def signature(self, org, filename, event_index=None):
+        """Content hash of an input file, or of one event in it; None when it no longer exists."""
+        path = self._path(org, filename)
+        if not os.path.isfile(path):
+            return None
+        digest = hashlib.sha256()
+        if event_index is None:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+        # Imported lazily: only event-level inputs need the event readers
+        from event_files import read_events
+        for index, ev in enumerate(read_events(path)):
+            if index == event_index:
+                digest.update(json.dumps(ev.to_dict(), sort_keys=True).encode("utf-8"))
+                return digest.hexdigest()
+        return None
+
+    def record_build(self, org, outputs, builder, params=None, inputs=()):
+        """
+        Record that `outputs` (filenames in org) were produced by `builder` with `params`
+        from `inputs`, capturing the inputs' current signatures.
+        """
+        outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+        if not outputs:
+            return None
+        params = params or {}
+        inputs = _normalize_inputs(inputs)
+        recipe = hashlib.sha256(json.dumps([builder, params, inputs, sorted(outputs)], sort_keys=True).encode("utf-8")).hexdigest()[:32]
+        signatures = [(name, index, self.signature(org, name, index)) for name, index in inputs]
+        built_at = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            for name in outputs:
+                self._forget_output(org, name)
+            self._conn.execute("INSERT OR REPLACE INTO builds (org, recipe, builder, params, built_at) VALUES (?, ?, ?, ?, ?)",
+                               (org, recipe, builder, json.dumps(params), built_at))
+            self._conn.execute("DELETE FROM build_inputs WHERE org = ? AND recipe = ?", (org, recipe))
+            self._conn.executemany("INSERT INTO build_inputs (org, recipe, filename, event_index, signature) VALUES (?, ?, ?, ?, ?)",
+                                   [(org, recipe, name, index, sig) for name, index, sig in signatures])
+            self._conn.executemany("INSERT OR REPLACE INTO build_outputs (org, filename, recipe) VALUES (?, ?, ?)",
+                                   [(org, name, recipe) for name in outputs])
+        return recipe
+
+    def _forget_output(self, org, filename):
+        # Detach a file from its previous recipe; drop the recipe once it has no outputs left
+        row = self._conn.execute("SELECT recipe FROM build_outputs WHERE org = ? AND filename = ?", (org, filename)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM build_outputs WHERE org = ? AND filename = ?", (org, filename))
+        left = self._conn.execute("SELECT 1 FROM build_outputs WHERE org = ? AND recipe = ?", (org, row["recipe"])).fetchone()
+        if left is None:
+            self._conn.execute("DELETE FROM builds WHERE org = ? AND recipe = ?", (org, row["recipe"]))
+            self._conn.execute("DELETE FROM build_inputs WHERE org = ? AND recipe = ?", (org, row["recipe"]))
+
+    def forget(self, org, filename):
+        with self._lock, self._conn:
+            self._forget_output(org, filename)
+
+    def _recipes(self, org):
+        with self._lock:
+            builds = {row["recipe"]: {"recipe": row["recipe"], "builder": row["builder"], "params": json.loads(row["params"]),
+                                      "built_at": row["built_at"], "inputs": [], "outputs": []}
+                      for row in self._conn.execute("SELECT * FROM builds WHERE org = ?", (org,))}
+            for row in self._conn.execute("SELECT * FROM build_inputs WHERE org = ?", (org,)):
+                if row["recipe"] in builds:
+                    builds[row["recipe"]]["inputs"].append(
+                        {"filename": row["filename"], "event_index": row["event_index"], "signature": row["signature"]})
+            for row in self._conn.execute("SELECT * FROM build_outputs WHERE org = ? ORDER BY filename", (org,)):
+                if row["recipe"] in builds:
+                    builds[row["recipe"]]["outputs"].append(row["filename"])
+        return builds
+
+    def dependencies(self, org, filename):
+        """Inputs of the recipe that produced filename."""
+        with self._lock:
+            row = self._conn.execute("SELECT recipe FROM build_outputs WHERE org = ? AND filename = ?", (org, filename)).fetchone()
+            if row is None:
+                return []
+            return [dict(r) for r in self._conn.execute(
+                "SELECT filename, event_index, signature FROM build_inputs WHERE org = ? AND recipe = ?", (org, row["recipe"]))]
+
+    def dependents(self, org, filename):
+        """Files built (directly) from filename."""
+        with self._lock:
+            return [row["filename"] for row in self._conn.execute(
+                "SELECT DISTINCT o.filename FROM build_inputs i JOIN build_outputs o ON o.org = i.org AND o.recipe = i.recipe "
+                "WHERE i.org = ? AND i.filename = ? ORDER BY o.filename", (org, filename))]
+
+    def _changed_inputs(self, org, recipe):
+        return [item for item in recipe["inputs"]
+                if self.signature(org, item["filename"], item["event_index"]) != item["signature"]]
+
+    def _ordered(self, builds):
+        # Upstream recipes first (Kahn's algorithm over output -> input edges)
+        producer = {name: key for key, build in builds.items() for name in build["outputs"]}
+        upstream = {key: {producer[i["filename"]] for i in build["inputs"] if producer.get(i["filename"]) not in (None, key)}
+                    for key, build in builds.items()}
+        ordered, done = [], set()
+        pending = sorted(builds, key=lambda key: builds[key]["built_at"] or "")
+        while pending:
+            ready = [key for key in pending if upstream[key] <= done] or pending[:1]
+            for key in ready:
+                ordered.append(key)
+                done.add(key)
+            pending = [key for key in pending if key not in done]
+        return ordered, producer
+
+    def stale(self, org):
+        """
+        Recipes needing a rebuild, upstream first. Each entry lists the changed inputs, the
+        stale upstream artifacts it waits on, and any missing inputs (which block a rebuild).
+        """
+        builds = self._recipes(org)
+        ordered, producer = self._ordered(builds)
+        stale_outputs = set()
+        result = []
+        for key in ordered:
+            build = builds[key]
+            changed = self._changed_inputs(org, build)
+            missing = [i["filename"] for i in changed if not os.path.isfile(self._path(org, i["filename"]))]
+            via = sorted({i["filename"] for i in build["inputs"] if i["filename"] in stale_outputs})
+            if changed or via:
+                stale_outputs.update(build["outputs"])
+                result.append(dict(build, changed_inputs=[i["filename"] for i in changed], stale_upstream=via, missing_inputs=missing))
+        return result
+
+    def rebuild_stale(self, org, builders):
+        """
+        Re-run stale recipes in dependency order with builders[builder](org, params, inputs, outputs),
+        which returns the filenames it wrote (or None for the same outputs). Recipes whose
+        inputs turn out unchanged after their upstream rebuilt are kept as they are.
+        Running out of request deadline or LLM capacity stops the run (the exception
+        propagates) rather than failing every remaining recipe; recipes rebuilt so far are
+        recorded, so calling again resumes with what is still stale.
+        """
+        report = {"rebuilt": [], "unchanged": [], "failed": [], "skipped": []}
+        blocked = set()
+        for build in self.stale(org):
+            outputs = build["outputs"]
+            waiting = [name for name in build["stale_upstream"] if name in blocked]
+            if build["missing_inputs"] or waiting or build["builder"] not in builders:
+                reason = ("missing inputs: " + ", ".join(build["missing_inputs"]) if build["missing_inputs"]
+                          else "upstream not rebuilt: " + ", ".join(waiting) if waiting
+                          else f"no builder for {build['builder']}")
+                report["skipped"].append({"outputs": outputs, "reason": reason})
+                blocked.update(outputs)
+                continue
+            # Upstream rebuilt above: only rebuild if this recipe's own inputs really changed
+            if not self._changed_inputs(org, build):
+                report["unchanged"].append({"outputs": outputs})
+                continue
+            inputs = [(i["filename"], i["event_index"]) for i in build["inputs"]]
+            try:
+                written = builders[build["builder"]](org, build["params"], inputs, outputs) or outputs
+            except (DeadlineExceeded, LLMOverloaded):
+                raise
+            except Exception as e:
+                logging.error(f"Rebuilding {outputs} for {org} failed: {e}")
+                report["failed"].append({"outputs": outputs, "error": str(e)})
+                blocked.update(outputs)
+                continue
+            with self._lock, self._conn:
+                for name in outputs:
+                    self._forget_output(org, name)
+            self.record_build(org, written, build["builder"], build["params"], inputs)
+            report["rebuilt"].append({"outputs": written, "builder": build["builder"]})
+        return report
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_graph(root):
+    """Shared ArtifactGraph for a generated_files root (stored in the artifact index database)."""
+    root = os.path.abspath(root)
+    with _graphs_lock:
+        graph = _graphs.get(root)
+        if graph is None:
+            graph = _graphs[root] = ArtifactGraph(root, os.getenv("ARTIFACT_INDEX_PATH") or None)
+        return graph
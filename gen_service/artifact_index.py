@@ -0,0 +1,303 @@
+import os
+import re
+import sqlite3
+import logging
+import datetime
+import threading
+
+#########################
+# ARTIFACT CLASSIFICATION
+#########################
+# Generated files are named by the writers in app.py; the name alone tells the kind,
+# scenario and generation timestamp. Files written in the same generation share a group
+# (scenario + timestamp); SOPs point back at the events file they were written for.
+
+ARTIFACT_PATTERNS = (
+    ("change_events", re.compile(r"^(?P<scenario>\w+?)_change_events_(?P<ts>\d{14})\.(?:json|ndjson)$")),
+    ("events", re.compile(r"^(?P<scenario>\w+?)_events_(?P<ts>\d{14})\.(?:json|ndjson)$")),
+    ("sop", re.compile(r"^(?P<source>.+)_sop_(?P<ts>\d{8}T\d{6}Z)\.md$")),
+    ("narrative", re.compile(r"^(?P<scenario>\w+?)_(?P<ts>\d{14})\.txt$")),
+    ("diagnostics", re.compile(r"^Event(?P<event>\d+) - (?P<scenario>.+) Diagnostics\.yaml$")),
+)
+EVENT_KINDS = ("events", "change_events")
+# Event files named outside the patterns above (e.g. "events.json", or the frontend's
+# "major_events_20250421T160430824Z.json") are still event files, just not grouped
+LEGACY_EVENT_SCENARIO = re.compile(r"^(?!(?:change_)?events)(?P<scenario>[^\W_]\w*?)_(?:change_)?events")
+
+def _legacy_event_file(filename):
+    # The listing rule event files were selected by before the index
+    stem, ext = os.path.splitext(filename)
+    return ext in (".json", ".ndjson") and (stem.endswith("events") or "events_" in filename)
+
+def _iso(ts):
+    for fmt in ("%Y%m%d%H%M%S", "%Y%m%dT%H%M%SZ"):
+        try:
+            return datetime.datetime.strptime(ts, fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+def classify(filename):
+    """
+    Derive {kind, scenario, timestamp, group_key, source} from a generated file name.
+    Event files matching only the legacy listing rule are ungrouped; unrecognised files
+    are kind "other".
+    """
+    for kind, pattern in ARTIFACT_PATTERNS:
+        match = pattern.match(filename)
+        if not match:
+            continue
+        fields = match.groupdict()
+        info = {"kind": kind, "scenario": fields.get("scenario"), "timestamp": _iso(fields["ts"]) if fields.get("ts") else None,
+                "group_key": None, "source": None}
+        if kind == "sop":
+            # SOPs are named after their events file: inherit its scenario and group
+            source = fields["source"]
+            for ext in (".json", ".ndjson"):
+                parent = classify(source + ext)
+                if parent["kind"] in EVENT_KINDS:
+                    info.update(scenario=parent["scenario"], group_key=parent["group_key"], source=source + ext)
+                    break
+        elif kind != "diagnostics":
+            info["group_key"] = f"{info['scenario']}_{fields['ts']}"
+        return info
+    if _legacy_event_file(filename):
+        match = LEGACY_EVENT_SCENARIO.match(filename)
+        return {"kind": "change_events" if "change_events" in filename else "events",
+                "scenario": match.group("scenario") if match else None,
+                "timestamp": None, "group_key": None, "source": None}
+    return {"kind": "other", "scenario": None, "timestamp": None, "group_key": None, "source": None}
+
+def _hidden(filename):
+    # Dotfiles and in-progress atomic writes
+    return filename.startswith(".") or filename.endswith(".part")
+
+#########################
+# SQLITE INDEX
+#########################
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    org TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    scenario TEXT,
+    timestamp TEXT,
+    group_key TEXT,
+    source TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    event_count INTEGER,
+    PRIMARY KEY (org, filename)
+);
+CREATE INDEX IF NOT EXISTS artifacts_org_kind ON artifacts (org, kind, timestamp);
+CREATE INDEX IF NOT EXISTS artifacts_group ON artifacts (org, group_key);
+CREATE TABLE IF NOT EXISTS orgs (
+    org TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER
+);
+"""
+
+# Bump when classify() changes so existing rows are re-derived on the next sync
+CLASSIFY_VERSION = 2
+
+COLUMNS = ("org", "filename", "kind", "scenario", "timestamp", "group_key", "source", "size", "mtime_ns", "event_count")
+
+def _count_events(path):
+    # Imported lazily: event_files depends on the rest of the service, the index does not
+    from event_files import iter_events
+    try:
+        return sum(1 for _ in iter_events(path))
+    except Exception as e:
+        logging.warning(f"Could not count events in {path}: {e}")
+        return None
+
+class ArtifactIndex:
+    """
+    SQLite index of the files under generated_files/<org>/ (kind, scenario, timestamp,
+    size, event count and generation group), so listings and searches do not walk the
+    directory tree. Writers call record() after saving a file. Each org is reconciled with
+    disk only when its directory mtime changes (files added, renamed or removed outside
+    the service); unchanged files are matched by mtime and size and never re-read.
+    """
+    def __init__(self, root, db_path=None):
+        self.root = root
+        self.db_path = db_path or os.path.join(root, ".artifact_index.sqlite3")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < CLASSIFY_VERSION:
+                # Rows were classified by older rules: forget them so every org is rescanned
+                self._conn.execute("DELETE FROM artifacts")
+                self._conn.execute("DELETE FROM orgs")
+                self._conn.execute(f"PRAGMA user_version = {CLASSIFY_VERSION}")
+        self._root_mtime = None
+
+    def _org_dir(self, org):
+        return os.path.join(self.root, org)
+
+    def _row(self, org, filename, st, previous=None):
+        info = classify(filename)
+        event_count = None
+        if info["kind"] in EVENT_KINDS:
+            unchanged = previous is not None and previous["mtime_ns"] == st.st_mtime_ns and previous["size"] == st.st_size
+            event_count = previous["event_count"] if unchanged else _count_events(os.path.join(self._org_dir(org), filename))
+        return (org, filename, info["kind"], info["scenario"], info["timestamp"], info["group_key"], info["source"],
+                st.st_size, st.st_mtime_ns, event_count)
+
+    def record(self, path):
+        """Index (or re-index) one file after it was written."""
+        org = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        filename = os.path.basename(path)
+        if _hidden(filename):
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove(org, filename)
+            return
+        row = self._row(org, filename, st)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO artifacts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", row)
+
+    def remove(self, org, filename):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM artifacts WHERE org = ? AND filename = ?", (org, filename))
+
+    def sync_org(self, org, force=False):
+        """Reconcile one org with disk if its directory changed since the last sync."""
+        org_dir = self._org_dir(org)
+        try:
+            dir_mtime = os.stat(org_dir).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM artifacts WHERE org = ?", (org,))
+                self._conn.execute("DELETE FROM orgs WHERE org = ?", (org,))
+            return
+        with self._lock:
+            seen = self._conn.execute("SELECT dir_mtime_ns FROM orgs WHERE org = ?", (org,)).fetchone()
+            if seen is not None and seen["dir_mtime_ns"] == dir_mtime and not force:
+                return
+            known = {row["filename"]: row for row in self._conn.execute(
+                "SELECT filename, size, mtime_ns, event_count FROM artifacts WHERE org = ?", (org,))}
+            rows = []
+            present = set()
+            for entry in os.scandir(org_dir):
+                if not entry.is_file() or _hidden(entry.name):
+                    continue
+                present.add(entry.name)
+                st = entry.stat()
+                previous = known.get(entry.name)
+                if previous is not None and previous["mtime_ns"] == st.st_mtime_ns and previous["size"] == st.st_size:
+                    continue
+                rows.append(self._row(org, entry.name, st, previous))
+            with self._conn:
+                if rows:
+                    self._conn.executemany(
+                        f"INSERT OR REPLACE INTO artifacts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+                gone = [(org, name) for name in known if name not in present]
+                if gone:
+                    self._conn.executemany("DELETE FROM artifacts WHERE org = ? AND filename = ?", gone)
+                self._conn.execute("INSERT OR REPLACE INTO orgs (org, dir_mtime_ns) VALUES (?, ?)", (org, dir_mtime))
+            if rows or gone:
+                logging.info(f"Artifact index: {org} reconciled ({len(rows)} updated, {len(gone)} removed)")
+
+    def sync(self):
+        """Reconcile the org list (and every org) if the root directory changed."""
+        try:
+            root_mtime = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if root_mtime == self._root_mtime:
+                return
+            orgs = [entry.name for entry in os.scandir(self.root) if entry.is_dir() and not _hidden(entry.name)]
+            indexed = [row["org"] for row in self._conn.execute("SELECT org FROM orgs")]
+            for org in set(orgs) | set(indexed):
+                self.sync_org(org)
+            self._root_mtime = root_mtime
+
+    def organizations(self):
+        self.sync()
+        with self._lock:
+            return [row["org"] for row in self._conn.execute("SELECT org FROM orgs ORDER BY org")]
+
+    def files(self, org, kinds=None):
+        """Artifact rows for one org, newest first (optionally restricted to some kinds)."""
+        return self.search(org=org, kinds=kinds)
+
+    def filenames(self, org, kinds=None):
+        return [row["filename"] for row in self.files(org, kinds=kinds)]
+
+    def search(self, org=None, kinds=None, scenario=None, text=None, limit=None):
+        """Query artifacts by org, kind(s), scenario and a filename substring; newest first."""
+        for synced_org in ([org] if org is not None else self.organizations()):
+            self.sync_org(synced_org)
+        clauses, params = [], []
+        if org is not None:
+            clauses.append("org = ?")
+            params.append(org)
+        if kinds:
+            kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+            clauses.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+        if scenario:
+            clauses.append("scenario = ?")
+            params.append(scenario)
+        if text:
+            clauses.append("filename LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", text) + "%")
+        sql = "SELECT * FROM artifacts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp IS NULL, timestamp DESC, filename"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def get(self, org, filename):
+        self.sync_org(org)
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM artifacts WHERE org = ? AND filename = ?", (org, filename)).fetchone()
+        return dict(row) if row else None
+
+    def related(self, org, filename):
+        """
+        Files belonging with this one: the same generation group (narrative, events, change
+        events), SOPs written for those event files, and diagnostics for the same scenario.
+        """
+        artifact = self.get(org, filename)
+        if artifact is None:
+            return []
+        with self._lock:
+            group, scenario = artifact["group_key"], artifact["scenario"]
+            rows = []
+            if group:
+                rows += self._conn.execute("SELECT * FROM artifacts WHERE org = ? AND group_key = ?", (org, group)).fetchall()
+            if scenario:
+                rows += self._conn.execute(
+                    "SELECT * FROM artifacts WHERE org = ? AND kind = 'diagnostics' AND scenario = ?", (org, scenario)).fetchall()
+        seen = {filename}
+        related = []
+        for row in rows:
+            if row["filename"] not in seen:
+                seen.add(row["filename"])
+                related.append(dict(row))
+        return related
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root):
+    """Shared ArtifactIndex for a generated_files root (ARTIFACT_INDEX_PATH overrides the database location)."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = ArtifactIndex(root, os.getenv("ARTIFACT_INDEX_PATH") or None)
+        return index
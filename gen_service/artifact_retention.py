@@ -0,0 +1,294 @@
+import os
+import gzip
+import time
+import logging
+import datetime
+import threading
+from artifact_index import get_index, _hidden
+from artifact_graph import get_graph
+from artifact_store import compression_of, collect_garbage
+from event_cache import event_cache
+
+#########################
+# RETENTION POLICY
+#########################
+# Old artifacts are dropped per generation: a narrative, its events, change events and
+# the SOPs written for them go together (the index's group_key). Files outside a group
+# (diagnostics, custom narratives) are their own unit. A unit is never dropped while a
+# kept artifact was built from one of its files (see artifact_graph), and the newest
+# generation of each scenario is always kept.
+
+ARCHIVE_DIRNAME = ".archive"
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Seconds between background compaction runs (0 disables the background thread)
+ARTIFACT_COMPACTION_INTERVAL = _env_int("ARTIFACT_COMPACTION_INTERVAL", 0)
+
+class RetentionPolicy:
+    """
+    keep_per_scenario: generations kept per scenario (0 = no limit)
+    max_age_days: drop units whose newest file is older than this (0 = no limit)
+    max_org_bytes: per-org size budget; oldest units go first (0 = no limit)
+    archive: move dropped files (gzip-compressed) to generated_files/.archive/<org>/ instead of deleting them
+    """
+    def __init__(self, keep_per_scenario=0, max_age_days=0, max_org_bytes=0, archive=True):
+        self.keep_per_scenario = keep_per_scenario
+        self.max_age_days = max_age_days
+        self.max_org_bytes = max_org_bytes
+        self.archive = archive
+
+    @classmethod
+    def from_env(cls):
+        mode = os.getenv("ARTIFACT_RETENTION_MODE", "archive").strip().lower()
+        if mode not in ("archive", "delete"):
+            logging.warning(f"Unknown ARTIFACT_RETENTION_MODE {mode!r}; archiving.")
+            mode = "archive"
+        return cls(
+            keep_per_scenario=_env_int("ARTIFACT_KEEP_PER_SCENARIO", 0),
+            max_age_days=_env_int("ARTIFACT_MAX_AGE_DAYS", 0),
+            max_org_bytes=_env_int("ARTIFACT_ORG_MAX_BYTES", 0),
+            archive=mode == "archive",
+        )
+
+    @property
+    def active(self):
+        return self.keep_per_scenario > 0 or self.max_age_days > 0 or self.max_org_bytes > 0
+
+    def to_dict(self):
+        return {
+            "keep_per_scenario": self.keep_per_scenario,
+            "max_age_days": self.max_age_days,
+            "max_org_bytes": self.max_org_bytes,
+            "mode": "archive" if self.archive else "delete",
+        }
+
+def _units(rows):
+    """Group index rows into retention units with their scenario, newest timestamp and size."""
+    units = {}
+    for row in rows:
+        key = row["group_key"] or f"file:{row['filename']}"
+        unit = units.setdefault(key, {"key": key, "scenario": None, "grouped": bool(row["group_key"]),
+                                      "timestamp": None, "bytes": 0, "files": []})
+        # Ungrouped files (and SOPs of a removed events file) fall back to their mtime
+        timestamp = row["timestamp"] or datetime.datetime.fromtimestamp((row["mtime_ns"] or 0) / 1e9).isoformat()
+        unit["timestamp"] = max(unit["timestamp"] or timestamp, timestamp)
+        unit["scenario"] = unit["scenario"] or row["scenario"]
+        unit["bytes"] += row["size"] or 0
+        unit["files"].append(row["filename"])
+    return sorted(units.values(), key=lambda unit: unit["timestamp"], reverse=True)
+
+def plan(units, policy, now=None):
+    """
+    Decide which units to drop: {key: reason}. Units are newest first. The newest
+    generation of each scenario is protected from every rule.
+    """
+    now = now or datetime.datetime.now()
+    drop = {}
+    protected = set()
+    seen_per_scenario = {}
+    for unit in units:
+        if not unit["grouped"]:
+            continue
+        rank = seen_per_scenario.get(unit["scenario"], 0)
+        seen_per_scenario[unit["scenario"]] = rank + 1
+        if rank == 0:
+            protected.add(unit["key"])
+        elif policy.keep_per_scenario and rank >= policy.keep_per_scenario:
+            drop[unit["key"]] = f"beyond latest {policy.keep_per_scenario} for {unit['scenario']}"
+    if policy.max_age_days:
+        cutoff = (now - datetime.timedelta(days=policy.max_age_days)).isoformat()
+        for unit in units:
+            if unit["key"] not in protected and unit["key"] not in drop and unit["timestamp"] < cutoff:
+                drop[unit["key"]] = f"older than {policy.max_age_days} days"
+    if policy.max_org_bytes:
+        remaining = sum(unit["bytes"] for unit in units if unit["key"] not in drop)
+        for unit in reversed(units):
+            if remaining <= policy.max_org_bytes:
+                break
+            if unit["key"] in protected or unit["key"] in drop:
+                continue
+            drop[unit["key"]] = f"org over {policy.max_org_bytes} bytes"
+            remaining -= unit["bytes"]
+    return drop
+
+def _archive(root, org, path):
+    """Copy a file into the archive, gzip-compressed unless it already is compressed; returns its size."""
+    archive_dir = os.path.join(root, ARCHIVE_DIRNAME, org)
+    os.makedirs(archive_dir, exist_ok=True)
+    target = os.path.join(archive_dir, os.path.basename(path))
+    tmp_path = f"{target}.part"
+    with open(path, "rb") as src:
+        if compression_of(path) is None:
+            with gzip.GzipFile(tmp_path, mode="wb", mtime=0) as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    dst.write(block)
+        else:
+            with open(tmp_path, "wb") as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    dst.write(block)
+    os.replace(tmp_path, target)
+    return os.path.getsize(target)
+
+#########################
+# COMPACTION
+#########################
+
+class ArtifactCompactor:
+    """
+    Applies a RetentionPolicy to generated_files/<org>/ and reports what was reclaimed.
+    Runs on demand (compact_org / compact) or periodically in a background thread.
+    """
+    def __init__(self, root, policy=None):
+        self.root = root
+        self.policy = policy or RetentionPolicy.from_env()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_report = None
+
+    def _kept_dependencies(self, org, rows, dropped):
+        # Inputs of every kept artifact, i.e. files that must stay on disk
+        graph = get_graph(self.root)
+        needed = set()
+        for row in rows:
+            if row["filename"] not in dropped:
+                needed.update(dep["filename"] for dep in graph.dependencies(org, row["filename"]))
+        return needed
+
+    def plan_org(self, org, policy=None, now=None):
+        """Units to drop in an org as [{files, bytes, reason}], after sparing dependencies of kept files."""
+        policy = policy or self.policy
+        rows = [row for row in get_index(self.root).files(org) if not _hidden(row["filename"])]
+        units = _units(rows)
+        drop = plan(units, policy, now=now)
+        by_key = {unit["key"]: unit for unit in units}
+        file_unit = {name: unit["key"] for unit in units for name in unit["files"]}
+        spared = {}
+        # Keeping a unit can make its own inputs needed: repeat until nothing changes
+        while True:
+            dropped = {name for key in drop for name in by_key[key]["files"]}
+            needed = self._kept_dependencies(org, rows, dropped) & dropped
+            if not needed:
+                break
+            for name in needed:
+                key = file_unit[name]
+                if key in drop:
+                    spared[key] = drop.pop(key)
+        return {
+            "drop": [dict(files=sorted(by_key[key]["files"]), bytes=by_key[key]["bytes"], reason=reason)
+                     for key, reason in drop.items()],
+            "kept_for_dependents": sorted(name for key in spared for name in by_key[key]["files"]),
+        }
+
+    def compact_org(self, org, policy=None, dry_run=False, now=None, _dry_run_state=None):
+        """
+        Drop (archive or delete) what the policy selects in one org; returns the org's report.
+        "bytes" is the size of the dropped files; "reclaimed_bytes" only counts files whose
+        last link was removed. Space shared through the content store is freed (and counted)
+        by the store's garbage collection once no artifact links a blob any more.
+        """
+        policy = policy or self.policy
+        # A dry run unlinks nothing: count the links it would remove per inode (across orgs
+        # when called from compact()) and the store blobs that would be left unused
+        state = _dry_run_state if _dry_run_state is not None else {"links": {}, "blobs": {}}
+        with self._lock:
+            planned = self.plan_org(org, policy=policy, now=now)
+            report = {"org": org, "files": [], "bytes": 0, "reclaimed_bytes": 0, "archived_bytes": 0,
+                      "kept_for_dependents": planned["kept_for_dependents"], "dry_run": dry_run}
+            index = get_index(self.root)
+            graph = get_graph(self.root)
+            for unit in planned["drop"]:
+                for filename in unit["files"]:
+                    path = os.path.join(self.root, org, filename)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    inode = (st.st_dev, st.st_ino)
+                    remaining = st.st_nlink - state["links"].get(inode, 0)
+                    if not dry_run:
+                        try:
+                            if policy.archive:
+                                report["archived_bytes"] += _archive(self.root, org, path)
+                            os.remove(path)
+                        except OSError as e:
+                            logging.warning(f"Could not compact {path}: {e}")
+                            continue
+                        event_cache.invalidate(path)
+                        index.remove(org, filename)
+                        graph.forget(org, filename)
+                    else:
+                        state["links"][inode] = state["links"].get(inode, 0) + 1
+                    if remaining == 1:
+                        report["reclaimed_bytes"] += st.st_size
+                    elif remaining == 2 and dry_run:
+                        # Only the store's link would be left: the blob goes at garbage collection
+                        state["blobs"][inode] = st.st_size
+                    report["files"].append({"filename": filename, "bytes": st.st_size, "reason": unit["reason"]})
+                    report["bytes"] += st.st_size
+            if report["files"] and not dry_run:
+                logging.info(f"Compacted {org}: {len(report['files'])} files, {report['bytes']} bytes "
+                             f"({'archived' if policy.archive else 'deleted'})")
+            return report
+
+    def compact(self, orgs=None, policy=None, dry_run=False, now=None):
+        """
+        Compact every org (or the given ones). "reclaimed_bytes" totals the space actually
+        released: files removed with their last link, plus store blobs garbage-collected
+        afterwards (estimated for a dry run). "bytes" is the size of the dropped files.
+        """
+        orgs = orgs or get_index(self.root).organizations()
+        state = {"links": {}, "blobs": {}}
+        reports = [self.compact_org(org, policy=policy, dry_run=dry_run, now=now, _dry_run_state=state) for org in orgs]
+        if dry_run:
+            store = {"blobs": len(state["blobs"]), "bytes": sum(state["blobs"].values())}
+        else:
+            store = collect_garbage(self.root)
+        report = {
+            "policy": (policy or self.policy).to_dict(),
+            "dry_run": dry_run,
+            "orgs": reports,
+            "files": sum(len(r["files"]) for r in reports),
+            "bytes": sum(r["bytes"] for r in reports),
+            "reclaimed_bytes": sum(r["reclaimed_bytes"] for r in reports) + store["bytes"],
+            "archived_bytes": sum(r["archived_bytes"] for r in reports),
+            "store": store,
+            "finished_at": datetime.datetime.utcnow().isoformat(),
+        }
+        if not dry_run:
+            self.last_report = report
+        return report
+
+    def start(self, interval=ARTIFACT_COMPACTION_INTERVAL):
+        """Compact every `interval` seconds in a daemon thread (no-op when interval <= 0 or no policy is set)."""
+        if interval <= 0 or not self.policy.active:
+            return False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="artifact-compaction", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.compact()
+            except Exception as e:
+                logging.warning(f"Artifact compaction failed: {e}")
+
+_compactors = {}
+_compactors_lock = threading.Lock()
+
+def get_compactor(root):
+    """Shared ArtifactCompactor for a generated_files root, configured from the environment."""
+    root = os.path.abspath(root)
+    with _compactors_lock:
+        compactor = _compactors.get(root)
+        if compactor is None:
+            compactor = _compactors[root] = ArtifactCompactor(root)
+        return compactor
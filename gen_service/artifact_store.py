@@ -0,0 +1,272 @@
+import os
+import io
+import gzip
+import hashlib
+import logging
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd compression needs the zstandard package
+    zstandard = None
+
+#########################
+# ARTIFACT STORE
+#########################
+# Generated files keep their stable names under generated_files/<org>/, but are written
+# atomically (temporary file, fsync, rename) so readers never see a partial file. They
+# are optionally compressed, and files with identical content share one inode: each
+# finished file is hard-linked into generated_files/.store/<sha256>, and later files
+# with the same bytes become links to that blob. Anything rewriting a stored file must
+# replace it (as the writers here do) rather than modify it in place.
+
+STORE_DIRNAME = ".store"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def artifact_compression():
+    """ARTIFACT_COMPRESSION: "none" (default), "gzip" or "zstd" (falls back to gzip without zstandard)."""
+    value = os.getenv("ARTIFACT_COMPRESSION", "none").strip().lower()
+    if value in ("", "0", "off", "false", "no"):
+        return "none"
+    if value == "zstd" and zstandard is None:
+        logging.warning("ARTIFACT_COMPRESSION=zstd needs the zstandard package; using gzip.")
+        return "gzip"
+    if value not in ("none", "gzip", "zstd"):
+        logging.warning(f"Unknown ARTIFACT_COMPRESSION {value!r}; storing files uncompressed.")
+        return "none"
+    return value
+
+def dedup_enabled():
+    """ARTIFACT_DEDUP (default on) toggles hard-link deduplication of identical files."""
+    return os.getenv("ARTIFACT_DEDUP", "true").strip().lower() not in ("0", "false", "off", "no")
+
+def compression_of(path):
+    """Compression a stored file uses, detected from its magic bytes ("gzip", "zstd" or None)."""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+#########################
+# WRITING
+#########################
+
+class AtomicFile:
+    """
+    Text file written under `<path>.part` and moved into place on commit(), compressed
+    as configured. abort() discards it. The finished file is deduplicated on commit.
+    """
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.tmp_path = f"{path}.part"
+        self.compression = compression or artifact_compression()
+        self._raw = open(self.tmp_path, "wb")
+        if self.compression == "gzip":
+            # No name and mtime=0 keep identical content byte-identical (and so deduplicable)
+            self._stream = gzip.GzipFile(filename="", fileobj=self._raw, mode="wb", mtime=0)
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, text):
+        self._stream.write(text.encode("utf-8"))
+
+    def flush(self):
+        self._stream.flush()
+
+    def commit(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self.tmp_path, self.path)
+        deduplicate(self.path)
+
+    def abort(self):
+        if self._stream is not self._raw:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+        self._raw.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def write_text(path, text, compression=None):
+    """Atomically write a text artifact (compressed and deduplicated as configured)."""
+    f = AtomicFile(path, compression=compression)
+    try:
+        f.write(text)
+    except Exception:
+        f.abort()
+        raise
+    f.commit()
+
+def prepare_append(path):
+    """
+    Make an existing file safe to append to in place: give it its own inode if it shares
+    one with the store, and return the compression to append with (concatenated gzip
+    members / zstd frames read back as one stream).
+    """
+    if not os.path.exists(path):
+        return artifact_compression()
+    compression = compression_of(path)
+    if os.stat(path).st_nlink > 1:
+        tmp_path = f"{path}.part"
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            for block in iter(lambda: src.read(1024 * 1024), b""):
+                dst.write(block)
+        os.replace(tmp_path, path)
+    return compression or "none"
+
+class AppendFile:
+    """Text appender for an existing (possibly compressed) artifact; each flush() is a complete member/frame."""
+    def __init__(self, path):
+        self.path = path
+        self.compression = prepare_append(path)
+        self._raw = open(path, "ab")
+        self._pending = []
+
+    def write(self, text):
+        self._pending.append(text)
+
+    def flush(self):
+        if not self._pending:
+            return
+        data = "".join(self._pending).encode("utf-8")
+        self._pending = []
+        if self.compression == "gzip":
+            data = gzip.compress(data, mtime=0)
+        elif self.compression == "zstd":
+            data = zstandard.ZstdCompressor().compress(data)
+        self._raw.write(data)
+        self._raw.flush()
+
+    def tell(self):
+        return self._raw.tell()
+
+    def close(self):
+        self.flush()
+        self._raw.close()
+
+#########################
+# READING
+#########################
+
+def open_bytes(path):
+    """Open a stored artifact for reading as bytes, decompressing transparently."""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but the zstandard package is not installed.")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def open_text(path):
+    """Open a stored artifact for reading as text, decompressing transparently."""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but the zstandard package is not installed.")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True), encoding="utf-8")
+    return open(path, "r")
+
+def read_text(path):
+    with open_text(path) as f:
+        return f.read()
+
+def last_char(path):
+    """Last character of a stored artifact's text (reads the whole stream when compressed)."""
+    if compression_of(path) is None:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1).decode("utf-8", "replace")
+    text = read_text(path)
+    return text[-1:] if text else ""
+
+#########################
+# DEDUPLICATION
+#########################
+
+def store_dir(path):
+    # generated_files/<org>/<file> -> generated_files/.store
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), STORE_DIRNAME)
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def deduplicate(path):
+    """
+    Share one inode between files with identical bytes. Returns True when the file is
+    (now) backed by a store blob. Failures (e.g. no hard links on this filesystem) only
+    cost the saving.
+    """
+    if not dedup_enabled():
+        return False
+    try:
+        digest = _digest(path)
+        blob = os.path.join(store_dir(path), digest[:2], digest)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, path):
+                link_path = f"{path}.link"
+                os.link(blob, link_path)
+                os.replace(link_path, path)
+            # The shared inode's mtime is the latest write of this content
+            os.utime(blob)
+            return True
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.link(path, blob)
+        return True
+    except OSError as e:
+        logging.debug(f"Not deduplicating {path}: {e}")
+        return False
+
+def collect_garbage(root):
+    """Remove store blobs no longer linked from any artifact; returns {"blobs", "bytes"} reclaimed."""
+    reclaimed = {"blobs": 0, "bytes": 0}
+    base = os.path.join(root, STORE_DIRNAME)
+    if not os.path.isdir(base):
+        return reclaimed
+    for dirpath, _, filenames in os.walk(base):
+        for name in filenames:
+            blob = os.path.join(dirpath, name)
+            try:
+                st = os.stat(blob)
+                if st.st_nlink <= 1:
+                    os.remove(blob)
+                    reclaimed["blobs"] += 1
+                    reclaimed["bytes"] += st.st_size
+            except OSError:
+                continue
+    return reclaimed
+
+def store_stats(root):
+    """Blob count, stored bytes and bytes saved by sharing (links beyond the first per blob)."""
+    stats = {"blobs": 0, "bytes": 0, "saved_bytes": 0}
+    base = os.path.join(root, STORE_DIRNAME)
+    if not os.path.isdir(base):
+        return stats
+    for dirpath, _, filenames in os.walk(base):
+        for name in filenames:
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            stats["blobs"] += 1
+            stats["bytes"] += st.st_size
+            # One link is the store's own; one is the first artifact using the content
+            stats["saved_bytes"] += max(0, st.st_nlink - 2) * st.st_size
+    return stats
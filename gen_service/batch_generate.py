@@ -0,0 +1,270 @@
+"""
+Offline batch generation of demo packs for many orgs.
+
+    python batch_generate.py specs.jsonl [--workers 4] [--processes] [--rate-per-minute 120]
+
+Specs are JSONL (one object per line) or CSV (one row per org) with the fields
+org_name (or name), scenarios, service_names, itsm_tools, observability_tools,
+symptom, root_cause, blast_radius, max_events and seed. In CSV, scenarios are separated
+by ";" or "|". Each (org, scenario) pair is one job, written straight into
+generated_files/<org>/ through the artifact store and index, as /api/generate does.
+
+Finished jobs are appended to a progress file (<specs>.progress.jsonl by default); a
+rerun skips them, so an interrupted batch resumes where it stopped. Failed jobs are
+retried on the next run.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import hashlib
+import logging
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import llm_limiter
+from llm_limiter import LLMOverloaded, TokenBucket, BATCH, llm_context
+from scenario_files import generate_scenario_files, sanitize_org, SCENARIOS
+
+DEFAULT_OUTPUT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'generated_files'))
+DEFAULT_SCENARIOS = ['major', 'partial', 'well']
+SPEC_FIELDS = ('itsm_tools', 'observability_tools', 'service_names', 'symptom', 'root_cause', 'blast_radius',
+               'max_events', 'seed')
+
+#########################
+# SPECS & JOBS
+#########################
+
+def _as_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in re.split(r"[;|,]", str(value)) if v.strip()]
+
+def _as_text(value):
+    # Lists of services / tools are passed to the prompts as comma-separated text
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    return value if value not in ('', None) else None
+
+def _as_int(value):
+    if value in ('', None):
+        return None
+    return int(value)
+
+def read_specs(path):
+    """Org specs from a JSONL or CSV file, normalized; invalid rows are logged and skipped."""
+    with open(path, newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    specs = []
+    for n, row in enumerate(rows, 1):
+        name = (row.get('org_name') or row.get('name') or '').strip()
+        if not name:
+            logging.warning(f"Spec {n} has no org_name; skipping.")
+            continue
+        try:
+            spec = {
+                'org_name': name,
+                'scenarios': _as_list(row.get('scenarios')) or list(DEFAULT_SCENARIOS),
+                'itsm_tools': _as_text(row.get('itsm_tools')),
+                'observability_tools': _as_text(row.get('observability_tools')),
+                'service_names': _as_text(row.get('service_names')),
+                'symptom': _as_text(row.get('symptom')),
+                'root_cause': _as_text(row.get('root_cause')),
+                'blast_radius': _as_text(row.get('blast_radius')),
+                'max_events': _as_int(row.get('max_events')),
+                'seed': _as_int(row.get('seed')),
+            }
+        except ValueError as e:
+            logging.warning(f"Spec {n} ({name}): {e}; skipping.")
+            continue
+        unknown = [s for s in spec['scenarios'] if s not in SCENARIOS]
+        if unknown:
+            logging.warning(f"Spec {n} ({name}): unknown scenarios {unknown} ignored.")
+        spec['scenarios'] = [s for s in spec['scenarios'] if s in SCENARIOS]
+        specs.append(spec)
+    return specs
+
+def build_jobs(specs):
+    """One job per (org, scenario); the key changes whenever the job's inputs do."""
+    jobs = []
+    for spec in specs:
+        options = {field: spec[field] for field in SPEC_FIELDS}
+        for scenario in spec['scenarios']:
+            digest = hashlib.sha256(json.dumps([spec['org_name'], scenario, options], sort_keys=True).encode('utf-8')).hexdigest()
+            jobs.append({
+                'key': f"{sanitize_org(spec['org_name'])}:{scenario}:{digest[:12]}",
+                'org_name': spec['org_name'],
+                'scenario': scenario,
+                'options': options,
+            })
+    return jobs
+
+#########################
+# PROGRESS
+#########################
+
+def load_progress(path):
+    """Keys of jobs already completed according to the progress file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # line cut short by an interrupted run
+            if record.get('status') == 'done':
+                done.add(record['key'])
+    return done
+
+def append_progress(f, record):
+    f.write(json.dumps(record) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+#########################
+# WORKERS
+#########################
+
+def configure_rate_limit(rate_per_minute, share=1):
+    """Replace the LLM request rate cap of this process (share = number of processes splitting the rate)."""
+    if rate_per_minute and rate_per_minute > 0:
+        rate = rate_per_minute / 60.0 / max(1, share)
+        llm_limiter.rate_limiter = TokenBucket(rate, max(1.0, rate))
+
+def _count(events):
+    try:
+        return len(events)
+    except TypeError:
+        return None
+
+def run_job(job, output_root, api_key, max_attempts=3):
+    """Generate one (org, scenario) job; returns a progress record. Runs in a worker thread or process."""
+    started = time.monotonic()
+    org_folder = os.path.join(output_root, sanitize_org(job['org_name']))
+    record = {'key': job['key'], 'org': job['org_name'], 'scenario': job['scenario']}
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with llm_context(priority=BATCH, org=sanitize_org(job['org_name'])):
+                generated = generate_scenario_files(org_folder, job['org_name'], job['scenario'], api_key, **job['options'])
+            if generated is None:
+                record.update(status='failed', error='unknown scenario or missing service names')
+                break
+            events = _count(generated['events'])
+            change_events = _count(generated['change_events']) if generated['change_events'] is not None else 0
+            record.update(
+                status='done',
+                files=generated['files'],
+                events=(events or 0) + (change_events or 0),
+                bytes=sum(os.path.getsize(os.path.join(org_folder, name)) for name in generated['files']
+                          if os.path.exists(os.path.join(org_folder, name))),
+            )
+            break
+        except LLMOverloaded as e:
+            # Capacity or rate limit: back off and retry the whole job
+            record.update(status='failed', error=str(e))
+            if attempt < max_attempts:
+                time.sleep(e.retry_after)
+        except Exception as e:
+            record.update(status='failed', error=str(e))
+            break
+    record['seconds'] = round(time.monotonic() - started, 3)
+    record['finished_at'] = datetime.datetime.utcnow().isoformat()
+    return record
+
+#########################
+# MAIN
+#########################
+
+def summarize(records, skipped, elapsed):
+    done = [r for r in records if r['status'] == 'done']
+    failed = [r for r in records if r['status'] != 'done']
+    events = sum(r.get('events') or 0 for r in done)
+    return {
+        'jobs_done': len(done),
+        'jobs_failed': len(failed),
+        'jobs_skipped': skipped,
+        'events': events,
+        'bytes': sum(r.get('bytes') or 0 for r in done),
+        'elapsed_seconds': round(elapsed, 1),
+        'jobs_per_minute': round(len(done) / elapsed * 60, 2) if elapsed > 0 else None,
+        'events_per_second': round(events / elapsed, 2) if elapsed > 0 else None,
+        'failures': [{'org': r['org'], 'scenario': r['scenario'], 'error': r.get('error')} for r in failed],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate demo packs for many orgs from a CSV/JSONL spec file.")
+    parser.add_argument('specs', help="CSV or JSONL file of org specs")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="generated_files root (default: the backend's)")
+    parser.add_argument('--workers', type=int, default=4, help="parallel jobs (default: 4)")
+    parser.add_argument('--processes', action='store_true', help="use a process pool instead of threads")
+    parser.add_argument('--rate-per-minute', type=float, default=llm_limiter.LLM_RATE_PER_MINUTE,
+                        help="global cap on LLM requests per minute across all workers (default: LLM_RATE_PER_MINUTE)")
+    parser.add_argument('--progress', help="progress file (default: <specs>.progress.jsonl)")
+    parser.add_argument('--max-attempts', type=int, default=3, help="attempts per job when LLM capacity is exhausted")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set.")
+
+    jobs = build_jobs(read_specs(args.specs))
+    progress_path = args.progress or f"{args.specs}.progress.jsonl"
+    done = load_progress(progress_path)
+    pending = [job for job in jobs if job['key'] not in done]
+    skipped = len(jobs) - len(pending)
+    logging.info(f"{len(jobs)} jobs, {skipped} already done, {len(pending)} to run with {args.workers} "
+                 f"{'processes' if args.processes else 'threads'}")
+
+    workers = max(1, args.workers)
+    if args.processes:
+        # Each process gets an equal share of the global rate
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=configure_rate_limit,
+                                   initargs=(args.rate_per_minute, workers))
+    else:
+        # Threads share this process's limiter, so the rate applies to all of them
+        configure_rate_limit(args.rate_per_minute)
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    started = time.monotonic()
+    records = []
+    with pool, open(progress_path, 'a') as progress:
+        futures = {pool.submit(run_job, job, args.output, api_key, args.max_attempts): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:  # e.g. a worker process died
+                record = {'key': job['key'], 'org': job['org_name'], 'scenario': job['scenario'],
+                          'status': 'failed', 'error': str(e)}
+            append_progress(progress, record)
+            records.append(record)
+            if record['status'] == 'done':
+                logging.info(f"[{len(records)}/{len(pending)}] {record['org']} {record['scenario']}: "
+                             f"{len(record['files'])} files, {record.get('events')} events in {record.get('seconds')}s")
+            else:
+                logging.error(f"[{len(records)}/{len(pending)}] {record['org']} {record['scenario']} failed: {record.get('error')}")
+
+    summary = summarize(records, skipped, time.monotonic() - started)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Done: {summary['jobs_done']}, failed: {summary['jobs_failed']}, skipped (already done): {summary['jobs_skipped']}")
+        print(f"Elapsed: {summary['elapsed_seconds']}s, {summary['jobs_per_minute']} jobs/min, "
+              f"{summary['events']} events ({summary['events_per_second']} events/s), {summary['bytes']} bytes written")
+        for failure in summary['failures']:
+            print(f"  FAILED {failure['org']} {failure['scenario']}: {failure['error']}")
+    return 1 if summary['jobs_failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,11 @@ import json
 import logging
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
-from utils import get_llm
+from utils import get_llm, run_chain_with_retry
+from structured_output import parse_json_output
+from llm_limiter import LLMOverloaded
+from retry_policy import DeadlineExceeded
+from event_model import Event
 
 def generate_diagnostics(org_name, events, scenario=None, narrative=None):
     """
@@ -13,17 +17,18 @@ def generate_diagnostics(org_name, events, scenario=None, narrative=None):
       - org_name: string
       - scenario: string
       - narrative: full narrative text
-      - events: list of event payload dicts
+      - events: list of Event objects or event payload dicts
     Returns:
       dict { jobs: [ { index: int, yaml: string } ] }
     """
     # Simplify events for prompts
     simple_events = []
     for idx, ev in enumerate(events):
-        summary = ev.get('payload', {}).get('summary') if isinstance(ev, dict) else ''
+        summary = Event.from_obj(ev).summary if isinstance(ev, (dict, Event)) else ''
         simple_events.append({'index': idx, 'summary': summary})
 
-    llm = get_llm()
+    # Key-event selection is a small, cheap task; per-event commands use the main model
+    llm = get_llm(task="diagnostics_commands")
     # Step 1: Select key events
     select_prompt = ChatPromptTemplate.from_template(
         """
@@ -35,17 +40,18 @@ Return only a JSON array of the indices, for example: [0, 3, 5, 7, 9].
 Do not include any other text.
 """
     )
-    select_chain = LLMChain(llm=llm, prompt=select_prompt, verbose=False)
+    select_chain = LLMChain(llm=get_llm(task="diagnostics_select"), prompt=select_prompt, verbose=False)
     try:
-        select_raw = select_chain.run(
-            events=json.dumps(simple_events),
-            scenario=scenario or '',
-            narrative=narrative or ''
-        ).strip()
-        # Expect a JSON array
-        key_indices = json.loads(select_raw)
-        if not isinstance(key_indices, list):
-            raise ValueError("Expected a JSON array of indices")
+        select_raw = run_chain_with_retry(select_chain, {
+            "events": json.dumps(simple_events),
+            "scenario": scenario or '',
+            "narrative": narrative or ''
+        }).strip()
+        # Expect a JSON array (fences/prose tolerated by the repair parser)
+        key_indices = parse_json_output(select_raw, expect=list)
+        key_indices = [int(i) for i in key_indices if 0 <= int(i) < len(simple_events)]
+    except (LLMOverloaded, DeadlineExceeded):
+        raise
     except Exception as err:
         logging.error(f"Key event selection failed: {err}")
         key_indices = list(range(min(5, len(simple_events))))
@@ -102,11 +108,13 @@ narrative: |
         )
         job_chain = LLMChain(llm=llm, prompt=job_prompt, verbose=False)
         try:
-            cmds_raw = job_chain.run(
-                event_index=idx,
-                event_summary=ev['summary'],
-                narrative=narrative or ''
-            ).strip()
+            cmds_raw = run_chain_with_retry(job_chain, {
+                "event_index": idx,
+                "event_summary": ev['summary'],
+                "narrative": narrative or ''
+            }).strip()
+        except (LLMOverloaded, DeadlineExceeded):
+            raise
         except Exception as err:
             logging.error(f"Commands generation failed for event {idx}: {err}")
             cmds_raw = ''
@@ -0,0 +1,122 @@
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+
+class EventFileCache:
+    """
+    Thread-safe in-process cache of parsed event files keyed by path.
+    Entries are validated against the file's mtime and size on every lookup, so a file
+    rewritten by any process (including the Node preview editor) is re-parsed. Memory is
+    accounted by the measured size of the parsed events (several times the JSON text, and
+    unrelated to the on-disk size of compressed files); least recently used entries are
+    evicted once max_entries or max_bytes is exceeded. Files larger than max_file_bytes on
+    disk are never loaded into the cache.
+    Cached Event objects are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024, max_file_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_file_bytes = min(max_file_bytes, max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return os.path.realpath(path)
+
+    def cacheable(self, size):
+        return self.max_entries > 0 and size <= self.max_file_bytes
+
+    def get(self, path, loader):
+        """
+        Return the parsed events of path as a list, loading them with loader(path) on a
+        miss or when the file changed since it was cached.
+        """
+        key = self._key(path)
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+        events = tuple(loader(path))
+        if self.cacheable(st.st_size):
+            self._put(key, signature, events)
+        return list(events)
+
+    def _put(self, key, signature, events):
+        size = parsed_size(events)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (signature, events, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def invalidate(self, path):
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+def parsed_size(obj):
+    """
+    Approximate memory held by parsed events: sys.getsizeof over the containers, strings
+    and numbers, and the slots of objects such as Event. Shared objects are counted each
+    time they are reached, which errs on the high side.
+    """
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif hasattr(item, "__slots__"):
+            stack.extend(getattr(item, slot) for slot in item.__slots__ if hasattr(item, slot))
+    return total
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Shared process-wide cache; EVENT_CACHE_MAX_ENTRIES=0 disables caching
+event_cache = EventFileCache(
+    max_entries=_env_int("EVENT_CACHE_MAX_ENTRIES", 64),
+    max_bytes=_env_int("EVENT_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    max_file_bytes=_env_int("EVENT_CACHE_MAX_FILE_BYTES", 4 * 1024 * 1024),
+)
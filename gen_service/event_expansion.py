@@ -0,0 +1,144 @@
+import os
+import re
+import copy
+import random
+import logging
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Requested event counts above this are expanded locally from LLM-written templates
+EVENT_EXPANSION_THRESHOLD = _env_int("EVENT_EXPANSION_THRESHOLD", 100)
+# Hard cap on the number of events a single expansion may produce
+EVENT_EXPANSION_MAX = _env_int("EVENT_EXPANSION_MAX", 100000)
+
+# Severity ladder used when nudging variant severities up or down
+SEVERITY_LADDER = ["info", "warning", "error", "critical"]
+# Keys that mark the single scenario-defining alert; only its first variant keeps them
+MAJOR_ALERT_KEYS = ("major_failure", "CUJ Impacted")
+
+def expansion_target(max_events, seed=None):
+    """
+    Parse a max_events value (int, "5000" or a "4000-6000" range) and return the number of
+    events to synthesize locally, or None when the LLM should emit the events directly.
+    Ranges resolve to a seed-deterministic count within the range.
+    """
+    if max_events is None or max_events == "":
+        return None
+    numbers = [int(n) for n in re.findall(r"\d+", str(max_events))]
+    if not numbers:
+        return None
+    low, high = min(numbers), max(numbers)
+    if high <= EVENT_EXPANSION_THRESHOLD:
+        return None
+    target = random.Random(seed).randint(low, high) if low != high else high
+    return min(target, EVENT_EXPANSION_MAX)
+
+def _slug(value):
+    return re.sub(r"[^a-z0-9]+", "-", str(value or "").lower()).strip("-") or "host"
+
+def _offset(ev):
+    timing = ev.get("timing_metadata") or ev.get("payload", {}).get("timing_metadata") or {}
+    try:
+        return int(timing.get("schedule_offset", 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _repeats(ev):
+    repeats = ev.get("repeat_schedule") or ev.get("payload", {}).get("repeat_schedule") or []
+    return [r for r in repeats if isinstance(r, dict)] if isinstance(repeats, list) else []
+
+def _count(value):
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _sends(ev):
+    return 1 + sum(_count(r.get("repeat_count")) for r in _repeats(ev))
+
+def _span(ev):
+    """Seconds from scenario start to the template's last scheduled send."""
+    return _offset(ev) + sum(_count(r.get("repeat_count")) * _count(r.get("repeat_offset")) for r in _repeats(ev))
+
+def _repeat_schedule(rng, sends, start, duration):
+    """Repeat entries giving exactly `sends` total sends that fit between start and duration."""
+    repeats = sends - 1
+    if repeats <= 0:
+        return []
+    window = max(1, duration - start)
+    if repeats < 4:
+        return [{"repeat_count": repeats, "repeat_offset": max(1, window // (repeats + 1))}]
+    # Two phases: a tight burst followed by a slower tail
+    burst = rng.randint(1, repeats - 1)
+    burst_offset = max(1, window // (2 * burst + 2))
+    tail_offset = max(1, (window - burst * burst_offset) // (repeats - burst + 1))
+    return [
+        {"repeat_count": burst, "repeat_offset": burst_offset},
+        {"repeat_count": repeats - burst, "repeat_offset": tail_offset},
+    ]
+
+def _vary_severity(rng, severity, allowed):
+    if len(allowed) < 2 or severity not in allowed or rng.random() >= 0.3:
+        return severity
+    index = allowed.index(severity) + rng.choice((-1, 1))
+    return allowed[min(max(index, 0), len(allowed) - 1)]
+
+def _make_variant(rng, template, variant, sends, duration, allowed_severities):
+    ev = copy.deepcopy(template)
+    payload = ev.setdefault("payload", {})
+    cd = payload.setdefault("custom_details", {})
+    is_major = any(cd.get(key) for key in MAJOR_ALERT_KEYS)
+    if variant > 0:
+        for key in MAJOR_ALERT_KEYS:
+            cd.pop(key, None)
+        if not is_major:
+            payload["severity"] = _vary_severity(rng, payload.get("severity"), allowed_severities)
+    # Deterministic host identity per variant (replaces the per-send faker placeholders)
+    service = _slug(cd.get("service_name") or payload.get("component"))
+    cd["hostname"] = f"{service}-{rng.randint(1, 64):02d}.{rng.choice(['prod', 'prod-east', 'prod-west', 'dr'])}.internal"
+    cd["ip_address"] = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+    # The first variant keeps the template's offset; later variants are jittered around it
+    start = _offset(template)
+    if variant > 0:
+        spread = max(1, duration // 10)
+        start = min(max(start + rng.randint(-spread, spread), 0), duration)
+    timing = ev.get("timing_metadata") if isinstance(ev.get("timing_metadata"), dict) else {}
+    timing["schedule_offset"] = start
+    ev["timing_metadata"] = timing
+    payload.pop("timing_metadata", None)
+    payload.pop("repeat_schedule", None)
+    ev["repeat_schedule"] = _repeat_schedule(rng, sends, start, duration)
+    return ev
+
+def expand_events(templates, target, seed=None, duration=None):
+    """
+    Synthesize alert events from a compact set of templates so that the total number of
+    sends (initial send plus repeats, as replayed by the backend) equals `target`.
+    Variants differ in host, IP, severity (within the severities the templates use),
+    schedule offset and repeat schedule; output is fully determined by the seed.
+    """
+    templates = [t for t in templates or [] if isinstance(t, dict)]
+    if not templates or not target or target <= 0:
+        return templates
+    rng = random.Random(seed)
+    # Variants stay within the time window the templates themselves cover
+    duration = duration or max(60, max(_span(t) for t in templates))
+    used = {str(t.get("payload", {}).get("severity", "")).lower() for t in templates}
+    allowed_severities = [s for s in SEVERITY_LADDER if s in used]
+    # Keep roughly the template's own send density per distinct alert
+    per_variant = max(1, round(sum(_sends(t) for t in templates) / len(templates)))
+    variants = min(target, max(len(templates), -(-target // per_variant)))
+    base, extra = divmod(target, variants)
+
+    events = []
+    for i in range(variants):
+        template = templates[i % len(templates)]
+        sends = base + (1 if i < extra else 0)
+        events.append(_make_variant(rng, template, i // len(templates), sends, duration, allowed_severities))
+    events.sort(key=_offset)
+    return events
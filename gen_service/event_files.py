@@ -0,0 +1,253 @@
+import os
+import json
+import logging
+import textwrap
+from event_model import Event, as_dict, parse_events
+from structured_output import IncrementalJSONArrayParser
+from event_cache import event_cache
+from artifact_store import AtomicFile, AppendFile, open_text, last_char, compression_of
+
+#########################
+# EVENT FILE FORMATS
+#########################
+# Two on-disk formats are supported side by side, selected by file extension:
+#   .json    legacy pretty-printed JSON array (what the Node backend and older files use)
+#   .ndjson  one compact event object per line; append-friendly and readable line by line
+# Readers accept either; EVENT_FILE_FORMAT picks the format newly generated files use.
+
+JSON_EXT = ".json"
+NDJSON_EXT = ".ndjson"
+FORMAT_EXTENSIONS = {"json": JSON_EXT, "ndjson": NDJSON_EXT}
+
+# Assumed expansion of compressed event files when deciding whether to cache them
+COMPRESSED_SIZE_FACTOR = 10
+
+# Chunk size used when streaming legacy array files
+READ_CHUNK_SIZE = 64 * 1024
+
+def event_file_format():
+    """EVENT_FILE_FORMAT ("json" by default, or "ndjson") for newly generated event files."""
+    fmt = os.getenv("EVENT_FILE_FORMAT", "json").strip().lower()
+    if fmt not in FORMAT_EXTENSIONS:
+        logging.warning(f"Unknown EVENT_FILE_FORMAT {fmt!r}; using json.")
+        return "json"
+    return fmt
+
+def events_extension(fmt=None):
+    """File extension for an event file format (defaults to EVENT_FILE_FORMAT)."""
+    return FORMAT_EXTENSIONS[fmt or event_file_format()]
+
+def format_of(path):
+    return "ndjson" if str(path).lower().endswith(NDJSON_EXT) else "json"
+
+def is_event_file(filename):
+    return filename.lower().endswith((JSON_EXT, NDJSON_EXT))
+
+#########################
+# ENCODING
+#########################
+
+def _array_item(event, index):
+    # Same bytes as json.dumps(events, indent=2), one element at a time
+    return ("[\n" if index == 0 else ",\n") + textwrap.indent(json.dumps(as_dict(event), indent=2), "  ")
+
+def _array_end(count):
+    return "\n]" if count else "[]"
+
+def _ndjson_line(event):
+    return json.dumps(as_dict(event), separators=(",", ":")) + "\n"
+
+def encode_events(events, fmt="json"):
+    """Yield the serialized text of an event iterable in the given format, one event at a time."""
+    if fmt == "ndjson":
+        for ev in events:
+            yield _ndjson_line(ev)
+        return
+    count = 0
+    for ev in events:
+        yield _array_item(ev, count)
+        count += 1
+    yield _array_end(count)
+
+#########################
+# WRITERS
+#########################
+
+class EventArrayWriter:
+    """
+    Append events to a JSON array file as they arrive. Output is byte-identical to
+    json.dumps(events, indent=2); the file is written atomically through the artifact
+    store (temporary name moved into place on close), so readers never see a partial array.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = AtomicFile(path)
+        self.count = 0
+
+    def write(self, event):
+        self._file.write(_array_item(event, self.count))
+        self.count += 1
+
+    def close(self):
+        self._file.write(_array_end(self.count))
+        self._file.commit()
+        event_cache.invalidate(self.path)
+
+    def abort(self):
+        self._file.abort()
+
+class NDJSONEventWriter:
+    """
+    Write events as NDJSON, one line per event. New files are written under a temporary
+    name and moved into place on close; with append=True lines go straight onto the end of
+    an existing file (each line is flushed whole, so readers only ever miss the last one).
+    """
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.count = 0
+        if not append:
+            self._file = AtomicFile(path)
+            return
+        # Never glue the first new event onto a line cut short by an interrupted append
+        needs_newline = os.path.exists(path) and os.path.getsize(path) > 0 and last_char(path) != "\n"
+        self._file = AppendFile(path)
+        if needs_newline:
+            self._file.write("\n")
+
+    def write(self, event):
+        self._file.write(_ndjson_line(event))
+        if self.append:
+            self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.append:
+            self._file.close()
+        else:
+            self._file.commit()
+        event_cache.invalidate(self.path)
+
+    def abort(self):
+        if self.append:
+            self._file.close()
+        else:
+            self._file.abort()
+
+def open_event_writer(path, append=False):
+    """Streaming writer for an event file, in the format given by its extension."""
+    if format_of(path) == "ndjson":
+        return NDJSONEventWriter(path, append=append)
+    if append:
+        raise ValueError("Legacy JSON array files cannot be appended to; use an .ndjson file.")
+    return EventArrayWriter(path)
+
+def write_events_file(path, events):
+    """Write an event iterable atomically in the format given by the path's extension."""
+    writer = open_event_writer(path)
+    try:
+        for ev in events:
+            writer.write(ev)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.count
+
+def append_events(path, events):
+    """Append events to an NDJSON event file (created if missing); returns the number written."""
+    writer = open_event_writer(path, append=True)
+    try:
+        for ev in events:
+            writer.write(ev)
+    finally:
+        writer.close()
+    return writer.count
+
+#########################
+# READERS
+#########################
+
+def _iter_ndjson(f, path):
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            # Typically a line cut short by an interrupted append
+            logging.warning(f"Skipping malformed line {lineno} in {path}: {e}")
+            continue
+        if isinstance(obj, dict):
+            yield Event(obj)
+
+def _iter_json_array(f):
+    # Peek at the first significant character: only a leading array is streamed
+    head = f.read(READ_CHUNK_SIZE)
+    first = head.lstrip()[:1]
+    if first != "[":
+        # A single object or text with noise around the array: parse it whole
+        yield from parse_events(head + f.read())
+        return
+    parser = IncrementalJSONArrayParser()
+    chunk = head
+    while chunk:
+        for obj in parser.feed(chunk):
+            if isinstance(obj, dict):
+                yield Event(obj)
+        chunk = f.read(READ_CHUNK_SIZE)
+
+def iter_events(path):
+    """
+    Stream an event file as Event objects, one at a time, in either format.
+    Memory stays proportional to a single event for NDJSON and for plain JSON arrays.
+    """
+    with open_text(path) as f:
+        if format_of(path) == "ndjson":
+            yield from _iter_ndjson(f, path)
+        else:
+            yield from _iter_json_array(f)
+
+def load_events(path):
+    """Parse a whole event file (either format) into a list of Events."""
+    return list(iter_events(path))
+
+def cached_events(path):
+    """
+    Parsed events of a file from the in-process cache (see event_cache), re-parsed only
+    when the file changed. The Events are shared: treat them as read-only.
+    """
+    return event_cache.get(path, load_events)
+
+def read_events(path):
+    """
+    Events of a file for read-only use: the cached list when the file fits in the
+    cache, otherwise a stream from disk (so very large files keep constant memory).
+    """
+    size = os.path.getsize(path)
+    if compression_of(path):
+        # Judge compressed files by a conservative estimate of their text size
+        size *= COMPRESSED_SIZE_FACTOR
+    if event_cache.cacheable(size):
+        return cached_events(path)
+    return iter_events(path)
+
+#########################
+# CONVERSION
+#########################
+
+def converted_path(path, fmt):
+    return os.path.splitext(path)[0] + events_extension(fmt)
+
+def convert_event_file(src, dst=None, fmt=None):
+    """
+    Stream-convert an event file between the legacy array and NDJSON formats.
+    dst defaults to src with the other format's extension; returns the destination path.
+    """
+    if dst is None:
+        fmt = fmt or ("json" if format_of(src) == "ndjson" else "ndjson")
+        dst = converted_path(src, fmt)
+    count = write_events_file(dst, iter_events(src))
+    logging.info(f"Converted {count} events from {src} to {dst}")
+    return dst
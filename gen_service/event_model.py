@@ -0,0 +1,118 @@
+import json
+
+# Scheduling metadata used for replay only; never sent to PagerDuty
+SCHEDULE_KEYS = ("timing_metadata", "repeat_schedule")
+
+class Event:
+    """
+    Compact typed view over one parsed event object (alert or change event).
+    Wraps the parsed dict without copying it; typed accessors read through to it and
+    custom_details is only resolved on first access. Serialize with to_dict() /
+    dumps_events(), once per output target.
+    """
+    __slots__ = ("_data", "_custom_details")
+
+    def __init__(self, data):
+        self._data = data if isinstance(data, dict) else {}
+        self._custom_details = None
+
+    @classmethod
+    def from_obj(cls, obj):
+        return obj if isinstance(obj, Event) else cls(obj)
+
+    def to_dict(self):
+        """The underlying event object (not a copy)."""
+        return self._data
+
+    @property
+    def payload(self):
+        payload = self._data.get("payload")
+        return payload if isinstance(payload, dict) else {}
+
+    @property
+    def is_change(self):
+        # Same rule as the Node backend: change events carry routing_key or links
+        return "routing_key" in self._data or "links" in self._data
+
+    @property
+    def event_action(self):
+        return self._data.get("event_action", "trigger")
+
+    @property
+    def summary(self):
+        return self.payload.get("summary", "")
+
+    @property
+    def severity(self):
+        return self.payload.get("severity")
+
+    @property
+    def source(self):
+        return self.payload.get("source")
+
+    @property
+    def custom_details(self):
+        if self._custom_details is None:
+            details = self.payload.get("custom_details")
+            self._custom_details = details if isinstance(details, dict) else {}
+        return self._custom_details
+
+    @property
+    def schedule_offset(self):
+        timing = self._data.get("timing_metadata") or self.payload.get("timing_metadata") or {}
+        return timing.get("schedule_offset", 0) if isinstance(timing, dict) else 0
+
+    @property
+    def repeat_schedule(self):
+        repeats = self._data.get("repeat_schedule") or self.payload.get("repeat_schedule") or []
+        return [r for r in repeats if isinstance(r, dict)] if isinstance(repeats, list) else []
+
+    @property
+    def total_repeats(self):
+        return sum(int(r.get("repeat_count", 0) or 0) for r in self.repeat_schedule)
+
+    def schedule_summary(self):
+        """Replay summary shown by the event sender UI."""
+        repeats = self.repeat_schedule
+        total_repeats = self.total_repeats
+        return {
+            "summary": self.summary,
+            "initial_offset": self.schedule_offset,
+            "total_repeats": total_repeats,
+            "total_sends": 1 + total_repeats,
+            "next_offset": repeats[0].get("repeat_offset") if repeats else None,
+        }
+
+    def send_body(self, routing_key=None):
+        """Top-level copy without scheduling metadata, optionally with a routing key (nested objects are shared)."""
+        body = {key: value for key, value in self._data.items() if key not in SCHEDULE_KEYS}
+        if routing_key is not None:
+            body["routing_key"] = routing_key
+        return body
+
+def as_dict(ev):
+    return ev.to_dict() if isinstance(ev, Event) else ev
+
+def wrap_events(items):
+    """Wrap parsed event objects (or a single object) as Events, skipping non-objects."""
+    if isinstance(items, (dict, Event)):
+        items = [items]
+    return [Event.from_obj(item) for item in items or [] if isinstance(item, (dict, Event))]
+
+def parse_events(text):
+    """
+    Parse an events file body once into Events. Falls back to the outermost [...] span
+    for files with surrounding noise, like the Node backend's loader.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end == -1:
+            raise ValueError("File does not contain a valid JSON array.")
+        data = json.loads(text[start:end + 1])
+    return wrap_events(data)
+
+def dumps_events(events):
+    """Serialize events the way generated files and API responses store them."""
+    return json.dumps([as_dict(ev) for ev in events], indent=2)
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from event_files import format_of, read_events, READ_CHUNK_SIZE
+from artifact_store import compression_of
+from structured_output import IncrementalJSONArrayParser
+
+#########################
+# EVENT OFFSET INDEX
+#########################
+# Byte span of every event in an event file, built in one streaming pass, so the preview
+# can read event N, or events N..N+k, with a seek and a single read instead of parsing the
+# whole file. Spans are kept in memory per file (validated by mtime and size, like
+# event_cache). Only events the sequential readers in event_files would yield get a span
+# (each candidate is parsed while scanning), so event N means the same event everywhere.
+# Compressed files and legacy files with text around the array have no offsets and are
+# read sequentially instead.
+
+# Structural bytes of a JSON document; everything else is skipped by the scanner
+_JSON_SPECIAL = re.compile(rb'["\\{}\[\]]')
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+def _ndjson_event(line):
+    # Same rule as event_files._iter_ndjson: the line must parse to an object
+    try:
+        return isinstance(json.loads(line), dict)
+    except ValueError:
+        return False
+
+def _scan_ndjson(f):
+    # One span per line the NDJSON reader yields (malformed lines are skipped by both)
+    spans = array("Q")
+    pos = 0
+    for line in f:
+        stripped = line.strip()
+        if stripped.startswith(b"{") and stripped.endswith(b"}") and _ndjson_event(stripped):
+            start = pos + (len(line) - len(line.lstrip()))
+            spans.extend((start, start + len(stripped)))
+        pos += len(line)
+    return spans
+
+def _parse_span(raw):
+    # Same rule as the streamed array reader: parsed, or repaired, or skipped
+    return IncrementalJSONArrayParser.parse_element(raw.decode("utf-8", "replace"))
+
+def _scan_json_array(f):
+    # Spans of the objects directly inside a top-level array; None if the file is not one
+    spans = array("Q")
+    depth = 0
+    in_string = False
+    skip = -1
+    start = None
+    parts = []
+    base = 0
+    seen_array = False
+    while True:
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        if not seen_array:
+            head = chunk.lstrip()
+            if head and not head.startswith(b"["):
+                return None
+            seen_array = bool(head)
+        for match in _JSON_SPECIAL.finditer(chunk):
+            pos = base + match.start()
+            if pos == skip:
+                continue
+            char = match.group()
+            if in_string:
+                if char == b"\\":
+                    skip = pos + 1
+                elif char == b'"':
+                    in_string = False
+            elif char == b'"':
+                in_string = True
+            elif char in (b"{", b"["):
+                depth += 1
+                if depth == 2 and char == b"{":
+                    start = pos
+                    parts = []
+            else:
+                if depth == 2 and char == b"}" and start is not None:
+                    # The object's bytes: earlier chunks' parts plus this chunk's piece
+                    parts.append(chunk[max(start - base, 0):pos - base + 1])
+                    if isinstance(_parse_span(b"".join(parts)), dict):
+                        spans.extend((start, pos + 1))
+                    start = None
+                    parts = []
+                depth -= 1
+        if start is not None:
+            parts.append(chunk[max(start - base, 0):])
+        base += len(chunk)
+    return spans
+
+def build_offsets(path):
+    """Byte spans (flat array of start, end pairs) of the events in a file, or None if it cannot be seeked."""
+    if compression_of(path) is not None:
+        return None
+    with open(path, "rb") as f:
+        if format_of(path) == "ndjson":
+            return _scan_ndjson(f)
+        return _scan_json_array(f)
+
+class EventOffsetCache:
+    """
+    LRU of per-file offset indexes, keyed by real path and validated by (mtime, size).
+    Each entry is [signature, offsets, total]; files without offsets get their event
+    count filled in by the first full sequential pass over them.
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entry(self, path):
+        key = os.path.realpath(path)
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                return entry
+        offsets = build_offsets(path)
+        entry = [signature, offsets, None if offsets is None else len(offsets) // 2]
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def get(self, path):
+        return self.entry(path)[1]
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(os.path.realpath(path), None)
+
+# EVENT_OFFSET_CACHE_ENTRIES=0 rebuilds the offsets on every request
+offset_cache = EventOffsetCache(max_entries=_env_int("EVENT_OFFSET_CACHE_ENTRIES", 32))
+
+# Default and maximum number of events per preview page
+PREVIEW_PAGE_SIZE = _env_int("PREVIEW_PAGE_SIZE", 50)
+PREVIEW_MAX_PAGE_SIZE = _env_int("PREVIEW_MAX_PAGE_SIZE", 500)
+
+#########################
+# SLICES & PROJECTION
+#########################
+
+def project(obj, fields):
+    """Keep only the given dotted field paths of an event (e.g. "payload.summary"), preserving nesting."""
+    if not fields:
+        return obj
+    projected = {}
+    for field in fields:
+        value, found = obj, True
+        for part in field.split("."):
+            if isinstance(value, dict) and part in value:
+                value = value[part]
+            else:
+                found = False
+                break
+        if not found:
+            continue
+        target = projected
+        parts = field.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+            if not isinstance(target, dict):
+                break
+        else:
+            target[parts[-1]] = value
+    return projected
+
+def _read_sequential(path, entry, offset, limit, count):
+    # One pass for files without offsets: collect the slice, and count the rest of the
+    # file only while the total is not known yet
+    stop = offset + max(0, limit)
+    need_total = count and entry[2] is None
+    events = []
+    n = 0
+    for ev in read_events(path):
+        if offset <= n < stop:
+            events.append(ev.to_dict())
+        n += 1
+        if n >= stop and not need_total:
+            break
+    if need_total:
+        entry[2] = n
+    return events, entry[2]
+
+def count_events(path):
+    entry = offset_cache.entry(path)
+    if entry[2] is None:
+        _read_sequential(path, entry, 0, 0, True)
+    return entry[2]
+
+def read_event_slice(path, offset=0, limit=50, count=True):
+    """
+    Events [offset, offset + limit) of a file as dicts, plus the file's total event count
+    (None with count=False while it is not known yet). Indexed files are read with one seek and one read covering
+    the slice; other files in one sequential pass, counted once per version of the file.
+    """
+    offset = max(0, offset)
+    entry = offset_cache.entry(path)
+    offsets = entry[1]
+    if offsets is None:
+        return _read_sequential(path, entry, offset, limit, count)
+    total = len(offsets) // 2
+    stop = min(total, offset + max(0, limit))
+    if offset >= stop:
+        return [], total
+    first = offsets[2 * offset]
+    with open(path, "rb") as f:
+        f.seek(first)
+        block = f.read(offsets[2 * stop - 1] - first)
+    events = []
+    for i in range(offset, stop):
+        events.append(_parse_span(block[offsets[2 * i] - first:offsets[2 * i + 1] - first]))
+    return events, total
+
+def read_event(path, index):
+    """One event of a file as a dict; IndexError if there is no such event."""
+    if index < 0:
+        raise IndexError(index)
+    events, _ = read_event_slice(path, index, 1, count=False)
+    if not events:
+        raise IndexError(index)
+    return events[0]
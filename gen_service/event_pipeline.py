@@ -0,0 +1,142 @@
+from event_model import wrap_events
+
+#########################
+# POST-PROCESSING RULES
+#########################
+# Declarative transforms applied to every generated event, one pass per event.
+# Paths are dotted (`payload.custom_details.event_id`); integer segments index lists.
+#   ("set", path, value)           set value, creating intermediate objects
+#   ("set_existing", path, value)  set value only if the parent container already exists
+#   ("swap", a, b)                 if b exists, exchange the values at a and b (a defaults to "")
+
+# Per-send timestamp placeholder for change events: between 30m and 60s before send time
+CHANGE_TIMESTAMP = '{{ timestamp(-1800, -60) }}'
+CHANGE_TICKET = "{{ 'CHG' + faker.datatype.number({ min: 10000, max: 999999 }) }}"
+ENVIRONMENT = "{{ faker.helpers.arrayElement(['production','staging','development','testing']) }}"
+
+ALERT_RULES = (
+    # The description drives the alert title; the model's summary becomes the description
+    ("swap", "payload.summary", "payload.custom_details.description"),
+    ("set", "payload.custom_details.event_id", '{{ faker.datatype.uuid() }}'),
+    ("set", "payload.custom_details.hostname", '{{ faker.internet.domainName() }}'),
+    ("set", "payload.custom_details.ip_address", '{{ faker.internet.ip() }}'),
+    ("set", "payload.custom_details.cluster_name", '{{ faker.commerce.department() + "-cluster" }}'),
+)
+
+CHANGE_RULES = {
+    # Changes that introduced the fault
+    "major": (
+        ("set", "payload.timestamp", CHANGE_TIMESTAMP),
+        ("set", "payload.custom_details.build_number", '{{ faker.datatype.number({ min: 10000, max: 99999 }) }}'),
+        ("set", "payload.custom_details.change_ticket", CHANGE_TICKET),
+        ("set", "payload.custom_details.environment", ENVIRONMENT),
+        ("set_existing", "links.0.href", "{{ faker.internet.url() }}"),
+        ("set_existing", "links.0.text", "{{ 'View Change ' + ('CHG' + faker.datatype.number({ min: 10000, max: 999999 })) }}"),
+    ),
+    # Root-cause config drift
+    "partial": (
+        ("set", "payload.timestamp", CHANGE_TIMESTAMP),
+        ("set", "payload.custom_details.change_ticket", CHANGE_TICKET),
+        ("set", "payload.custom_details.environment", ENVIRONMENT),
+    ),
+    # Automated remediation
+    "well": (
+        ("set", "payload.timestamp", CHANGE_TIMESTAMP),
+        ("set", "payload.custom_details.automation_job_id", '{{ faker.datatype.uuid() }}'),
+        ("set", "payload.custom_details.action_type", "{{ faker.helpers.arrayElement(['autoscale','hotfix_deploy','config_rollback']) }}"),
+    ),
+}
+
+#########################
+# COMPILED PIPELINE
+#########################
+
+_MISSING = object()
+
+def _parse_path(path):
+    return tuple(int(part) if part.isdigit() else part for part in path.split("."))
+
+def _get(container, key):
+    if isinstance(container, dict):
+        return container.get(key, _MISSING)
+    if isinstance(container, list) and isinstance(key, int) and key < len(container):
+        return container[key]
+    return _MISSING
+
+def _walk(ev, parents, create):
+    node = ev
+    for key in parents:
+        child = _get(node, key)
+        if not isinstance(child, (dict, list)):
+            if not create or not isinstance(node, dict):
+                return None
+            child = node[key] = {}
+        node = child
+    return node
+
+def _assign(node, key, value):
+    if isinstance(node, dict):
+        node[key] = value
+    elif isinstance(node, list) and isinstance(key, int) and key < len(node):
+        node[key] = value
+
+def _compile_rule(rule):
+    op, path = rule[0], _parse_path(rule[1])
+    parents, key = path[:-1], path[-1]
+    if op in ("set", "set_existing"):
+        value = rule[2]
+        create = op == "set"
+        def apply(ev):
+            node = _walk(ev, parents, create)
+            if node is not None:
+                _assign(node, key, value)
+        return apply
+    if op == "swap":
+        other = _parse_path(rule[2])
+        other_parents, other_key = other[:-1], other[-1]
+        def apply(ev):
+            other_node = _walk(ev, other_parents, False)
+            if other_node is None or _get(other_node, other_key) is _MISSING:
+                return
+            node = _walk(ev, parents, True)
+            if node is None:
+                return
+            current = _get(node, key)
+            _assign(node, key, other_node[other_key])
+            _assign(other_node, other_key, "" if current is _MISSING else current)
+        return apply
+    raise ValueError(f"Unknown post-processing rule {op!r}")
+
+class EventPipeline:
+    """Post-processing rules compiled once into path accessors and applied in a single pass per event."""
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self._steps = tuple(_compile_rule(rule) for rule in self.rules)
+
+    def apply(self, ev):
+        """Transform one event in place and return it."""
+        for step in self._steps:
+            step(ev)
+        return ev
+
+    def process(self, events):
+        """Lazily transform an iterable (e.g. a streamed parse) of events, skipping non-objects."""
+        for ev in events:
+            if isinstance(ev, dict):
+                yield self.apply(ev)
+
+    def process_all(self, events):
+        return list(self.process(events or []))
+
+    def process_events(self, events):
+        """Transform parsed events and return them as Event objects."""
+        return wrap_events(self.process(events or []))
+
+ALERT_PIPELINE = EventPipeline(ALERT_RULES)
+CHANGE_PIPELINES = {scenario: EventPipeline(rules) for scenario, rules in CHANGE_RULES.items()}
+
+def pipeline_for(kind, scenario=None):
+    """Pipeline for "alert" events (all scenarios) or "change" events of a scenario."""
+    if kind == "alert":
+        return ALERT_PIPELINE
+    return CHANGE_PIPELINES[scenario]
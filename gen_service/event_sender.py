@@ -4,6 +4,10 @@ import logging
 import requests
 import time
 from flask import Flask, render_template, request, redirect, url_for, jsonify
+from placeholder_renderer import render_placeholders
+from event_model import Event
+from event_files import read_events
+from artifact_index import get_index, EVENT_KINDS
 
 PAGERDUTY_API_URL = "https://events.pagerduty.com/v2/enqueue"
 # Store generated files in the backend service directory so Node backend and Preview UIs share the same files
@@ -15,59 +19,24 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 def list_organizations():
     """Return a list of organization subdirectories."""
-    orgs = []
-    base_dir = GENERATED_FOLDER
-    if os.path.exists(base_dir):
-        for entry in os.listdir(base_dir):
-            path = os.path.join(base_dir, entry)
-            if os.path.isdir(path):
-                orgs.append(entry)
-    return orgs
+    return get_index(GENERATED_FOLDER).organizations()
 
 def list_event_files(org):
-    """Return a list of JSON event files for a given organization."""
-    org_folder = os.path.join(GENERATED_FOLDER, org)
-    files = []
-    if os.path.exists(org_folder):
-        for f in os.listdir(org_folder):
-            if f.endswith("events.json") or "events_" in f:  # adjust as needed
-                files.append(f)
-    return files
+    """Return the event and change event files (JSON array or NDJSON) of an organization, newest first."""
+    return get_index(GENERATED_FOLDER).filenames(org, kinds=EVENT_KINDS)
 
-def load_event_file(org, filename):
-    """Load a JSON event file with cleanup for malformed data."""
-    path = os.path.join(GENERATED_FOLDER, org, filename)
-    with open(path, 'r') as f:
-        content = f.read().strip()
+def event_file_path(org, filename):
+    return os.path.join(GENERATED_FOLDER, org, filename)
 
-    # Extract the JSON array by finding the first '[' and last ']'
-    start_index = content.find("[")
-    end_index = content.rfind("]")
-    if start_index == -1 or end_index == -1:
-        raise ValueError("File does not contain a valid JSON array.")
-    content = content[start_index:end_index+1]
-
-    try:
-        data = json.loads(content)
-        return data
-    except json.JSONDecodeError as e:
-        logging.error(f"JSON decode error in file {filename}: {e}")
-        raise
-
-def prepare_event_payload(event):
-    """
-    Remove scheduling metadata (timing_metadata and repeat_schedule) from the event.
-    Also ensure that the 'custom_details' include the service_name.
-    """
-    new_event = event.copy()
-    new_event.pop("timing_metadata", None)
-    new_event.pop("repeat_schedule", None)
-    return new_event
+def iter_events_for(org, filename):
+    """Events of a file (JSON array or NDJSON): cached when small, streamed event by event when large."""
+    return read_events(event_file_path(org, filename))
 
 def send_event(payload, routing_key):
-    """Send a single event payload to PagerDuty."""
+    """Send a single event payload to PagerDuty, resolving {{ faker.* }} placeholders first."""
     headers = {"Content-Type": "application/json"}
-    # Add the routing key to the payload
+    # Render placeholders per send (fresh ids/timestamps), then add the routing key
+    payload = render_placeholders(Event.from_obj(payload).send_body())
     payload["routing_key"] = routing_key
     response = requests.post(PAGERDUTY_API_URL, headers=headers, json=payload)
     return response
@@ -78,53 +47,33 @@ def event_sender():
         filename = request.form.get('filename')
         routing_key = request.form.get('routing_key')
         
-        # Load the event file
+        # Build schedule summary for UI (a first streaming pass also validates the file)
         try:
-            events = load_event_file(org, filename)
+            schedule_summary = [ev.schedule_summary() for ev in iter_events_for(org, filename)]
         except Exception as e:
             logging.error(f"Error loading event file: {e}")
             return f"Error loading file: {e}", 500
-        # Build schedule summary for UI
-        schedule_summary = []
-        for ev in events:
-            summary = ev.get('payload', {}).get('summary', '')
-            timing = ev.get('timing_metadata', {}) or {}
-            initial_offset = timing.get('schedule_offset', 0)
-            repeat_schedule = ev.get('repeat_schedule', []) or []
-            total_repeats = sum(int(r.get('repeat_count', 0)) for r in repeat_schedule)
-            total_sends = 1 + total_repeats
-            # Next event offset after initial
-            next_offset = None
-            if repeat_schedule and repeat_schedule[0].get('repeat_offset') is not None:
-                next_offset = repeat_schedule[0].get('repeat_offset')
-            schedule_summary.append({
-                'summary': summary,
-                'initial_offset': initial_offset,
-                'total_repeats': total_repeats,
-                'total_sends': total_sends,
-                'next_offset': next_offset,
-            })
-        # Process and send each event with delays and repeats
+        # Process and send each event with delays and repeats, reading the file event by event
         results = []
-        for event in events:
+        for event in iter_events_for(org, filename):
+            summary = event.summary or "N/A"
             # Retrieve timing metadata and repeat schedule
-            timing = event.get("timing_metadata", {})
-            schedule_offset = timing.get("schedule_offset", 0)
-            repeat_schedule = event.get("repeat_schedule", [])
+            schedule_offset = event.schedule_offset
+            repeat_schedule = event.repeat_schedule
             
             # Delay sending based on schedule_offset
             if schedule_offset:
-                logging.info(f"Delaying event send by {schedule_offset} seconds for event: {event.get('payload', {}).get('summary', 'N/A')}")
+                logging.info(f"Delaying event send by {schedule_offset} seconds for event: {summary}")
                 time.sleep(schedule_offset)
             
             # Prepare payload after delay
-            payload = prepare_event_payload(event)
+            payload = event.send_body()
             
             # Send the initial event
             try:
                 response = send_event(payload, routing_key)
                 results.append({
-                    "summary": event.get("payload", {}).get("summary", "N/A"),
+                    "summary": summary,
                     "attempt": "0",
                     "status_code": response.status_code,
                     "response": response.text,
@@ -133,26 +82,25 @@ def event_sender():
             except Exception as e:
                 logging.error(f"Error sending event (initial): {e}")
                 results.append({
-                    "summary": event.get("payload", {}).get("summary", "N/A"),
+                    "summary": summary,
                     "attempt": "0",
                     "status_code": None,
                     "response": None,
                     "error": str(e)
                 })
             
-            # Process each repeat schedule entry
             # Process repeat schedules
             for repeat in repeat_schedule:
                 repeat_count = repeat.get("repeat_count", 0)
                 repeat_offset = repeat.get("repeat_offset", 0)
                 for i in range(repeat_count):
                     if repeat_offset:
-                        logging.info(f"Waiting {repeat_offset} seconds before repeat attempt {i+1} for event: {event.get('payload', {}).get('summary', 'N/A')}")
+                        logging.info(f"Waiting {repeat_offset} seconds before repeat attempt {i+1} for event: {summary}")
                         time.sleep(repeat_offset)
                     try:
                         resp = send_event(payload, routing_key)
                         results.append({
-                            "summary": event.get("payload", {}).get("summary", "N/A"),
+                            "summary": summary,
                             "attempt": f"{i+1}",
                             "status_code": resp.status_code,
                             "response": resp.text,
@@ -161,7 +109,7 @@ def event_sender():
                     except Exception as e:
                         logging.error(f"Error sending event (repeat {i+1}): {e}")
                         results.append({
-                            "summary": event.get("payload", {}).get("summary", "N/A"),
+                            "summary": summary,
                             "attempt": f"{i+1}",
                             "status_code": None,
                             "response": None,
@@ -187,27 +135,9 @@ def event_sender_summary():
     org = request.form.get('organization')
     filename = request.form.get('filename')
     try:
-        events = load_event_file(org, filename)
+        schedule_summary = [ev.schedule_summary() for ev in iter_events_for(org, filename)]
     except Exception as e:
         return jsonify({'error': str(e)}), 400
-    schedule_summary = []
-    for ev in events:
-        summary = ev.get('payload', {}).get('summary', '')
-        timing = ev.get('timing_metadata', {}) or {}
-        initial_offset = timing.get('schedule_offset', 0)
-        repeat_schedule = ev.get('repeat_schedule', []) or []
-        total_repeats = sum(int(r.get('repeat_count', 0)) for r in repeat_schedule)
-        total_sends = 1 + total_repeats
-        next_offset = None
-        if repeat_schedule and repeat_schedule[0].get('repeat_offset') is not None:
-            next_offset = repeat_schedule[0].get('repeat_offset')
-        schedule_summary.append({
-            'summary': summary,
-            'initial_offset': initial_offset,
-            'total_repeats': total_repeats,
-            'total_sends': total_sends,
-            'next_offset': next_offset,
-        })
     return jsonify({'schedule_summary': schedule_summary})
 
 def event_sender_send():
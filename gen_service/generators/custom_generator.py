@@ -1,22 +1,18 @@
-import json
 import logging
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
-from utils import get_llm, run_chain_with_retry
+from utils import get_llm, run_json_chain, stream_chain
 
-def generate_custom(
+def _build_custom_chain(
     organization,
-    api_key,
-    itsm_tools="ServiceNOW",
-    observability_tools="NewRelic, Splunk",
+    itsm_tools=None,
+    observability_tools=None,
     service_names=None,
     symptom=None,
     blast_radius=None
 ):
     """
-    Generate a custom incident narrative based on provided overrides.
-    Falls back to defaults when fields are missing.
-    Returns a dict with keys: narrative, outage_summary, incident_details.
+    Build the custom scenario LLMChain and its inputs, applying defaults for missing fields.
     """
     # Set defaults
     default_services = "User Authentication, API Nodes, Payment Processing"
@@ -56,7 +52,7 @@ Return a **JSON** object with keys:
 Do **NOT** wrap the JSON in code fences.
 """)
     # Instantiate LLM chain
-    llm = get_llm()
+    llm = get_llm(response_schema="narrative", task="narrative_custom")
     chain = LLMChain(llm=llm, prompt=prompt_template, verbose=False)
     inputs = {
         "organization": organization,
@@ -66,14 +62,46 @@ Do **NOT** wrap the JSON in code fences.
         "itsm_tools": itsm_tools,
         "observability_tools": observability_tools,
     }
-    # Generate and parse output
+    return chain, inputs
+
+def generate_custom(
+    organization,
+    api_key,
+    itsm_tools="ServiceNOW",
+    observability_tools="NewRelic, Splunk",
+    service_names=None,
+    symptom=None,
+    blast_radius=None
+):
+    """
+    Generate a custom incident narrative based on provided overrides.
+    Falls back to defaults when fields are missing.
+    Returns a dict with keys: narrative, outage_summary, incident_details.
+    """
+    chain, inputs = _build_custom_chain(
+        organization, itsm_tools, observability_tools, service_names, symptom, blast_radius
+    )
+    # Generate and parse output, repairing malformed JSON where possible
     try:
-        raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-        # Strip code fences if present
-        if raw.startswith('```') and raw.endswith('```'):
-            raw = raw.strip('`').strip()
-        data = json.loads(raw)
-        return data
+        return run_json_chain(chain, inputs, expect=dict, max_attempts=3, label="custom scenario")
     except Exception as e:
-        logging.error(f"Error generating custom scenario: {e}\nRaw output: {raw if 'raw' in locals() else ''}")
-        raise
\ No newline at end of file
+        logging.error(f"Error generating custom scenario: {e}")
+        raise
+
+def stream_custom(
+    organization,
+    api_key,
+    itsm_tools="ServiceNOW",
+    observability_tools="NewRelic, Splunk",
+    service_names=None,
+    symptom=None,
+    blast_radius=None
+):
+    """
+    Yield raw model output chunks (JSON text) for a custom scenario as they are produced.
+    Callers join the chunks and parse them with structured_output.parse_json_output.
+    """
+    chain, inputs = _build_custom_chain(
+        organization, itsm_tools, observability_tools, service_names, symptom, blast_radius
+    )
+    yield from stream_chain(chain, inputs)
@@ -0,0 +1,171 @@
+import os
+import re
+import gzip
+import zlib
+import time
+import hashlib
+import logging
+import datetime
+from functools import wraps
+from flask import request, make_response
+
+try:
+    import brotli
+except ImportError:  # optional: br encoding needs the brotli package
+    brotli = None
+
+#########################
+# HTTP VALIDATORS
+#########################
+# Preview, listing and download routes are validated from file metadata: the ETag is a
+# hash of the request path and the (mtime, size) of the files the response is built from,
+# so a matching If-None-Match / If-Modified-Since is answered with 304 before the view
+# reads or renders anything. Other GET responses get an ETag from their body. Responses
+# are revalidated on every use (Cache-Control: no-cache) rather than cached blindly.
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Templates and response layouts can change between deployments: tie ETags to this process
+_BOOT = str(time.time_ns())
+
+def metadata_validator(paths):
+    """(etag, last_modified) for a response built from paths, or None if any of them is missing."""
+    digest = hashlib.sha256(f"{_BOOT}:{request.full_path}".encode("utf-8"))
+    latest = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        digest.update(f"|{path}:{st.st_mtime_ns}:{st.st_size}".encode("utf-8"))
+        latest = max(latest, st.st_mtime)
+    last_modified = datetime.datetime.fromtimestamp(int(latest), datetime.timezone.utc)
+    return digest.hexdigest()[:32], last_modified
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+def conditional(paths_for):
+    """
+    Decorator validating a GET view from the metadata of paths_for(**view_args): answers
+    304 when the client's copy is current, otherwise tags the view's response.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            validator = metadata_validator(paths_for(*args, **kwargs))
+            if validator is None:
+                return view(*args, **kwargs)
+            etag, last_modified = validator
+            if _not_modified(etag, last_modified):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200 or resp.get_etag()[0]:
+                    return resp
+            resp.set_etag(etag)
+            resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+        return wrapper
+    return decorator
+
+#########################
+# COMPRESSION
+#########################
+
+# Responses smaller than this are sent as is (HTTP_COMPRESS_MIN_BYTES=0 disables compression)
+HTTP_COMPRESS_MIN_BYTES = _env_int("HTTP_COMPRESS_MIN_BYTES", 1024)
+HTTP_COMPRESS_LEVEL = _env_int("HTTP_COMPRESS_LEVEL", 6)
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml", "application/yaml", "application/x-yaml")
+# Suffix added to ETags of compressed representations (stripped again from If-None-Match)
+_ENCODED_ETAG = re.compile(r'-(?:gzip|br)"')
+
+def _encoding():
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(encodings)
+
+def _compressible(resp):
+    if HTTP_COMPRESS_MIN_BYTES <= 0 or resp.status_code != 200 or "Content-Encoding" in resp.headers:
+        return False
+    mimetype = resp.mimetype or ""
+    if mimetype == "text/event-stream":
+        # Server-sent events must reach the client as they are produced
+        return False
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+def _compressor(encoding):
+    if encoding == "br":
+        return brotli.Compressor(quality=min(HTTP_COMPRESS_LEVEL, 11))
+    return zlib.compressobj(HTTP_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+def _compress_stream(chunks, encoding):
+    compressor = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.process(chunk) if encoding == "br" else compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish() if encoding == "br" else compressor.flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def strip_encoded_etags():
+    """before_request: match If-None-Match against the uncompressed representation's ETag."""
+    header = request.environ.get("HTTP_IF_NONE_MATCH")
+    if header:
+        request.environ["HTTP_IF_NONE_MATCH"] = _ENCODED_ETAG.sub('"', header)
+
+def finalize_response(resp):
+    """
+    after_request: tag remaining uncached GET responses by body hash (answering 304 when
+    current) and compress compressible bodies above the size threshold. Streamed bodies are
+    compressed as they are produced; their length is unknown, so they are always compressed.
+    """
+    if request.method not in ("GET", "HEAD") or resp.status_code != 200:
+        return resp
+    if not resp.is_streamed and not resp.direct_passthrough and not resp.get_etag()[0]:
+        resp.add_etag()
+        resp.headers.setdefault("Cache-Control", "no-cache")
+        resp.make_conditional(request)
+        if resp.status_code == 304:
+            return resp
+    if not _compressible(resp):
+        return resp
+    if resp.content_length is not None and resp.content_length < HTTP_COMPRESS_MIN_BYTES:
+        return resp
+    encoding = _encoding()
+    if not encoding:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    if resp.is_streamed or resp.direct_passthrough:
+        resp.direct_passthrough = False
+        resp.response = _compress_stream(resp.response, encoding)
+        resp.headers.pop("Content-Length", None)
+        resp.headers.pop("Accept-Ranges", None)
+    else:
+        body = resp.get_data()
+        if encoding == "br":
+            resp.set_data(brotli.compress(body, quality=min(HTTP_COMPRESS_LEVEL, 11)))
+        else:
+            resp.set_data(gzip.compress(body, compresslevel=HTTP_COMPRESS_LEVEL, mtime=0))
+    resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag:
+        resp.set_etag(f"{etag}-{encoding}", weak=weak)
+    return resp
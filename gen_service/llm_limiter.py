@@ -0,0 +1,314 @@
+import os
+import math
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Maximum concurrent LLM calls in this process
+LLM_MAX_CONCURRENCY = _env_int("LLM_MAX_CONCURRENCY", 8)
+# Maximum calls allowed to wait for a slot; beyond this requests fail fast with 503
+LLM_MAX_QUEUE = _env_int("LLM_MAX_QUEUE", 32)
+# Longest a call waits in the queue before giving up (seconds)
+LLM_QUEUE_TIMEOUT = _env_float("LLM_QUEUE_TIMEOUT", 60)
+# Optional request rate cap across the process (requests per minute, 0 = unlimited)
+LLM_RATE_PER_MINUTE = _env_float("LLM_RATE_PER_MINUTE", 0)
+# Optional directory of lock files shared by all workers on a host for a cross-worker cap
+LLM_LIMITER_LOCK_DIR = os.getenv("LLM_LIMITER_LOCK_DIR")
+LLM_GLOBAL_CONCURRENCY = _env_int("LLM_GLOBAL_CONCURRENCY", LLM_MAX_CONCURRENCY)
+
+class LLMOverloaded(Exception):
+    """Raised when the LLM wait queue is full or a queued call times out."""
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Scheduling classes, highest priority first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# Slots kept free for interactive calls (bulk work cannot use them)
+LLM_INTERACTIVE_RESERVED = _env_int("LLM_INTERACTIVE_RESERVED", 1)
+# Maximum slots background work (e.g. SOP prefetch) may hold at once
+LLM_BACKGROUND_MAX = _env_int("LLM_BACKGROUND_MAX", 1)
+
+_current_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+_current_org = contextvars.ContextVar("llm_org", default=None)
+
+@contextmanager
+def llm_context(priority=None, org=None):
+    """Set the scheduling class and owning organization for LLM calls in this context."""
+    tokens = []
+    if priority is not None:
+        tokens.append((_current_priority, _current_priority.set(priority)))
+    if org is not None:
+        tokens.append((_current_org, _current_org.set(org)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+def enter_llm_context(priority=None, org=None):
+    """Non-context-manager form of llm_context; returns tokens for exit_llm_context."""
+    tokens = []
+    if priority is not None:
+        tokens.append((_current_priority, _current_priority.set(priority)))
+    if org is not None:
+        tokens.append((_current_org, _current_org.set(org)))
+    return tokens
+
+def exit_llm_context(tokens):
+    for var, token in reversed(tokens):
+        var.reset(token)
+
+class _Waiter:
+    __slots__ = ("priority", "org", "seq", "granted")
+
+    def __init__(self, priority, org, seq):
+        self.priority = priority
+        self.org = org
+        self.seq = seq
+        self.granted = False
+
+class ConcurrencyLimiter:
+    """
+    Process-wide LLM slot scheduler with a bounded wait queue.
+    Free slots go to the highest-priority class with waiters (interactive, then batch,
+    then background); within a class, to the organization with the fewest calls in
+    flight, then the least recently served, oldest waiter first. Batch work cannot take the reserved interactive slots
+    and background work is capped at LLM_BACKGROUND_MAX slots. Tracks an EWMA of slot
+    hold times to estimate a Retry-After value when shedding load.
+    """
+    def __init__(self, max_concurrent=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 interactive_reserved=LLM_INTERACTIVE_RESERVED, background_max=LLM_BACKGROUND_MAX):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.interactive_reserved = min(max(0, interactive_reserved), self.max_concurrent - 1)
+        self.background_max = max(1, background_max)
+        self.in_flight = 0
+        self.rejected = 0
+        self._class_in_flight = {p: 0 for p in PRIORITY_CLASSES}
+        self._org_in_flight = {}
+        self._org_last_grant = {}
+        self._grants = 0
+        self._waiters = []
+        self._seq = 0
+        self._avg_hold = 10.0
+        self._cv = threading.Condition()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Estimated seconds until a slot frees up for a new caller."""
+        backlog = (self.waiting + 1) / float(self.max_concurrent)
+        return max(1, int(math.ceil(self._avg_hold * backlog)))
+
+    def _class_limit(self, priority):
+        if priority == INTERACTIVE:
+            return self.max_concurrent
+        if priority == BATCH:
+            return self.max_concurrent - self.interactive_reserved
+        return min(self.background_max, self.max_concurrent - self.interactive_reserved)
+
+    def _can_run(self, priority):
+        if self.in_flight >= self.max_concurrent:
+            return False
+        if priority != INTERACTIVE and self.in_flight >= self._class_limit(priority):
+            return False
+        return self._class_in_flight[priority] < self._class_limit(priority)
+
+    def _take(self, priority, org):
+        self._grants += 1
+        self._org_last_grant[org] = self._grants
+        self.in_flight += 1
+        self._class_in_flight[priority] += 1
+        self._org_in_flight[org] = self._org_in_flight.get(org, 0) + 1
+
+    def _dispatch(self):
+        """Grant free slots to waiters in priority / fair-share order."""
+        granted = False
+        while self._waiters:
+            chosen = None
+            for priority in PRIORITY_CLASSES:
+                candidates = [w for w in self._waiters if w.priority == priority]
+                if not candidates:
+                    continue
+                if self._can_run(priority):
+                    chosen = min(candidates, key=lambda w: (
+                        self._org_in_flight.get(w.org, 0), self._org_last_grant.get(w.org, 0), w.seq
+                    ))
+                # Lower classes never jump ahead of a waiting higher class
+                break
+            if chosen is None:
+                break
+            self._waiters.remove(chosen)
+            self._take(chosen.priority, chosen.org)
+            chosen.granted = True
+            granted = True
+        if granted:
+            self._cv.notify_all()
+
+    def acquire(self, timeout=None, priority=None, org=None):
+        priority = priority or _current_priority.get()
+        if priority not in PRIORITY_CLASSES:
+            priority = INTERACTIVE
+        org = org if org is not None else _current_org.get()
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self._cv:
+            higher_waiting = any(PRIORITY_CLASSES.index(w.priority) <= PRIORITY_CLASSES.index(priority) for w in self._waiters)
+            if not higher_waiting and self._can_run(priority):
+                self._take(priority, org)
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LLMOverloaded("LLM request queue is full.", self.retry_after())
+            self._seq += 1
+            waiter = _Waiter(priority, org, self._seq)
+            self._waiters.append(waiter)
+            self._dispatch()
+            acquired = self._cv.wait_for(lambda: waiter.granted, timeout=timeout)
+            if not acquired:
+                self._waiters.remove(waiter)
+                self.rejected += 1
+                raise LLMOverloaded("Timed out waiting for an LLM slot.", self.retry_after())
+
+    def release(self, held_for=None, priority=None, org=None):
+        with self._cv:
+            self.in_flight -= 1
+            if priority in self._class_in_flight:
+                self._class_in_flight[priority] -= 1
+            if org in self._org_in_flight:
+                self._org_in_flight[org] -= 1
+                if self._org_in_flight[org] <= 0:
+                    del self._org_in_flight[org]
+            if held_for is not None:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_for
+            self._dispatch()
+
+    def stats(self):
+        with self._cv:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "rejected": self.rejected,
+                "in_flight_by_class": dict(self._class_in_flight),
+                "waiting_by_class": {p: sum(1 for w in self._waiters if w.priority == p) for p in PRIORITY_CLASSES},
+            }
+
+class TokenBucket:
+    """Simple token bucket limiting call starts to `rate` per second with `burst` capacity."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise LLMOverloaded("LLM rate limit reached.", max(1, int(math.ceil(wait))))
+            time.sleep(wait)
+
+class FileSlotLock:
+    """
+    Cross-worker concurrency cap using advisory flock() on N slot files in a shared
+    directory. Works across processes on one host (e.g. gunicorn workers).
+    """
+    def __init__(self, lock_dir, slots):
+        self.lock_dir = lock_dir
+        self.slots = max(1, slots)
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            for slot in range(self.slots):
+                handle = open(os.path.join(self.lock_dir, f"llm_slot_{slot}.lock"), "a")
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return handle
+                except OSError:
+                    handle.close()
+            if time.monotonic() + delay > deadline:
+                raise LLMOverloaded("Timed out waiting for a cross-worker LLM slot.")
+            time.sleep(delay)
+            delay = min(1.0, delay * 2)
+
+    @staticmethod
+    def release(handle):
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+limiter = ConcurrencyLimiter()
+rate_limiter = TokenBucket(LLM_RATE_PER_MINUTE / 60.0, LLM_MAX_CONCURRENCY) if LLM_RATE_PER_MINUTE > 0 else None
+if LLM_LIMITER_LOCK_DIR and fcntl is None:
+    logging.warning("LLM_LIMITER_LOCK_DIR is set but fcntl is unavailable; cross-worker limiting disabled.")
+global_slots = FileSlotLock(LLM_LIMITER_LOCK_DIR, LLM_GLOBAL_CONCURRENCY) if (LLM_LIMITER_LOCK_DIR and fcntl) else None
+
+@contextmanager
+def llm_slot(timeout=None, priority=None, org=None):
+    """
+    Hold one LLM call slot for the duration of the block, scheduled by the current
+    llm_context (or explicit priority/org). Raises LLMOverloaded (carrying a
+    retry_after hint) when the queue is full or the wait times out.
+    """
+    priority = priority or _current_priority.get()
+    if priority not in PRIORITY_CLASSES:
+        priority = INTERACTIVE
+    org = org if org is not None else _current_org.get()
+    limiter.acquire(timeout, priority=priority, org=org)
+    handle = None
+    started = time.monotonic()
+    try:
+        wait_budget = limiter.queue_timeout if timeout is None else min(timeout, limiter.queue_timeout)
+        if global_slots is not None:
+            handle = global_slots.acquire(wait_budget)
+        if rate_limiter is not None:
+            rate_limiter.take(wait_budget)
+        started = time.monotonic()
+        yield
+    finally:
+        if handle is not None:
+            FileSlotLock.release(handle)
+        limiter.release(time.monotonic() - started, priority=priority, org=org)
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import zipfile
+import logging
+from artifact_index import EVENT_KINDS
+from artifact_store import open_bytes
+from event_files import iter_events, encode_events, converted_path, format_of
+from postman_export import iter_collection, rendered_events
+
+#########################
+# ORG BUNDLES
+#########################
+# A zip of an org's artifacts is produced while it is sent: zipfile writes to a sink
+# that hands each compressed piece to the response, so nothing is staged on disk or in
+# memory beyond one read block. Layout inside the archive:
+#   <org>/<file>                  narratives, events, change events, SOPs
+#   <org>/diagnostics/<file>      diagnostics job YAML
+#   <org>/postman/<file>.json     optional Postman collections of the event files
+#   <org>/manifest.json           what was included (kind, scenario, event count)
+
+BLOCK_SIZE = 256 * 1024
+# Members above this size (or of unknown size) are written with ZIP64 headers
+ZIP64_LIMIT = 2 * 1024 * 1024 * 1024 - 1
+
+class _ZipSink:
+    """Write-only, non-seekable file object collecting zip output until drained."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _member(name, mtime=None):
+    info = zipfile.ZipInfo(name, date_time=time.localtime(mtime or time.time())[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+def _entry_name(org, artifact):
+    if artifact["kind"] == "diagnostics":
+        return f"{org}/diagnostics/{artifact['filename']}"
+    return f"{org}/{artifact['filename']}"
+
+def iter_org_zip(root, org, artifacts, event_format=None, postman=False, render=False, seed=None):
+    """
+    Yield a zip archive of the given artifact rows (from the artifact index) as bytes.
+    event_format ("json"/"ndjson") converts event files; postman=True adds a collection
+    per event file, with placeholders kept or rendered (render, seed) as in the Postman export.
+    """
+    sink = _ZipSink()
+    manifest = []
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for artifact in artifacts:
+            path = os.path.join(root, org, artifact["filename"])
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            name = _entry_name(org, artifact)
+            is_events = artifact["kind"] in EVENT_KINDS
+            convert = is_events and event_format and event_format != format_of(path)
+            if convert:
+                name = converted_path(name, event_format)
+            try:
+                with zf.open(_member(name, st.st_mtime), "w", force_zip64=st.st_size > ZIP64_LIMIT or convert) as dst:
+                    if convert:
+                        for text in encode_events(iter_events(path), event_format):
+                            dst.write(text.encode("utf-8"))
+                            yield sink.drain()
+                    else:
+                        with open_bytes(path) as src:
+                            for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                                dst.write(block)
+                                yield sink.drain()
+                if postman and is_events:
+                    collection = f"{org}/postman/{artifact['filename']}_postman_collection.json"
+                    with zf.open(_member(collection, st.st_mtime), "w", force_zip64=True) as dst:
+                        events = rendered_events((ev.to_dict() for ev in iter_events(path)), render, seed)
+                        for text in iter_collection(f"{org}_{artifact['filename']} Postman Collection", events):
+                            dst.write(text.encode("utf-8"))
+                            yield sink.drain()
+            except Exception as e:
+                # Headers are already sent: leave the file out and note it in the manifest
+                logging.error(f"Could not add {path} to the {org} bundle: {e}")
+                manifest.append({"filename": artifact["filename"], "error": str(e)})
+                continue
+            manifest.append({key: artifact.get(key) for key in ("filename", "kind", "scenario", "timestamp", "event_count")})
+            yield sink.drain()
+        zf.writestr(_member(f"{org}/manifest.json"), json.dumps({"org": org, "files": manifest}, indent=2))
+    yield sink.drain()
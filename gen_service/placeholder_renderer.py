@@ -0,0 +1,318 @@
+import re
+import uuid
+import random
+import logging
+import datetime
+from functools import lru_cache
+from faker import Faker
+
+# Same placeholder syntax the Node backend resolves (backend/src/services/eventService.js)
+PLACEHOLDER_RE = re.compile(r"{{\s*([\s\S]+?)\s*}}")
+
+class PlaceholderError(ValueError):
+    """Raised when a placeholder expression cannot be parsed or evaluated."""
+
+#########################
+# EXPRESSION PARSER
+#########################
+# Placeholders are small JavaScript expressions: string/number literals, member access,
+# calls, object/array literals, unary minus, parentheses and `+`. They are parsed once
+# into a tuple AST (cached per expression) and evaluated against a faker.js-style facade.
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d+)?)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<name>[A-Za-z_$][\w$]*)
+      | (?P<op>[-+().,:{}\[\]])
+    )""", re.X)
+
+def _tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = _TOKEN_RE.match(expr, pos)
+        if not match or match.end() == pos:
+            raise PlaceholderError(f"Unexpected character at {pos} in {expr!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        tokens.append((kind, value))
+    return tokens
+
+class _Parser:
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = _tokenize(expr)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _expect(self, op):
+        kind, value = self._next()
+        if kind != "op" or value != op:
+            raise PlaceholderError(f"Expected {op!r} in {self.expr!r}")
+
+    def _accept(self, op):
+        kind, value = self._peek()
+        if kind == "op" and value == op:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        node = self._additive()
+        if self.pos != len(self.tokens):
+            raise PlaceholderError(f"Unexpected trailing input in {self.expr!r}")
+        return node
+
+    def _additive(self):
+        node = self._unary()
+        while self._accept("+"):
+            node = ("add", node, self._unary())
+        return node
+
+    def _unary(self):
+        if self._accept("-"):
+            return ("neg", self._unary())
+        return self._postfix()
+
+    def _postfix(self):
+        node = self._primary()
+        while True:
+            if self._accept("."):
+                kind, value = self._next()
+                if kind != "name":
+                    raise PlaceholderError(f"Expected property name in {self.expr!r}")
+                node = ("attr", node, value)
+            elif self._accept("("):
+                args = []
+                if not self._accept(")"):
+                    args.append(self._additive())
+                    while self._accept(","):
+                        args.append(self._additive())
+                    self._expect(")")
+                node = ("call", node, tuple(args))
+            else:
+                return node
+
+    def _primary(self):
+        kind, value = self._next()
+        if kind in ("number", "string"):
+            return ("const", value)
+        if kind == "name":
+            return ("name", value)
+        if kind == "op" and value == "(":
+            node = self._additive()
+            self._expect(")")
+            return node
+        if kind == "op" and value == "[":
+            items = []
+            if not self._accept("]"):
+                items.append(self._additive())
+                while self._accept(","):
+                    if self._accept("]"):
+                        return ("array", tuple(items))
+                    items.append(self._additive())
+                self._expect("]")
+            return ("array", tuple(items))
+        if kind == "op" and value == "{":
+            fields = []
+            if not self._accept("}"):
+                while True:
+                    key_kind, key = self._next()
+                    if key_kind not in ("name", "string"):
+                        raise PlaceholderError(f"Expected object key in {self.expr!r}")
+                    self._expect(":")
+                    fields.append((key, self._additive()))
+                    if self._accept("}"):
+                        break
+                    self._expect(",")
+                    if self._accept("}"):
+                        break
+            return ("object", tuple(fields))
+        raise PlaceholderError(f"Unexpected token {value!r} in {self.expr!r}")
+
+@lru_cache(maxsize=1024)
+def parse_expression(expr):
+    """Parse a placeholder expression into a (cached) tuple AST."""
+    return _Parser(expr).parse()
+
+@lru_cache(maxsize=4096)
+def compile_template(text):
+    """
+    Split a string into literal parts and parsed placeholder expressions.
+    Returns a tuple of str / ("expr", source, ast) parts; cached per distinct string.
+    """
+    parts = []
+    last = 0
+    for match in PLACEHOLDER_RE.finditer(text):
+        if match.start() > last:
+            parts.append(text[last:match.start()])
+        source = match.group(1)
+        try:
+            parts.append(("expr", source, parse_expression(source)))
+        except PlaceholderError as e:
+            parts.append(("error", source, str(e)))
+        last = match.end()
+    if last < len(text):
+        parts.append(text[last:])
+    return tuple(parts)
+
+def _js_str(value):
+    # String conversion as JavaScript's `+` would apply it
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if value is None:
+        return "null"
+    return str(value)
+
+def _evaluate(node, scope):
+    op = node[0]
+    if op == "const":
+        return node[1]
+    if op == "name":
+        if node[1] not in scope:
+            raise PlaceholderError(f"Unknown name {node[1]!r}")
+        return scope[node[1]]
+    if op == "attr":
+        target = _evaluate(node[1], scope)
+        if not isinstance(target, dict) or node[2] not in target:
+            raise PlaceholderError(f"Unknown property {node[2]!r}")
+        return target[node[2]]
+    if op == "call":
+        fn = _evaluate(node[1], scope)
+        if not callable(fn):
+            raise PlaceholderError("Attempted to call a non-function")
+        return fn(*[_evaluate(arg, scope) for arg in node[2]])
+    if op == "add":
+        left, right = _evaluate(node[1], scope), _evaluate(node[2], scope)
+        if isinstance(left, str) or isinstance(right, str):
+            return _js_str(left) + _js_str(right)
+        return left + right
+    if op == "neg":
+        return -_evaluate(node[1], scope)
+    if op == "array":
+        return [_evaluate(item, scope) for item in node[1]]
+    if op == "object":
+        return {key: _evaluate(value, scope) for key, value in node[1]}
+    raise PlaceholderError(f"Unsupported expression {op!r}")
+
+#########################
+# FAKER.JS FACADE
+#########################
+
+# faker.js commerce departments (Python Faker has no equivalent provider)
+COMMERCE_DEPARTMENTS = [
+    "Automotive", "Baby", "Beauty", "Books", "Clothing", "Computers", "Electronics", "Games",
+    "Garden", "Grocery", "Health", "Home", "Industrial", "Jewelery", "Kids", "Movies", "Music",
+    "Outdoors", "Shoes", "Sports", "Tools", "Toys",
+]
+
+# One Faker instance shared by every unseeded renderer
+faker = Faker()
+
+class PlaceholderRenderer:
+    """
+    Render `{{ expr }}` placeholders the way the Node backend does, with a Python Faker
+    instance behind a faker.js-style namespace and a `timestamp(min, max)` helper.
+    A seed makes the rendered values reproducible (with a Faker of its own, so the shared
+    instance is never reseeded); `now` pins timestamp() output.
+    """
+    def __init__(self, seed=None, fake=None, now=None):
+        self.rng = random.Random(seed)
+        if fake is None:
+            fake = faker if seed is None else Faker()
+        if seed is not None:
+            fake.seed_instance(seed)
+        self.fake = fake
+        self.now = now
+        self.scope = {"faker": self._faker_namespace(), "timestamp": self.timestamp}
+
+    def _number(self, options=None):
+        options = options if isinstance(options, dict) else {}
+        low = int(options.get("min", 0))
+        high = int(options.get("max", 99999))
+        return self.fake.random_int(min=min(low, high), max=max(low, high))
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _faker_namespace(self):
+        fake = self.fake
+        return {
+            "datatype": {"uuid": self._uuid, "number": self._number},
+            "string": {"uuid": self._uuid},
+            "number": {"int": self._number},
+            "helpers": {"arrayElement": lambda items: fake.random_element(list(items))},
+            "internet": {
+                "domainName": fake.domain_name,
+                "ip": fake.ipv4,
+                "url": fake.url,
+                "userName": fake.user_name,
+            },
+            "commerce": {"department": lambda: fake.random_element(COMMERCE_DEPARTMENTS)},
+            "person": {"fullName": fake.name},
+            "company": {"name": fake.company},
+        }
+
+    def timestamp(self, min_offset, max_offset=None):
+        """ISO timestamp offset from now by a fixed or random number of seconds (as in eventService.js)."""
+        now = self.now or datetime.datetime.now(datetime.timezone.utc)
+        low = int(min_offset)
+        if max_offset is not None:
+            high = int(max_offset)
+            low = self.rng.randint(min(low, high), max(low, high))
+        value = now + datetime.timedelta(seconds=low)
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+    def render_string(self, text):
+        if "{{" not in text:
+            return text
+        out = []
+        for part in compile_template(text):
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            kind, source, payload = part
+            try:
+                if kind == "error":
+                    raise PlaceholderError(payload)
+                out.append(_js_str(_evaluate(payload, self.scope)))
+            except Exception as e:
+                # Mirror the backend: log and substitute an empty string
+                logging.error(f"Error evaluating expression \"{source}\": {e}")
+        return "".join(out)
+
+    def render(self, value):
+        """Return a copy of a JSON-like value with every placeholder in its strings rendered."""
+        if isinstance(value, str):
+            return self.render_string(value)
+        if isinstance(value, dict):
+            return {key: self.render(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.render(item) for item in value]
+        return value
+
+default_renderer = PlaceholderRenderer()
+
+def render_placeholders(value, seed=None, now=None):
+    """
+    Render `{{ faker.* }}` / `{{ timestamp(a, b) }}` placeholders in an event, list of
+    events or string. With a seed, a dedicated renderer makes output reproducible.
+    """
+    renderer = default_renderer if (seed is None and now is None) else PlaceholderRenderer(seed=seed, now=now)
+    return renderer.render(value)
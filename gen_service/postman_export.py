@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import logging
+import textwrap
+import threading
+from placeholder_renderer import PlaceholderRenderer, default_renderer
+from event_sender import PAGERDUTY_API_URL
+
+#########################
+# POSTMAN COLLECTIONS
+#########################
+# Collections are written item by item, producing the same bytes as
+# json.dumps(collection, indent=2) without holding the collection in memory.
+# Deterministic exports (placeholders left raw, or rendered with a seed) are kept on
+# disk under generated_files/.cache/postman/, keyed on the source file's content hash
+# and the export options; the key doubles as the response ETag.
+
+POSTMAN_SCHEMA = "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
+# Bump when the collection layout changes so cached exports are not reused
+EXPORT_VERSION = 1
+CACHE_DIRNAME = os.path.join(".cache", "postman")
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+def postman_item(ev, idx):
+    """One collection request for an event dict: its body with a {{routing_key}} variable."""
+    body_obj = dict(ev)
+    body_obj['routing_key'] = '{{routing_key}}'
+    name = None
+    if isinstance(ev.get('payload'), dict):
+        name = ev['payload'].get('summary')
+    return {
+        "name": name or f"Event {idx+1}",
+        "request": {
+            "method": "POST",
+            "header": [{"key": "Content-Type", "value": "application/json"}],
+            "body": {"mode": "raw", "raw": json.dumps(body_obj, indent=2)},
+            "url": {"raw": PAGERDUTY_API_URL, "protocol": "https", "host": ["events.pagerduty.com"], "path": ["v2", "enqueue"]}
+        }
+    }
+
+def iter_collection(name, events):
+    """Yield a Postman collection for an iterable of event dicts as JSON text, one item at a time."""
+    info = textwrap.indent(json.dumps({"name": name, "schema": POSTMAN_SCHEMA}, indent=2), "  ").lstrip()
+    yield '{\n  "info": ' + info + ',\n  "item": ['
+    count = 0
+    for idx, ev in enumerate(events):
+        yield ("\n" if count == 0 else ",\n") + textwrap.indent(json.dumps(postman_item(ev, idx), indent=2), "    ")
+        count += 1
+    yield ("\n  ]" if count else "]") + "\n}"
+
+def rendered_events(events, render=False, seed=None):
+    """Event dicts with placeholders rendered (one renderer across the file, so a seed reproduces the whole export)."""
+    renderer = None
+    if render:
+        renderer = default_renderer if seed is None else PlaceholderRenderer(seed=seed)
+    for ev in events:
+        yield renderer.render(ev) if renderer else ev
+
+#########################
+# EXPORT CACHE
+#########################
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+def source_digest(path):
+    """sha256 of a source file, remembered per (path, mtime, size) so repeat exports do not re-hash it."""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _digests_lock:
+            if len(_digests) >= 1024:
+                _digests.clear()
+            _digests[key] = digest
+    return digest
+
+def export_key(path, name, render, seed):
+    """Cache key / ETag of a deterministic export, or None when rendering is random (no seed)."""
+    if render and seed is None:
+        return None
+    options = json.dumps([EXPORT_VERSION, name, bool(render), seed])
+    return hashlib.sha256((source_digest(path) + options).encode("utf-8")).hexdigest()[:32]
+
+class PostmanExportCache:
+    """Finished exports on disk, least recently used removed beyond max_entries or max_bytes."""
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def path(self, root, key):
+        return os.path.join(root, CACHE_DIRNAME, f"{key}.json")
+
+    def get(self, root, key):
+        """Path of a cached export (marked as recently used), or None."""
+        path = self.path(root, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, root, key, chunks):
+        """
+        Pass chunks through while writing them to the cache; the entry is committed only
+        once the whole collection was produced (an interrupted download leaves nothing).
+        """
+        path = self.path(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        completed = False
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.prune(root)
+
+    def prune(self, root):
+        base = os.path.join(root, CACHE_DIRNAME)
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(base) if entry.name.endswith(".json")]
+            except FileNotFoundError:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+            total = 0
+            for n, entry in enumerate(entries):
+                total += entry.stat().st_size
+                if n >= self.max_entries or total > self.max_bytes:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+# POSTMAN_CACHE_MAX_ENTRIES=0 disables the export cache
+postman_cache = PostmanExportCache(
+    max_entries=_env_int("POSTMAN_CACHE_MAX_ENTRIES", 64),
+    max_bytes=_env_int("POSTMAN_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+)
@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from llm_limiter import LLMOverloaded, LLM_MAX_CONCURRENCY
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+def _env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "on", "yes")
+
+# Overall budget for all LLM calls made while serving one request (seconds)
+LLM_REQUEST_DEADLINE = _env_float("LLM_REQUEST_DEADLINE", 600)
+# Budget for a single call made outside a request deadline scope (seconds)
+LLM_CALL_DEADLINE = _env_float("LLM_CALL_DEADLINE", 300)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an LLM call or its retries run past the request deadline."""
+
+class Deadline:
+    """Absolute point in time (monotonic clock) by which work must finish."""
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+_current_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+def current_deadline():
+    """Deadline of the enclosing deadline_scope, or None."""
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(seconds=None):
+    """
+    Set a deadline for all LLM calls made in this context. Nested scopes never
+    extend an outer deadline.
+    """
+    deadline = Deadline(LLM_REQUEST_DEADLINE if seconds is None else seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def enter_deadline(seconds=None):
+    """Non-context-manager form of deadline_scope; returns a token for exit_deadline."""
+    return _current_deadline.set(Deadline(LLM_REQUEST_DEADLINE if seconds is None else seconds))
+
+def exit_deadline(token):
+    _current_deadline.reset(token)
+
+#########################
+# ERROR CLASSIFICATION
+#########################
+
+_TRANSIENT_ERROR_NAMES = {
+    # openai>=1.0
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    # openai<1.0
+    "Timeout", "TryAgain", "ServiceUnavailableError", "APIError",
+    # requests / httpx
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "RemoteProtocolError",
+}
+_TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+def _status_code(exc):
+    for attr in ("status_code", "http_status"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_transient(exc):
+    """True for rate limits, timeouts, connection drops and 5xx responses."""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    code = _status_code(exc)
+    if code is not None:
+        return code in _TRANSIENT_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+def retry_after_seconds(exc):
+    """Server-suggested delay from a Retry-After header, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+#########################
+# RETRY POLICY
+#########################
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff ("full jitter"): the delay before retry n is drawn
+    uniformly from [0, min(max_delay, base_delay * multiplier ** (n - 1))].
+    """
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, multiplier=2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def backoff(self, attempt, exc=None):
+        ceiling = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        suggested = retry_after_seconds(exc) if exc is not None else None
+        if suggested is not None:
+            delay = max(delay, min(suggested, self.max_delay))
+        return delay
+
+def default_policy(max_attempts=3):
+    return RetryPolicy(
+        max_attempts=max_attempts,
+        base_delay=_env_float("LLM_RETRY_BASE_DELAY", 1.0),
+        max_delay=_env_float("LLM_RETRY_MAX_DELAY", 30.0),
+    )
+
+#########################
+# LATENCY TRACKING & HEDGING
+#########################
+
+class LatencyTracker:
+    """Rolling window of call latencies per key, used to pick the hedging threshold."""
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, pct=95):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+latency_tracker = LatencyTracker(min_samples=int(_env_float("LLM_HEDGE_MIN_SAMPLES", 20)))
+LLM_HEDGE_ENABLED = _env_flag("LLM_HEDGE", False)
+
+# Calls take their slot before they are submitted, so the pool only ever runs calls that
+# hold one; it is never smaller than the limiter's cap, so a granted call starts at once.
+_executor = ThreadPoolExecutor(
+    max_workers=max(int(_env_float("LLM_CALL_THREADS", 16)), LLM_MAX_CONCURRENCY),
+    thread_name_prefix="llm-call",
+)
+
+def _submit(fn):
+    # Carry context variables (deadline, scheduling class) into the worker thread
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, fn)
+
+def _start(fn, deadline, slot):
+    """
+    Submit fn() holding a slot taken in the calling thread, where the limiter can queue,
+    prioritize or shed it. The slot is released when the call finishes or is cancelled.
+    """
+    if slot is None:
+        return _submit(fn)
+    held = slot(deadline.remaining())
+    held.__enter__()
+    try:
+        future = _submit(fn)
+    except BaseException:
+        held.__exit__(None, None, None)
+        raise
+    future.add_done_callback(lambda _: held.__exit__(None, None, None))
+    return future
+
+def call_with_deadline(fn, deadline, latency_key=None, hedge=None, slot=None):
+    """
+    Run fn() on the call pool and wait at most until the deadline. With hedging
+    enabled and enough latency samples, a second identical call is fired once the
+    first exceeds the observed p95 latency; the first successful result wins.
+    slot(timeout) is an optional context manager (e.g. llm_limiter.llm_slot) that
+    every call, hedged ones included, acquires in the calling thread before it is
+    submitted and holds for exactly as long as it runs: a call left running past the
+    deadline keeps its slot until it finishes. LLMOverloaded from the slot propagates
+    (a hedge that cannot get a slot is skipped).
+    """
+    hedge = LLM_HEDGE_ENABLED if hedge is None else hedge
+    started = time.monotonic()
+    futures = [_start(fn, deadline, slot)]
+    pending = set(futures)
+    try:
+        hedge_after = latency_tracker.percentile(latency_key) if (hedge and latency_key) else None
+        if hedge_after is not None and hedge_after < deadline.remaining():
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                logging.info(f"LLM call exceeded p95 latency ({hedge_after:.1f}s); sending hedged request.")
+                try:
+                    futures.append(_start(fn, deadline, slot))
+                    pending.add(futures[-1])
+                except LLMOverloaded as e:
+                    logging.info(f"Skipping hedged request: {e}")
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if latency_key:
+                        latency_tracker.record(latency_key, time.monotonic() - started)
+                    return future.result()
+                last_error = error
+        if last_error is not None and not pending:
+            raise last_error
+        raise DeadlineExceeded("LLM call did not complete within the request deadline.")
+    finally:
+        # Calls not yet started are dropped; running ones finish (and release their slot) in the background
+        for future in pending:
+            future.cancel()
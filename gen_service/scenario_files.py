@@ -0,0 +1,123 @@
+import os
+import logging
+import datetime
+import utils
+from generators.custom_generator import generate_custom
+from event_files import write_events_file, events_extension
+from artifact_store import write_text
+from artifact_index import get_index
+from artifact_graph import get_graph
+
+#########################
+# SCENARIO FILES
+#########################
+# Generates one scenario for an org straight into generated_files/<org>/ (narrative,
+# events, change events), indexes the files and records how they were built. Shared by
+# the /api/generate endpoint and the offline batch CLI (batch_generate.py).
+
+DEFAULT_SERVICE_NAMES = {
+    'major': "User Authentication, API Nodes, Payment Processing",
+    'partial': "API Nodes, Database",
+    'well': "Storage",
+}
+SCENARIOS = ('major', 'partial', 'well', 'custom')
+
+def sanitize_org(org_name):
+    # Basic sanitization: remove spaces and non-alphanumeric characters
+    return "".join(c for c in org_name if c.isalnum())
+
+def record_scenario_builds(org_folder, narrative_filename, outputs, params):
+    """
+    Record generated (builder, filename) outputs as built from the scenario narrative,
+    with the parameters needed to regenerate them once the narrative is edited.
+    """
+    graph = get_graph(os.path.dirname(os.path.abspath(org_folder)))
+    org = os.path.basename(org_folder)
+    for builder, filename in outputs:
+        if not os.path.isfile(os.path.join(org_folder, filename)):
+            continue
+        try:
+            graph.record_build(org, filename, builder, params, [narrative_filename])
+        except Exception as e:
+            logging.warning(f"Could not record dependencies of {filename}: {e}")
+
+def _index(org_folder, *paths):
+    index = get_index(os.path.dirname(os.path.abspath(org_folder)))
+    for path in paths:
+        try:
+            index.record(path)
+        except Exception as e:
+            logging.warning(f"Could not index {path}: {e}")
+
+def generate_scenario_files(org_folder, org_name, scenario, api_key, itsm_tools=None, observability_tools=None,
+                            service_names=None, symptom=None, root_cause=None, blast_radius=None,
+                            max_events=None, seed=None, timestamp=None):
+    """
+    Generate and save one scenario. Returns {narrative, events, change_events, files}
+    (change_events is None for custom scenarios), or None for an unknown scenario or a
+    custom scenario without service names.
+    """
+    service_names = service_names or DEFAULT_SERVICE_NAMES.get(scenario)
+    if scenario not in SCENARIOS or not service_names:
+        return None
+    os.makedirs(org_folder, exist_ok=True)
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+    # Events are streamed straight into this file by the event generators
+    events_filename = f"{scenario}_events_{timestamp}{events_extension()}"
+    events_path = os.path.join(org_folder, events_filename)
+    change_events = None
+    if scenario == 'custom':
+        # Structured narrative from the custom overrides; events use the major template
+        structured = generate_custom(
+            org_name, api_key, itsm_tools, observability_tools,
+            service_names, symptom, blast_radius
+        )
+        narrative = structured.get('narrative')
+        outage_summary = structured.get('outage_summary')
+        incident_details = structured.get('incident_details')
+        events = utils.generate_major_events(
+            org_name, api_key, itsm_tools, observability_tools,
+            outage_summary, service_names, incident_details,
+            max_events=max_events, output_path=events_path, seed=seed
+        )
+    else:
+        generate_narrative = {'major': utils.generate_major, 'partial': utils.generate_partial, 'well': utils.generate_well}[scenario]
+        structured = generate_narrative(
+            org_name, api_key, itsm_tools, observability_tools, service_names,
+            symptom, root_cause
+        )
+        narrative = structured['narrative']
+        outage_summary = structured['outage_summary']
+        incident_details = structured['incident_details']
+        # Generate incident events and change events
+        events, change_events = utils.generate_scenario_events(
+            scenario, org_name, api_key, itsm_tools, observability_tools,
+            outage_summary, service_names, incident_details,
+            max_events=max_events, output_path=events_path, seed=seed
+        )
+
+    # Save narrative file
+    narrative_filename = f"{scenario}_{timestamp}.txt"
+    narrative_path = os.path.join(org_folder, narrative_filename)
+    write_text(narrative_path, narrative)
+
+    # Events file was written incrementally by the generator
+    outputs = [('events', events_filename)]
+    if scenario != 'custom':
+        change_filename = f"{scenario}_change_events_{timestamp}{events_extension()}"
+        write_events_file(os.path.join(org_folder, change_filename), change_events)
+        outputs.append(('change_events', change_filename))
+    _index(org_folder, narrative_path, *(os.path.join(org_folder, filename) for _, filename in outputs))
+    record_scenario_builds(org_folder, narrative_filename, outputs, {
+        'scenario': scenario, 'org_name': org_name, 'itsm_tools': itsm_tools,
+        'observability_tools': observability_tools, 'service_names': service_names,
+        'outage_summary': outage_summary, 'incident_details': incident_details,
+        'max_events': max_events, 'seed': seed,
+    })
+    return {
+        'narrative': narrative,
+        'events': events,
+        'change_events': change_events,
+        'files': [narrative_filename] + [filename for _, filename in outputs],
+    }
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Fields that carry per-send values (injected placeholders, timestamps, routing and
+# scheduling metadata) and therefore do not change which SOP an alert needs.
+VOLATILE_TOP_LEVEL_KEYS = {"routing_key", "dedup_key", "timing_metadata", "repeat_schedule", "links", "images"}
+VOLATILE_PAYLOAD_KEYS = {"timestamp", "timing_metadata", "repeat_schedule"}
+VOLATILE_DETAIL_KEYS = {
+    "event_id", "hostname", "ip_address", "cluster_name",
+    "change_ticket", "automation_job_id", "build_number",
+}
+
+def _is_placeholder(value):
+    """Return True for template strings such as '{{ faker.datatype.uuid() }}'."""
+    return isinstance(value, str) and "{{" in value and "}}" in value
+
+def _strip_volatile(value, volatile_keys=()):
+    """Recursively drop placeholder values and the given volatile keys."""
+    if isinstance(value, dict):
+        cleaned = {}
+        for key, item in value.items():
+            if key in volatile_keys or _is_placeholder(item):
+                continue
+            if key == "payload" and isinstance(item, dict):
+                cleaned[key] = _normalize_payload(item)
+            else:
+                cleaned[key] = _strip_volatile(item)
+        return cleaned
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value if not _is_placeholder(item)]
+    return value
+
+def _normalize_payload(payload):
+    cleaned = _strip_volatile(payload, VOLATILE_PAYLOAD_KEYS)
+    details = payload.get("custom_details")
+    if isinstance(details, dict):
+        cleaned["custom_details"] = _strip_volatile(details, VOLATILE_DETAIL_KEYS)
+    return cleaned
+
+def normalize_alert(event):
+    """
+    Return a copy of an alert payload with placeholders and volatile fields removed,
+    so equivalent alerts normalize to the same structure.
+    """
+    if not isinstance(event, dict):
+        return event
+    return _strip_volatile(event, VOLATILE_TOP_LEVEL_KEYS)
+
+def alert_fingerprint(event):
+    """Stable hex digest of the normalized alert (keys sorted)."""
+    normalized = json.dumps(normalize_alert(event), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def blended_fingerprint(events):
+    """Order-independent fingerprint for a set of alerts used in a blended SOP."""
+    parts = sorted(alert_fingerprint(ev) for ev in events)
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+class SOPCache:
+    """
+    Thread-safe in-process SOP store keyed by alert fingerprint.
+    Evicts least recently used entries once max_entries or max_bytes is exceeded.
+    """
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            sop_text = self._entries.get(key)
+            if sop_text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return sop_text
+
+    def put(self, key, sop_text):
+        if not sop_text or not sop_text.strip():
+            return
+        size = len(sop_text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.encode("utf-8"))
+            self._entries[key] = sop_text
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.encode("utf-8"))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Shared process-wide cache; SOP_CACHE_MAX_ENTRIES=0 disables caching
+sop_cache = SOPCache(
+    max_entries=_env_int("SOP_CACHE_MAX_ENTRIES", 256),
+    max_bytes=_env_int("SOP_CACHE_MAX_BYTES", 8 * 1024 * 1024),
+)
@@ -1,11 +1,13 @@
 import json
+import logging
 import utils
+from sop_cache import sop_cache, alert_fingerprint, blended_fingerprint
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
 
-def generate_sop(event_payload: dict) -> str:
+def _build_sop_chain(event_payload: dict):
     """
-    Generate a Standard Operating Procedure (SOP) for a given alert payload.
+    Build the SOP LLMChain and its inputs for a single alert payload.
     """
     # Serialize the event payload for prompting
     payload_str = json.dumps(event_payload, indent=2)
@@ -49,16 +51,62 @@ Return only the Markdown SOP text, no additional commentary.
 """)
     # Instantiate a configured LLM (with temperature fallback)
     # Use default temperature settings
-    llm = utils.get_llm()
+    llm = utils.get_llm(task="sop")
     # Create the LLM chain for SOP generation
     chain = LLMChain(llm=llm, prompt=sop_prompt)
+    return chain, {"alert_payload": payload_str}
+
+def generate_sop(event_payload: dict) -> str:
+    """
+    Generate a Standard Operating Procedure (SOP) for a given alert payload.
+    Alerts that differ only in placeholder or volatile fields share a cached SOP.
+    """
+    cache_key = f"sop:{alert_fingerprint(event_payload)}"
+    cached = sop_cache.get(cache_key)
+    if cached is not None:
+        logging.info(f"SOP cache hit for {cache_key}")
+        return cached
+    chain, inputs = _build_sop_chain(event_payload)
     # Generate SOP with retry logic
-    sop_text = utils.run_chain_with_retry(chain, {"alert_payload": payload_str})
+    sop_text = utils.run_chain_with_retry(chain, inputs)
+    sop_cache.put(cache_key, sop_text)
     return sop_text
-    
-def generate_sop_blended(event_payloads: list) -> str:
+
+def _stream_and_cache(chain, inputs, cache_key):
     """
-    Generate a blended Standard Operating Procedure (SOP) for multiple alert payloads.
+    Yield a streamed SOP's chunks and cache the finished text. A blank stream is retried
+    as a regular call (which retries blank output); blank text is never cached.
+    """
+    parts = []
+    for chunk in utils.stream_chain(chain, inputs):
+        parts.append(chunk)
+        yield chunk
+    text = "".join(parts)
+    if not text.strip():
+        logging.warning("Streamed SOP output was blank; regenerating without streaming.")
+        text = utils.run_chain_with_retry(chain, inputs)
+        if text.strip():
+            yield text
+    if text.strip():
+        sop_cache.put(cache_key, text)
+
+def stream_sop(event_payload: dict):
+    """
+    Yield SOP Markdown chunks as the model produces them. A cached SOP is yielded
+    as a single chunk; a freshly streamed SOP is cached once complete.
+    """
+    cache_key = f"sop:{alert_fingerprint(event_payload)}"
+    cached = sop_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    chain, inputs = _build_sop_chain(event_payload)
+    yield from _stream_and_cache(chain, inputs, cache_key)
+
+
+def _build_blended_sop_chain(event_payloads: list):
+    """
+    Build the blended SOP LLMChain and its inputs for multiple alert payloads.
     """
     # Serialize the list of alert payloads for prompting
     payloads_str = json.dumps(event_payloads, indent=2)
@@ -102,8 +150,33 @@ Generate a consolidated runbook / SOP in **Markdown** (no code-block fences in t
 Return only the Markdown SOP text, no additional commentary.
 """)
     # Instantiate a configured LLM
-    llm = utils.get_llm()
+    llm = utils.get_llm(task="sop_blended")
     chain = LLMChain(llm=llm, prompt=blended_prompt)
+    return chain, {"alerts_payloads": payloads_str}
+
+def generate_sop_blended(event_payloads: list) -> str:
+    """
+    Generate a blended Standard Operating Procedure (SOP) for multiple alert payloads.
+    """
+    cache_key = f"blended:{blended_fingerprint(event_payloads)}"
+    cached = sop_cache.get(cache_key)
+    if cached is not None:
+        logging.info(f"Blended SOP cache hit for {cache_key}")
+        return cached
+    chain, inputs = _build_blended_sop_chain(event_payloads)
     # Generate blended SOP with retry logic
-    sop_text = utils.run_chain_with_retry(chain, {"alerts_payloads": payloads_str})
-    return sop_text
\ No newline at end of file
+    sop_text = utils.run_chain_with_retry(chain, inputs)
+    sop_cache.put(cache_key, sop_text)
+    return sop_text
+
+def stream_sop_blended(event_payloads: list):
+    """
+    Yield blended SOP Markdown chunks as the model produces them.
+    """
+    cache_key = f"blended:{blended_fingerprint(event_payloads)}"
+    cached = sop_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    chain, inputs = _build_blended_sop_chain(event_payloads)
+    yield from _stream_and_cache(chain, inputs, cache_key)
@@ -0,0 +1,106 @@
+import os
+import queue
+import logging
+import threading
+import utils
+from llm_limiter import llm_context, BACKGROUND
+from sop_cache import sop_cache, alert_fingerprint
+from sop_generator import generate_sop
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}; using default {default}.")
+        return default
+
+# Number of distinct alerts per saved events file to pre-generate SOPs for (0 disables prefetch)
+SOP_PREFETCH_TOP_N = _env_int("SOP_PREFETCH_TOP_N", 0)
+# Maximum queued prefetch jobs; further jobs are dropped rather than piling up
+SOP_PREFETCH_QUEUE_SIZE = _env_int("SOP_PREFETCH_QUEUE_SIZE", 50)
+
+def select_prefetch_alerts(events, top_n):
+    """
+    Return up to top_n distinct alerts (by fingerprint) in file order,
+    skipping alerts whose SOP is already cached.
+    """
+    selected = []
+    seen = set()
+    for ev in events or []:
+        if len(selected) >= top_n:
+            break
+        if not isinstance(ev, dict):
+            continue
+        fingerprint = alert_fingerprint(ev)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        if f"sop:{fingerprint}" in sop_cache:
+            continue
+        selected.append((fingerprint, ev))
+    return selected
+
+class SOPPrefetcher:
+    """
+    Low-priority background worker that generates and caches SOPs.
+    Runs one SOP at a time, only while no foreground LLM calls are in flight, and in
+    the background LLM scheduling class.
+    """
+    def __init__(self, top_n=SOP_PREFETCH_TOP_N, queue_size=SOP_PREFETCH_QUEUE_SIZE):
+        self.top_n = top_n
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.top_n > 0
+
+    def schedule(self, events):
+        """Queue SOP generation for the top-N distinct alerts in an events list. Returns the count queued."""
+        if not self.enabled:
+            return 0
+        queued = 0
+        for fingerprint, ev in select_prefetch_alerts(events, self.top_n):
+            with self._lock:
+                if fingerprint in self._pending:
+                    continue
+                self._pending.add(fingerprint)
+            try:
+                self._queue.put_nowait((fingerprint, ev))
+                queued += 1
+            except queue.Full:
+                with self._lock:
+                    self._pending.discard(fingerprint)
+                logging.info("SOP prefetch queue full; skipping remaining alerts.")
+                break
+        if queued:
+            self._ensure_worker()
+        return queued
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sop-prefetch", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # Background scheduling class: never takes slots ahead of interactive or batch work
+        with utils.background_work(), llm_context(priority=BACKGROUND):
+            while True:
+                fingerprint, ev = self._queue.get()
+                try:
+                    # Yield to interactive work: wait until foreground LLM calls drain
+                    utils.wait_for_foreground_idle()
+                    if f"sop:{fingerprint}" not in sop_cache:
+                        generate_sop(ev)
+                        logging.info(f"Prefetched SOP for alert {fingerprint[:12]}")
+                except Exception as e:
+                    logging.warning(f"SOP prefetch failed for alert {fingerprint[:12]}: {e}")
+                finally:
+                    with self._lock:
+                        self._pending.discard(fingerprint)
+                    self._queue.task_done()
+
+sop_prefetcher = SOPPrefetcher()
@@ -0,0 +1,442 @@
+import os
+import re
+import json
+import logging
+
+#########################
+# RESPONSE SCHEMAS
+#########################
+
+NARRATIVE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "narrative": {"type": "string"},
+        "outage_summary": {"type": "string"},
+        "incident_details": {"type": "string"},
+    },
+    "required": ["narrative", "outage_summary", "incident_details"],
+}
+
+ALERT_EVENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "event_action": {"type": "string", "enum": ["trigger", "resolve"]},
+        "payload": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "source": {"type": "string"},
+                "severity": {"type": "string"},
+                "component": {"type": "string"},
+                "group": {"type": "string"},
+                "class": {"type": "string"},
+                "custom_details": {"type": "object"},
+            },
+            "required": ["summary", "source", "severity", "custom_details"],
+        },
+        "timing_metadata": {
+            "type": "object",
+            "properties": {"schedule_offset": {"type": "integer"}},
+            "required": ["schedule_offset"],
+        },
+        "repeat_schedule": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "repeat_count": {"type": "integer"},
+                    "repeat_offset": {"type": "integer"},
+                },
+                "required": ["repeat_count", "repeat_offset"],
+            },
+        },
+    },
+    "required": ["event_action", "payload", "timing_metadata", "repeat_schedule"],
+}
+
+CHANGE_EVENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "routing_key": {"type": "string"},
+        "event_action": {"type": "string"},
+        "payload": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "timestamp": {"type": "string"},
+                "source": {"type": "string"},
+                "custom_details": {"type": "object"},
+            },
+            "required": ["summary", "source", "custom_details"],
+        },
+        "links": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"href": {"type": "string"}, "text": {"type": "string"}},
+            },
+        },
+    },
+    "required": ["payload"],
+}
+
+def _array_of(item_schema):
+    # Structured-output response formats require an object at the top level,
+    # so arrays are wrapped as {"items": [...]} and unwrapped by the parser.
+    return {
+        "type": "object",
+        "properties": {"items": {"type": "array", "items": item_schema}},
+        "required": ["items"],
+    }
+
+SCHEMAS = {
+    "narrative": NARRATIVE_SCHEMA,
+    "alert_events": _array_of(ALERT_EVENT_SCHEMA),
+    "change_events": _array_of(CHANGE_EVENT_SCHEMA),
+    # Fused single-call generation of a scenario's alert and change events
+    "scenario_events": {
+        "type": "object",
+        "properties": {
+            "events": {"type": "array", "items": ALERT_EVENT_SCHEMA},
+            "change_events": {"type": "array", "items": CHANGE_EVENT_SCHEMA},
+        },
+        "required": ["events", "change_events"],
+    },
+}
+
+# Model families known to accept response_format={"type": "json_schema", ...}
+STRUCTURED_OUTPUT_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+def structured_output_enabled(model_name):
+    """
+    Decide whether to request schema-constrained output for a model.
+    OPENAI_STRUCTURED_OUTPUT: "auto" (default, by model family), "on" or "off".
+    """
+    mode = os.getenv("OPENAI_STRUCTURED_OUTPUT", "auto").strip().lower()
+    if mode in ("off", "false", "0", "no"):
+        return False
+    if mode in ("on", "true", "1", "yes"):
+        return True
+    name = (model_name or "").lower()
+    if name in ("o1-mini", "o1-preview"):
+        return False
+    return name.startswith(STRUCTURED_OUTPUT_MODEL_PREFIXES)
+
+def response_format(schema_name):
+    """Build the OpenAI json_schema response_format for a named schema."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": schema_name,
+            "schema": SCHEMAS[schema_name],
+            # Non-strict: custom_details is intentionally free-form
+            "strict": False,
+        },
+    }
+
+#########################
+# TOLERANT JSON PARSING
+#########################
+
+class StructuredOutputError(ValueError):
+    """Raised when model output cannot be parsed or repaired into the expected JSON."""
+
+_FENCE_RE = re.compile(r"^```[\w-]*\s*\n?(.*?)\n?\s*```$", re.S)
+
+def strip_code_fences(text):
+    """Remove a surrounding markdown code fence, including any language tag."""
+    text = text.strip()
+    match = _FENCE_RE.match(text)
+    if match:
+        return match.group(1).strip()
+    return text
+
+def _clean(text):
+    """
+    String-aware cleanup pass: drop // and /* */ comments, trailing commas and
+    normalize smart quotes used as JSON delimiters.
+    """
+    out = []
+    i = 0
+    in_string = False
+    escape = False
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if ch in ("“", "”"):
+            ch = '"'
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = length if end == -1 else end
+            continue
+        elif ch == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        elif ch in "}]":
+            # Remove a dangling comma before the closing bracket
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _salvage_truncated(text):
+    """
+    Close a truncated JSON document after its last complete nested value,
+    discarding any partially written trailing element.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    last_safe = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append(ch)
+        elif ch in "]}":
+            if not stack:
+                break
+            stack.pop()
+            last_safe = (i + 1, list(stack))
+            if not stack:
+                return text[:i + 1]
+    if last_safe is None:
+        return None
+    end, open_stack = last_safe
+    closers = "".join("]" if c == "[" else "}" for c in reversed(open_stack))
+    return _clean(text[:end] + closers)
+
+def _coerce(data, expect):
+    if expect is list:
+        if isinstance(data, dict):
+            # Unwrap {"items": [...]} / {"events": [...]} style wrappers
+            list_values = [v for v in data.values() if isinstance(v, list)]
+            if len(data) == 1 and len(list_values) == 1:
+                return list_values[0]
+            if "items" in data and isinstance(data["items"], list):
+                return data["items"]
+            return [data]
+        if isinstance(data, list):
+            return data
+    elif expect is dict:
+        if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+            return data[0]
+        if isinstance(data, dict):
+            return data
+    elif expect is None:
+        return data
+    raise StructuredOutputError(f"Expected JSON {expect.__name__}, got {type(data).__name__}")
+
+def parse_json_output(raw, expect=None):
+    """
+    Parse model output into JSON, repairing common defects when strict parsing fails:
+    code fences, leading/trailing prose, comments, trailing commas, smart quotes and
+    truncation mid-array. `expect` (list or dict) coerces wrapper shapes.
+    """
+    if raw is None:
+        raise StructuredOutputError("Model output is empty.")
+    text = strip_code_fences(raw)
+    if not text:
+        raise StructuredOutputError("Model output is empty.")
+    try:
+        return _coerce(json.loads(text), expect)
+    except json.JSONDecodeError:
+        pass
+
+    starts = [idx for idx in (text.find("["), text.find("{")) if idx != -1]
+    if not starts:
+        raise StructuredOutputError("Model output contains no JSON object or array.")
+    body = _clean(text[min(starts):])
+    candidates = [body]
+    closing = max(body.rfind("]"), body.rfind("}"))
+    if closing != -1:
+        candidates.append(body[:closing + 1])
+    salvaged = _salvage_truncated(body)
+    if salvaged:
+        candidates.append(salvaged)
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        logging.warning("Repaired malformed JSON in model output.")
+        return _coerce(data, expect)
+    raise StructuredOutputError("Unable to repair JSON in model output.")
+
+#########################
+# INCREMENTAL ARRAY PARSING
+#########################
+
+class IncrementalJSONArrayParser:
+    """
+    Incrementally parse streamed model output, returning each element object of the
+    first JSON array as soon as its closing brace arrives. Consumed text is discarded,
+    so memory stays proportional to a single element rather than the whole array.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_string = False
+        self._escape = False
+        self._depth = 0
+        self._array_depth = None
+        self._element_start = None
+        self._done = False
+        self.count = 0
+
+    def feed(self, chunk):
+        """Consume a text chunk and return the list of completed element objects."""
+        if self._done or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+                if self._array_depth is None and ch == "[":
+                    self._array_depth = self._depth
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._element_start = i
+            elif ch in "]}":
+                if self._array_depth is not None:
+                    if ch == "}" and self._depth == self._array_depth + 1 and self._element_start is not None:
+                        element = self.parse_element(buf[self._element_start:i + 1])
+                        if element is not None:
+                            completed.append(element)
+                            self.count += 1
+                        self._element_start = None
+                    elif ch == "]" and self._depth == self._array_depth:
+                        self._done = True
+                        self._depth -= 1
+                        break
+                self._depth -= 1
+            i += 1
+        # Drop text that can no longer contribute to a pending element
+        if self._done:
+            self._buffer, self._pos = "", 0
+        elif self._array_depth is not None:
+            keep_from = self._element_start if self._element_start is not None else i
+            self._buffer = buf[keep_from:]
+            if self._element_start is not None:
+                self._element_start = 0
+            self._pos = i - keep_from
+        else:
+            self._pos = i
+        return completed
+
+    @property
+    def closed(self):
+        """True once the top-level array's closing bracket arrived (a cut-off stream never closes it)."""
+        return self._done
+
+    def pending_text(self):
+        """Text buffered before any array opened (used for non-array fallbacks)."""
+        return self._buffer if self._array_depth is None else ""
+
+    @staticmethod
+    def parse_element(text):
+        """One element object, repaired if needed; None (logged) when it cannot be parsed."""
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                return parse_json_output(text, expect=dict)
+            except StructuredOutputError as e:
+                logging.warning(f"Skipping unparseable streamed element: {e}")
+                return None
+
+class JSONStringFieldStreamer:
+    """
+    Incrementally decode the value of one top-level string field (e.g. "narrative")
+    from streamed JSON text, so readable text can be forwarded before the object closes.
+    """
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field):
+        self._key_re = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._started = False
+        self._done = False
+
+    def feed(self, chunk):
+        """Consume a text chunk and return newly decoded characters of the field value."""
+        if self._done or not chunk:
+            return ""
+        self._buffer += chunk
+        if not self._started:
+            match = self._key_re.search(self._buffer)
+            if not match:
+                # Keep only a tail long enough to contain a split key
+                self._buffer = self._buffer[-256:]
+                return ""
+            self._started = True
+            self._buffer = self._buffer[match.end():]
+        out = []
+        i = 0
+        buf = self._buffer
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._done = True
+                i = len(buf)
+                break
+            if ch == "\\":
+                if i + 1 >= len(buf):
+                    break
+                nxt = buf[i + 1]
+                if nxt == "u":
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(self._ESCAPES.get(nxt, nxt))
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+        self._buffer = buf[i:]
+        return "".join(out)
@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import deque
+
+def _default_model():
+    return os.getenv("OPENAI_MODEL", "o3-mini")
+
+# Model tiers: "default" follows OPENAI_MODEL, "fast" follows OPENAI_FAST_MODEL (or
+# OPENAI_MODEL when no fast model is configured)
+MODEL_TIERS = {
+    "default": _default_model,
+    "fast": lambda: os.getenv("OPENAI_FAST_MODEL") or _default_model(),
+}
+
+# Per-task model tier / temperature / output budget. temperature None keeps the
+# OPENAI_TEMP / caller default behaviour. The small, well-bounded fast-tier tasks get
+# tight max_tokens budgets; other tasks keep OPENAI_MAX_TOKENS. Reasoning models spend
+# part of max_completion_tokens on reasoning, so these built-in budgets are not applied
+# when the task resolves to an o-series model (budgets from LLM_TASK_PROFILES always are).
+DEFAULT_TASK_PROFILES = {
+    "narrative_major": {"tier": "default", "temperature": None},
+    "narrative_partial": {"tier": "default", "temperature": None},
+    "narrative_well": {"tier": "default", "temperature": None},
+    "narrative_custom": {"tier": "default", "temperature": None},
+    "events_major": {"tier": "default", "temperature": None},
+    "events_partial": {"tier": "default", "temperature": None},
+    "events_well": {"tier": "default", "temperature": None},
+    "change_events_major": {"tier": "fast", "temperature": None, "max_tokens": 2048},
+    "change_events_partial": {"tier": "fast", "temperature": None, "max_tokens": 1024},
+    "change_events_well": {"tier": "fast", "temperature": None, "max_tokens": 1024},
+    "scenario_events_major": {"tier": "default", "temperature": None},
+    "scenario_events_partial": {"tier": "default", "temperature": None},
+    "scenario_events_well": {"tier": "default", "temperature": None},
+    "sop": {"tier": "default", "temperature": None},
+    "sop_blended": {"tier": "default", "temperature": None},
+    "diagnostics_select": {"tier": "fast", "temperature": None, "max_tokens": 256},
+    "diagnostics_commands": {"tier": "default", "temperature": None},
+}
+
+def is_reasoning_model(model):
+    """True for o-series reasoning models (o1, o3-mini, o4-mini, ...)."""
+    name = (model or "").rsplit("/", 1)[-1].lower()
+    return re.match(r"o\d", name) is not None
+
+def _load_overrides():
+    """
+    Read LLM_TASK_PROFILES: inline JSON or a path to a JSON file mapping task names to
+    any of {"model", "tier", "temperature", "max_tokens"}.
+    """
+    raw = os.getenv("LLM_TASK_PROFILES", "").strip()
+    if not raw:
+        return {}
+    try:
+        if not raw.startswith("{") and os.path.isfile(raw):
+            with open(raw, "r") as f:
+                return json.load(f)
+        return json.loads(raw)
+    except (OSError, ValueError) as e:
+        logging.error(f"Ignoring invalid LLM_TASK_PROFILES: {e}")
+        return {}
+
+_overrides = _load_overrides()
+
+def get_task_profile(task):
+    """
+    Resolve a task to {"model", "temperature", "max_tokens"}. Unknown tasks fall back
+    to OPENAI_MODEL and OPENAI_MAX_TOKENS, as do built-in budgets on reasoning models.
+    """
+    defaults = DEFAULT_TASK_PROFILES.get(task, {})
+    override = _overrides.get(task, {}) if task else {}
+    profile = dict(defaults, **override)
+    model = profile.get("model") or MODEL_TIERS.get(profile.get("tier", "default"), MODEL_TIERS["default"])()
+    max_tokens = override.get("max_tokens")
+    if max_tokens is None and not is_reasoning_model(model):
+        max_tokens = defaults.get("max_tokens")
+    if max_tokens is None:
+        try:
+            max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "16384"))
+        except ValueError:
+            max_tokens = 16384
+    return {"model": model, "temperature": profile.get("temperature"), "max_tokens": int(max_tokens)}
+
+class OutputSizeStats:
+    """Observed output sizes per task, for tuning max_tokens budgets."""
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, task, chars):
+        if not task:
+            return
+        with self._lock:
+            self._samples.setdefault(task, deque(maxlen=self.window)).append(chars)
+
+    def summary(self):
+        result = {}
+        with self._lock:
+            items = {task: sorted(samples) for task, samples in self._samples.items()}
+        for task, sizes in items.items():
+            p95 = sizes[min(len(sizes) - 1, int(round(0.95 * (len(sizes) - 1))))]
+            profile = get_task_profile(task)
+            result[task] = {
+                "samples": len(sizes),
+                "max_chars": sizes[-1],
+                "p95_chars": p95,
+                # Rough estimate at ~4 characters per token
+                "p95_tokens_est": p95 // 4,
+                "max_tokens_budget": profile["max_tokens"],
+                "model": profile["model"],
+            }
+        return result
+
+output_stats = OutputSizeStats()
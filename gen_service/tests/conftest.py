@@ -0,0 +1,6 @@
+import os
+import sys
+
+# gen_service modules import each other by top-level name (as when run from gen_service/)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,79 @@
+import json
+import pytest
+
+pytest.importorskip("langchain")
+import utils  # noqa: E402
+
+
+class FakeLLM:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.metadata = {}
+
+    def stream(self, messages):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakePrompt:
+    def format_messages(self, **inputs):
+        return []
+
+
+class FakeChain:
+    """Streams `streamed` chunk by chunk; a non-streaming run() returns `full`."""
+    def __init__(self, streamed, full):
+        self.llm = FakeLLM(streamed)
+        self.prompt = FakePrompt()
+        self.full = full
+        self.runs = 0
+
+    def run(self, **inputs):
+        self.runs += 1
+        return self.full
+
+
+FULL = json.dumps([{"payload": {"summary": "disk full", "severity": "critical"}},
+                   {"payload": {"summary": "cpu high", "severity": "warning"}}])
+
+
+def summaries(path):
+    with open(path) as f:
+        return [ev["payload"]["summary"] for ev in json.load(f)]
+
+
+def test_complete_stream_is_written_without_regenerating(tmp_path):
+    path = tmp_path / "major_events_20250101000000.json"
+    chain = FakeChain([FULL[:30], FULL[30:]], "[]")
+    events = utils.generate_alert_events(chain, {}, "events", output_path=str(path))
+    assert len(events) == 2
+    assert chain.runs == 0
+    assert summaries(path) == ["disk full", "cpu high"]
+
+
+@pytest.mark.parametrize("streamed", [
+    ['[{"payload": {"summary": "disk full"}}, {"payload": {"summ'],  # cut off by the token cap
+    ["[]"],
+    [""],
+])
+def test_truncated_or_empty_stream_is_regenerated(tmp_path, streamed):
+    path = tmp_path / "major_events_20250101000000.json"
+    chain = FakeChain(streamed, FULL)
+    events = utils.generate_alert_events(chain, {}, "events", output_path=str(path))
+    assert chain.runs == 1
+    assert len(events) == 2
+    assert summaries(path) == ["disk full", "cpu high"]
+    assert not (tmp_path / "major_events_20250101000000.json.part").exists()
+
+
+def test_unrepairable_output_is_regenerated_with_single_calls(monkeypatch):
+    budgets = []
+
+    def run_chain_with_retry(chain, inputs, max_attempts=3, **kwargs):
+        budgets.append(max_attempts)
+        return "not json at all"
+
+    monkeypatch.setattr(utils, "run_chain_with_retry", run_chain_with_retry)
+    with pytest.raises(utils.StructuredOutputError):
+        utils.run_json_chain(FakeChain([], ""), {}, max_attempts=3)
+    assert budgets == [3, 1, 1]
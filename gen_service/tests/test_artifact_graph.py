@@ -0,0 +1,111 @@
+import json
+import pytest
+from artifact_graph import ArtifactGraph
+from retry_policy import DeadlineExceeded
+
+
+@pytest.fixture
+def org(tmp_path):
+    (tmp_path / "Acme").mkdir()
+    return tmp_path
+
+
+def write(root, name, content):
+    (root / "Acme" / name).write_text(content)
+
+
+def build_chain(root):
+    """narrative -> events -> SOP, recorded in that order of dependency."""
+    graph = ArtifactGraph(str(root))
+    write(root, "major_20250101000000.txt", "narrative v1")
+    write(root, "major_events_20250101000000.json", json.dumps([{"payload": {"summary": "a"}}]))
+    write(root, "major_events_20250101000000_sop_20250101T000000Z.md", "sop")
+    # Recorded downstream first, so stale() has to order them itself
+    graph.record_build("Acme", "major_events_20250101000000_sop_20250101T000000Z.md", "sop", {},
+                       [("major_events_20250101000000.json", 0)])
+    graph.record_build("Acme", "major_events_20250101000000.json", "events", {"scenario": "major"},
+                       ["major_20250101000000.txt"])
+    return graph
+
+
+def test_nothing_is_stale_until_an_input_changes(org):
+    graph = build_chain(org)
+    assert graph.stale("Acme") == []
+
+
+def test_stale_lists_upstream_before_downstream(org):
+    graph = build_chain(org)
+    write(org, "major_20250101000000.txt", "narrative v2")
+    stale = graph.stale("Acme")
+    assert [build["builder"] for build in stale] == ["events", "sop"]
+    assert stale[0]["changed_inputs"] == ["major_20250101000000.txt"]
+    assert stale[1]["changed_inputs"] == []
+    assert stale[1]["stale_upstream"] == ["major_events_20250101000000.json"]
+
+
+def test_rebuild_keeps_downstream_whose_input_event_is_unchanged(org):
+    graph = build_chain(org)
+    write(org, "major_20250101000000.txt", "narrative v2")
+    report = graph.rebuild_stale("Acme", {"events": lambda org_name, params, inputs, outputs: None,
+                                          "sop": lambda *args: pytest.fail("SOP input did not change")})
+    assert [entry["builder"] for entry in report["rebuilt"]] == ["events"]
+    assert report["unchanged"] == [{"outputs": ["major_events_20250101000000_sop_20250101T000000Z.md"]}]
+    assert graph.stale("Acme") == []
+
+
+def test_rebuild_stops_when_the_deadline_runs_out(org):
+    graph = build_chain(org)
+    write(org, "major_20250101000000.txt", "narrative v2")
+
+    def events(*args):
+        raise DeadlineExceeded("out of time")
+
+    with pytest.raises(DeadlineExceeded):
+        graph.rebuild_stale("Acme", {"events": events, "sop": lambda *args: None})
+    assert [build["builder"] for build in graph.stale("Acme")] == ["events", "sop"]
+
+
+def test_rebuild_after_edit_uses_the_edited_narrative_sections(org, monkeypatch):
+    pytest.importorskip("langchain")
+    import app as appmod
+    import utils
+
+    monkeypatch.setitem(appmod.app.config, "GENERATED_FOLDER", str(org))
+    calls = {}
+
+    def events(*args, **kwargs):
+        calls["events"] = args
+        write(org, "major_events_20250101000000.json", json.dumps([{"payload": {"summary": "b"}}]))
+
+    def change_events(*args):
+        calls["change_events"] = args
+        return [{"summary": "deploy"}]
+
+    monkeypatch.setitem(utils.SCENARIO_EVENT_SPECS, "major",
+                        dict(utils.SCENARIO_EVENT_SPECS["major"], events=events, change_events=change_events))
+    graph = ArtifactGraph(str(org))
+    write(org, "major_20250101000000.txt", "narrative v1")
+    write(org, "major_events_20250101000000.json", "[]")
+    write(org, "major_change_events_20250101000000.json", "[]")
+    params = {"scenario": "major", "org_name": "Acme", "service_names": "Payments",
+              "outage_summary": "old summary", "incident_details": "old details"}
+    for builder, filename in (("events", "major_events_20250101000000.json"),
+                              ("change_events", "major_change_events_20250101000000.json")):
+        graph.record_build("Acme", filename, builder, params, ["major_20250101000000.txt"])
+
+    write(org, "major_20250101000000.txt",
+          "**Scenario Overview:** Checkout is down.\n"
+          "**Incident Narrative:**\n1. 10:00 UTC Payments API latency spikes.\n"
+          "**The Response:** Teams swarmed.\n"
+          "**Outage Summary:** Payments API saturated after a pool change.\n")
+    graph.rebuild_stale("Acme", {"events": appmod.rebuild_events, "change_events": appmod.rebuild_change_events})
+
+    for builder in ("events", "change_events"):
+        outage_summary, incident_details = calls[builder][4], calls[builder][6]
+        assert outage_summary == "Payments API saturated after a pool change."
+        assert incident_details == "1. 10:00 UTC Payments API latency spikes."
+
+    # Without the section markers the values recorded at generation time are used
+    write(org, "major_20250101000000.txt", "free-form notes")
+    graph.rebuild_stale("Acme", {"events": appmod.rebuild_events, "change_events": appmod.rebuild_change_events})
+    assert calls["events"][4] == "old summary" and calls["events"][6] == "old details"
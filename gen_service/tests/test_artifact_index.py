@@ -0,0 +1,25 @@
+import pytest
+from artifact_index import classify, EVENT_KINDS
+
+
+@pytest.mark.parametrize("filename, kind, scenario, group_key", [
+    ("major_events_20250421160430.json", "events", "major", "major_20250421160430"),
+    ("partial_change_events_20250421160430.ndjson", "change_events", "partial", "partial_20250421160430"),
+    ("major_20250421160430.txt", "narrative", "major", "major_20250421160430"),
+    # Names the event sender listed before the index: still event files, ungrouped
+    ("events.json", "events", None, None),
+    ("change_events.json", "change_events", None, None),
+    ("major_events_20250421T160430824Z.json", "events", "major", None),
+    ("notes.json", "other", None, None),
+])
+def test_classify(filename, kind, scenario, group_key):
+    info = classify(filename)
+    assert (info["kind"], info["scenario"], info["group_key"]) == (kind, scenario, group_key)
+
+
+def test_sop_inherits_group_of_its_events_file():
+    info = classify("major_events_20250421160430_sop_20250422T101500Z.md")
+    assert info["kind"] == "sop"
+    assert info["source"] == "major_events_20250421160430.json"
+    assert info["group_key"] == "major_20250421160430"
+    assert "sop" not in EVENT_KINDS
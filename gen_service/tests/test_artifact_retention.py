@@ -0,0 +1,62 @@
+import datetime
+import pytest
+from artifact_retention import RetentionPolicy, ArtifactCompactor, plan
+from artifact_store import write_text
+
+NOW = datetime.datetime(2025, 6, 1)
+
+
+def unit(key, scenario, days_old, size=100, grouped=True):
+    return {"key": key, "scenario": scenario, "grouped": grouped, "bytes": size, "files": [key],
+            "timestamp": (NOW - datetime.timedelta(days=days_old)).isoformat()}
+
+
+def newest_first(*units):
+    return sorted(units, key=lambda u: u["timestamp"], reverse=True)
+
+
+def test_keep_per_scenario_drops_older_generations():
+    units = newest_first(unit("major_3", "major", 1), unit("major_2", "major", 2), unit("major_1", "major", 3),
+                         unit("well_1", "well", 5))
+    assert set(plan(units, RetentionPolicy(keep_per_scenario=2), now=NOW)) == {"major_1"}
+
+
+def test_newest_generation_survives_every_rule():
+    units = newest_first(unit("major_2", "major", 40, size=500), unit("major_1", "major", 50, size=500))
+    drop = plan(units, RetentionPolicy(max_age_days=30, max_org_bytes=1), now=NOW)
+    assert set(drop) == {"major_1"}
+
+
+def test_size_budget_drops_oldest_first():
+    units = newest_first(unit("major_3", "major", 1), unit("major_2", "major", 2), unit("major_1", "major", 3),
+                         unit("diag", None, 4, grouped=False))
+    assert set(plan(units, RetentionPolicy(max_org_bytes=250), now=NOW)) == {"diag", "major_1"}
+
+
+def test_no_policy_drops_nothing():
+    units = newest_first(unit("major_2", "major", 400), unit("major_1", "major", 500))
+    assert plan(units, RetentionPolicy(), now=NOW) == {}
+
+
+@pytest.fixture
+def deduplicated_org(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARTIFACT_DEDUP", "true")
+    monkeypatch.setenv("ARTIFACT_COMPRESSION", "none")
+    org = tmp_path / "Acme"
+    org.mkdir()
+    # Two old generations with identical content (one shared inode) and a newer unique one
+    for ts in ("20250101000000", "20250102000000"):
+        write_text(str(org / f"major_{ts}.txt"), "same narrative " * 100)
+    write_text(str(org / "major_20250103000000.txt"), "newest narrative")
+    return tmp_path
+
+
+def test_reclaimed_bytes_counts_shared_content_once(deduplicated_org):
+    compactor = ArtifactCompactor(str(deduplicated_org), RetentionPolicy(keep_per_scenario=1, archive=False))
+    size = len("same narrative " * 100)
+    dry = compactor.compact(dry_run=True)
+    report = compactor.compact()
+    assert report["bytes"] == 2 * size
+    assert report["reclaimed_bytes"] == size
+    assert report["store"] == {"blobs": 1, "bytes": size}
+    assert dry["reclaimed_bytes"] == report["reclaimed_bytes"]
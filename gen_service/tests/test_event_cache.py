@@ -0,0 +1,26 @@
+import json
+from event_cache import EventFileCache, parsed_size
+from event_model import Event
+
+EVENT = {"payload": {"summary": "Disk usage above 90% on db-01", "severity": "critical",
+                     "custom_details": {"service_name": "Database", "value": "93%"}}}
+
+
+def test_parsed_size_exceeds_the_json_text():
+    events = (Event(json.loads(json.dumps(EVENT))),)
+    assert parsed_size(events) > 3 * len(json.dumps(EVENT))
+
+
+def test_budget_is_charged_with_parsed_size(tmp_path):
+    path = tmp_path / "major_events_20250101000000.json"
+    path.write_text(json.dumps([EVENT] * 50))
+    loader = lambda p: [Event(ev) for ev in json.loads(open(p).read())]
+
+    cache = EventFileCache(max_bytes=10 * 1024 * 1024)
+    assert len(cache.get(str(path), loader)) == 50
+    assert cache.stats()["bytes"] > path.stat().st_size
+
+    small = EventFileCache(max_bytes=path.stat().st_size * 2)
+    small.get(str(path), loader)
+    # Fits on disk twice over, but not once parsed: not kept
+    assert small.stats() == {"entries": 0, "bytes": 0, "hits": 0, "misses": 1}
@@ -0,0 +1,65 @@
+import io
+import json
+import pytest
+import event_offsets
+from event_offsets import _scan_json_array, _scan_ndjson, read_event, read_event_slice, count_events, offset_cache
+from event_files import iter_events
+
+
+def spans_text(data, spans):
+    return [data[spans[i]:spans[i + 1]].decode("utf-8") for i in range(0, len(spans), 2)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64 * 1024])
+def test_array_scan_handles_escapes_and_brackets_in_strings(monkeypatch, chunk_size):
+    monkeypatch.setattr(event_offsets, "READ_CHUNK_SIZE", chunk_size)
+    events = [{"s": 'quote \\" and {brace} [bracket]'}, {"s": "backslash \\\\"}, {"n": {"deep": [1, {"x": "}"}]}}]
+    data = json.dumps(events, indent=2).encode("utf-8")
+    spans = _scan_json_array(io.BytesIO(data))
+    assert [json.loads(text) for text in spans_text(data, spans)] == events
+
+
+def test_array_scan_rejects_text_before_the_array():
+    assert _scan_json_array(io.BytesIO(b'Here you go: [{"a": 1}]')) is None
+
+
+def test_ndjson_scan_skips_the_lines_the_reader_skips():
+    data = b'{"a": 1}\n{"b": 2, "cut short\n\n  {"c": 3}  \n[1, 2]\n'
+    assert spans_text(data, _scan_ndjson(io.BytesIO(data))) == ['{"a": 1}', '{"c": 3}']
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("major_events_20250101000000.ndjson", '{"i": 0}\n{"i": 1, "bad\n{"i": 2}\n{not json}\n{"i": 3}\n'),
+    # The second element only parses after repair (trailing comma); the fourth never does
+    ("major_events_20250101000000.json", '[{"i": 0}, {"i": 1,}, {"i": 2}, {"i": }, {"i": 3}]'),
+])
+def test_event_numbers_match_the_sequential_reader(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_text(content)
+    offset_cache.invalidate(str(path))
+    sequential = [ev.to_dict() for ev in iter_events(str(path))]
+    assert count_events(str(path)) == len(sequential)
+    assert [read_event(str(path), i) for i in range(len(sequential))] == sequential
+    assert read_event_slice(str(path), 1, 10) == (sequential[1:], len(sequential))
+
+
+def test_unindexed_files_are_counted_once_per_version(tmp_path, monkeypatch):
+    import gzip
+    path = tmp_path / "major_events_20250101000000.json"
+    path.write_bytes(gzip.compress(json.dumps([{"i": i} for i in range(10)]).encode("utf-8")))
+    offset_cache.invalidate(str(path))
+    passes = []
+    real_read_events = event_offsets.read_events
+
+    def counting_read_events(p):
+        passes.append(p)
+        return real_read_events(p)
+
+    monkeypatch.setattr(event_offsets, "read_events", counting_read_events)
+    # The first page is sliced and counted in one pass; later pages and single events
+    # stop as soon as they have what they need
+    assert read_event_slice(str(path), 0, 3) == ([{"i": 0}, {"i": 1}, {"i": 2}], 10)
+    assert read_event_slice(str(path), 3, 3) == ([{"i": 3}, {"i": 4}, {"i": 5}], 10)
+    assert read_event(str(path), 7) == {"i": 7}
+    assert count_events(str(path)) == 10
+    assert len(passes) == 3
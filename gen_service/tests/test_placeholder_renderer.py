@@ -0,0 +1,58 @@
+import datetime
+import re
+import placeholder_renderer
+from placeholder_renderer import PlaceholderRenderer, compile_template, parse_expression, render_placeholders
+
+NOW = datetime.datetime(2025, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def test_compile_template_splits_literals_and_expressions():
+    parts = compile_template("id={{ faker.datatype.uuid() }}, host={{faker.internet.ip()}}!")
+    assert parts[0] == "id="
+    assert parts[1][:2] == ("expr", "faker.datatype.uuid()")
+    assert parts[2] == ", host="
+    assert parts[3][:2] == ("expr", "faker.internet.ip()")
+    assert parts[4] == "!"
+
+
+def test_parse_expression_handles_calls_literals_and_concatenation():
+    ast = parse_expression("'db-' + faker.helpers.arrayElement(['a', \"b\"]) + -1")
+    assert ast[0] == "add"
+    assert parse_expression("faker.datatype.number({min: 1, max: 5})")[0] == "call"
+
+
+def test_unparseable_expression_is_kept_as_an_error_part():
+    (part,) = compile_template("{{ faker.( }}")
+    assert part[0] == "error"
+
+
+def test_faker_calls_and_arguments():
+    renderer = PlaceholderRenderer(seed=1, now=NOW)
+    number = int(renderer.render_string("{{ faker.datatype.number({min: 10, max: 12}) }}"))
+    assert 10 <= number <= 12
+    assert renderer.render_string("{{ faker.helpers.arrayElement(['only']) }}") == "only"
+    assert re.fullmatch(r"[0-9a-f-]{36}", renderer.render_string("{{ faker.datatype.uuid() }}"))
+    assert renderer.render_string("{{ 'n' + 1 }}") == "n1"
+
+
+def test_timestamp_with_pinned_now():
+    renderer = PlaceholderRenderer(now=NOW)
+    assert renderer.render_string("{{ timestamp(-60) }}") == "2025-01-01T11:59:00.000Z"
+    ranged = renderer.render_string("{{ timestamp(-120, -60) }}")
+    assert "2025-01-01T11:58:00.000Z" <= ranged <= "2025-01-01T11:59:00.000Z"
+
+
+def test_unknown_expressions_render_empty():
+    renderer = PlaceholderRenderer(now=NOW)
+    assert renderer.render_string("a{{ faker.nope.call() }}b") == "ab"
+    assert renderer.render_string("a{{ faker.( }}b") == "ab"
+
+
+def test_seed_reproduces_output_and_leaves_shared_faker_alone():
+    events = [{"payload": {"summary": "{{ faker.internet.domainName() }} {{ faker.datatype.uuid() }}",
+                           "timestamp": "{{ timestamp(-3600, 0) }}"}}] * 3
+    first = render_placeholders(events, seed=7, now=NOW)
+    assert first == render_placeholders(events, seed=7, now=NOW)
+    assert first != render_placeholders(events, seed=8, now=NOW)
+    assert PlaceholderRenderer(seed=7).fake is not placeholder_renderer.faker
+    assert PlaceholderRenderer().fake is placeholder_renderer.faker
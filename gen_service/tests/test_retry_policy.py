@@ -0,0 +1,86 @@
+import time
+import threading
+import pytest
+from contextlib import contextmanager
+from retry_policy import call_with_deadline, Deadline, DeadlineExceeded
+
+
+class Slots:
+    """Counting stand-in for llm_limiter.llm_slot."""
+    def __init__(self):
+        self.held = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self, timeout=None):
+        with self.lock:
+            self.held += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.held -= 1
+
+
+def test_slot_is_held_until_an_abandoned_call_finishes():
+    slots = Slots()
+    release = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline(lambda: release.wait(5), Deadline(0.05), slot=slots)
+    # The caller gave up, but the call is still running and still counts against the cap
+    assert slots.held == 1
+    release.set()
+    for _ in range(100):
+        if slots.held == 0:
+            break
+        time.sleep(0.01)
+    assert slots.held == 0
+
+
+def test_result_and_errors_pass_through():
+    slots = Slots()
+    assert call_with_deadline(lambda: "ok", Deadline(5), slot=slots) == "ok"
+    with pytest.raises(ValueError):
+        call_with_deadline(lambda: (_ for _ in ()).throw(ValueError("bad")), Deadline(5), slot=slots)
+    assert slots.held == 0
+
+
+def test_calls_queue_in_the_limiter_not_the_pool(monkeypatch):
+    import llm_limiter
+    from llm_limiter import ConcurrencyLimiter, LLMOverloaded, llm_context, llm_slot, BATCH, INTERACTIVE
+
+    # One batch slot (the other is reserved for interactive calls) and room for 18 waiters
+    limiter = ConcurrencyLimiter(max_concurrent=2, max_queue=18, queue_timeout=10, interactive_reserved=1)
+    monkeypatch.setattr(llm_limiter, "limiter", limiter)
+    release = threading.Event()
+    results = []
+
+    def batch_call():
+        with llm_context(priority=BATCH, org="bulk"):
+            try:
+                results.append(call_with_deadline(lambda: release.wait(10), Deadline(10), slot=llm_slot))
+            except LLMOverloaded:
+                results.append("overloaded")
+
+    threads = [threading.Thread(target=batch_call) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for _ in range(200):
+        stats = limiter.stats()
+        if stats["in_flight"] == 1 and stats["waiting"] == 18 and results:
+            break
+        time.sleep(0.01)
+    # More calls than pool threads: the limiter sees all of them and sheds the overflow
+    assert results == ["overloaded"]
+    assert (limiter.stats()["in_flight"], limiter.stats()["waiting"]) == (1, 18)
+
+    with llm_context(priority=INTERACTIVE, org="ui"):
+        started = time.monotonic()
+        assert call_with_deadline(lambda: "interactive", Deadline(2), slot=llm_slot) == "interactive"
+    assert time.monotonic() - started < 1
+
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    assert results.count(True) == 19
+    assert limiter.stats()["in_flight"] == 0
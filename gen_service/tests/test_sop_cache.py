@@ -0,0 +1,62 @@
+from sop_cache import SOPCache, normalize_alert, alert_fingerprint, blended_fingerprint
+
+ALERT = {
+    "routing_key": "abc", "dedup_key": "d-1",
+    "payload": {
+        "summary": "Disk usage above 90% on db-01", "severity": "critical",
+        "timestamp": "2025-01-01T00:00:00Z",
+        "custom_details": {"service_name": "Database", "event_id": "{{ faker.datatype.uuid() }}",
+                           "hostname": "db-01", "environment": "prod"},
+    },
+    "timing_metadata": {"schedule_offset": 30},
+}
+
+
+def test_normalize_alert_drops_placeholders_and_volatile_fields():
+    assert normalize_alert(ALERT) == {
+        "payload": {
+            "summary": "Disk usage above 90% on db-01", "severity": "critical",
+            "custom_details": {"service_name": "Database", "environment": "prod"},
+        },
+    }
+
+
+def test_fingerprint_ignores_per_send_values_but_not_real_details():
+    resend = dict(ALERT, dedup_key="d-2", payload=dict(ALERT["payload"], timestamp="2025-02-02T00:00:00Z"))
+    assert alert_fingerprint(resend) == alert_fingerprint(ALERT)
+    details = dict(ALERT["payload"]["custom_details"], environment="stage")
+    stage = dict(ALERT, payload=dict(ALERT["payload"], custom_details=details))
+    assert alert_fingerprint(stage) != alert_fingerprint(ALERT)
+    # A placeholder environment carries no information
+    details = dict(ALERT["payload"]["custom_details"], environment="{{ faker.helpers.arrayElement(['a']) }}")
+    templated = dict(ALERT, payload=dict(ALERT["payload"], custom_details=details))
+    assert "environment" not in normalize_alert(templated)["payload"]["custom_details"]
+
+
+def test_blended_fingerprint_is_order_independent():
+    other = dict(ALERT, payload=dict(ALERT["payload"], summary="CPU high"))
+    assert blended_fingerprint([ALERT, other]) == blended_fingerprint([other, ALERT])
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = SOPCache(max_entries=2, max_bytes=1024)
+    cache.put("a", "sop a")
+    cache.put("b", "sop b")
+    assert cache.get("a") == "sop a"  # a is now the most recently used
+    cache.put("c", "sop c")
+    assert "b" not in cache and "a" in cache and "c" in cache
+
+    cache = SOPCache(max_entries=10, max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.put("c", "123")
+    assert "a" not in cache and cache.stats()["bytes"] == 8
+    cache.put("big", "x" * 11)
+    assert "big" not in cache
+
+
+def test_blank_sops_are_not_cached():
+    cache = SOPCache()
+    cache.put("a", "  \n")
+    assert cache.get("a") is None
+    assert cache.stats() == {"entries": 0, "bytes": 0, "hits": 0, "misses": 1}
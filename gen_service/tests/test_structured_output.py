@@ -0,0 +1,56 @@
+import pytest
+from structured_output import IncrementalJSONArrayParser, parse_json_output, StructuredOutputError
+
+
+def feed_all(parser, chunks):
+    elements = []
+    for chunk in chunks:
+        elements.extend(parser.feed(chunk))
+    return elements
+
+
+def test_elements_are_returned_as_their_objects_close():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(': "x}]"}') == [{"b": "x}]"}]
+    assert not parser.closed
+    assert parser.feed("]") == []
+    assert parser.closed
+    assert parser.count == 2
+
+
+def test_escaped_quotes_and_nested_arrays_inside_elements():
+    parser = IncrementalJSONArrayParser()
+    text = '```json\n[{"s": "say \\"hi\\" [x]", "l": [1, {"n": 2}]}]\n```'
+    assert feed_all(parser, list(text)) == [{"s": 'say "hi" [x]', "l": [1, {"n": 2}]}]
+    assert parser.closed
+
+
+def test_truncated_array_is_not_closed():
+    parser = IncrementalJSONArrayParser()
+    assert feed_all(parser, ['[{"a":1},', '{"b":']) == [{"a": 1}]
+    assert parser.count == 1
+    assert not parser.closed
+
+
+def test_empty_array_closes_without_elements():
+    parser = IncrementalJSONArrayParser()
+    assert feed_all(parser, ["[", "]"]) == []
+    assert parser.closed
+    assert parser.count == 0
+    assert parser.pending_text() == ""
+
+
+def test_text_before_any_array_is_kept_for_fallback():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('{"a": 1}') == []
+    assert parser.pending_text() == '{"a": 1}'
+
+
+def test_parse_json_output_repairs_fenced_trailing_commas():
+    assert parse_json_output('```json\n[{"a": 1,},]\n```', expect=list) == [{"a": 1}]
+
+
+def test_parse_json_output_rejects_empty_output():
+    with pytest.raises(StructuredOutputError):
+        parse_json_output("", expect=list)
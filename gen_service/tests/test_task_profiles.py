@@ -0,0 +1,53 @@
+import pytest
+import task_profiles
+from task_profiles import get_task_profile, is_reasoning_model
+
+
+@pytest.fixture(autouse=True)
+def no_overrides(monkeypatch):
+    monkeypatch.setattr(task_profiles, "_overrides", {})
+    for name in ("OPENAI_MODEL", "OPENAI_FAST_MODEL", "OPENAI_MAX_TOKENS", "LLM_TASK_PROFILES"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_reasoning_models():
+    assert is_reasoning_model("o3-mini") and is_reasoning_model("o1") and is_reasoning_model("openai/o4-mini")
+    assert not is_reasoning_model("gpt-4o-mini") and not is_reasoning_model("gpt-4.1")
+
+
+def test_fast_tier_follows_openai_model_without_a_fast_model(monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    assert get_task_profile("change_events_major")["model"] == "gpt-4o"
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+    assert get_task_profile("change_events_major")["model"] == "gpt-4o-mini"
+    assert get_task_profile("events_major")["model"] == "gpt-4o"
+
+
+def test_fast_tasks_get_tight_budgets_except_on_reasoning_models(monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_TOKENS", "8000")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+    assert get_task_profile("diagnostics_select")["max_tokens"] == 256
+    assert get_task_profile("change_events_well")["max_tokens"] == 1024
+    assert get_task_profile("sop")["max_tokens"] == 8000
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "o3-mini")
+    assert get_task_profile("diagnostics_select")["max_tokens"] == 8000
+
+
+def test_unknown_task_uses_openai_defaults():
+    assert get_task_profile("nope") == {"model": "o3-mini", "temperature": None, "max_tokens": 16384}
+
+
+def test_overrides_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_TASK_PROFILES", '{"sop": {"model": "o3", "max_tokens": 4096},'
+                                            ' "change_events_major": {"tier": "default", "temperature": 0.2}}')
+    monkeypatch.setattr(task_profiles, "_overrides", task_profiles._load_overrides())
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    # A configured budget applies even on a reasoning model
+    assert get_task_profile("sop") == {"model": "o3", "temperature": None, "max_tokens": 4096}
+    profile = get_task_profile("change_events_major")
+    assert profile == {"model": "gpt-4o", "temperature": 0.2, "max_tokens": 2048}
+
+
+def test_invalid_overrides_are_ignored(monkeypatch):
+    monkeypatch.setenv("LLM_TASK_PROFILES", "{not json")
+    assert task_profiles._load_overrides() == {}
@@ -1,13 +1,27 @@
 import os
 import re
 import logging
-import json
+import time
+import random
+import threading
+from contextlib import contextmanager
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
-import datetime
-from faker import Faker
-faker = Faker()
+from structured_output import (
+    structured_output_enabled, response_format, parse_json_output, StructuredOutputError,
+    IncrementalJSONArrayParser
+)
+from retry_policy import (
+    Deadline, DeadlineExceeded, current_deadline, default_policy, is_transient,
+    call_with_deadline, LLM_CALL_DEADLINE
+)
+from llm_limiter import llm_slot
+from task_profiles import get_task_profile, output_stats
+from event_expansion import expansion_target, expand_events
+from event_pipeline import pipeline_for
+from event_model import wrap_events
+from event_files import open_event_writer, write_events_file
 
 # Setup logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,40 +32,56 @@ if not api_key:
     logging.error("API key not found in environment variables. Please set OPENAI_API_KEY.")
     # Optionally raise an exception here
 
-# Centralized LLM factory: read model, temperature, and token limits from environment
-def get_llm(default_temp: float = 1.0):
+# Centralized LLM factory: model, temperature and token limits come from the task profile / environment
+def get_llm(default_temp: float = 1.0, response_schema: str = None, task: str = None):
     """
-    Return a ChatOpenAI instance configured via env vars:
-      - OPENAI_MODEL (default: o3-mini)
-      - OPENAI_TEMP (default: default_temp)
-      - OPENAI_MAX_TOKENS (default: 16384)
+    Return a ChatOpenAI instance configured for a task profile (task_profiles.py):
+      - model: the task's tier (OPENAI_MODEL / OPENAI_FAST_MODEL) or explicit model
+      - temperature: the task's temperature, else OPENAI_TEMP (default: default_temp)
+      - max tokens: the task's budget (built-in budgets skip o-series models), else OPENAI_MAX_TOKENS (default: 16384)
+    Profiles can be overridden via LLM_TASK_PROFILES. If response_schema names a
+    schema in structured_output.SCHEMAS and the model supports it
+    (OPENAI_STRUCTURED_OUTPUT), the output is schema-constrained.
     """
-    model_name = os.getenv("OPENAI_MODEL", "o3-mini")
-    try:
-        temp = float(os.getenv("OPENAI_TEMP", str(default_temp)))
-    except ValueError:
-        temp = default_temp
-    try:
-        max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "16384"))
-    except ValueError:
-        max_tokens = 16384
+    profile = get_task_profile(task)
+    model_name = profile["model"]
+    temp = profile["temperature"]
+    if temp is None:
+        try:
+            temp = float(os.getenv("OPENAI_TEMP", str(default_temp)))
+        except ValueError:
+            temp = default_temp
+    model_kwargs = {"max_completion_tokens": profile["max_tokens"]}
+    if response_schema and structured_output_enabled(model_name):
+        model_kwargs["response_format"] = response_format(response_schema)
+    # Task name travels with the LLM so output sizes and latencies are tracked per task
+    metadata = {"task": task} if task else None
     # Try instantiating ChatOpenAI, fallback if the model does not support temperature
     try:
         return ChatOpenAI(
             temperature=temp,
             model_name=model_name,
-            model_kwargs={"max_completion_tokens": max_tokens},
-            openai_api_key=api_key
+            model_kwargs=model_kwargs,
+            openai_api_key=api_key,
+            metadata=metadata,
+            # Retries are handled by the retry policy (run_chain_with_retry / stream_chain)
+            max_retries=0
         )
     except TypeError as err:
         logging.warning(f"Model {model_name} does not support 'temperature' parameter: {err}. Retrying without temperature.")
         # Retry without temperature parameter
         return ChatOpenAI(
             model_name=model_name,
-            model_kwargs={"max_completion_tokens": max_tokens},
-            openai_api_key=api_key
+            model_kwargs=model_kwargs,
+            openai_api_key=api_key,
+            metadata=metadata,
+            max_retries=0
         )
 
+def llm_task(llm):
+    """Task name an LLM was created for via get_llm(task=...), or None."""
+    return (getattr(llm, "metadata", None) or {}).get("task")
+
 def strip_rtf(text):
     """
     Remove basic RTF control words from the text.
@@ -61,13 +91,15 @@ def strip_rtf(text):
 def extract_outage_summary(narrative_text):
     """
     Extracts the outage summary from the narrative.
-    Expects a section starting with "Outage Summary:" followed by a single line.
+    Expects a section starting with "Outage Summary:" (or "**Outage Summary:**") followed by a single line.
     """
     plain_text = strip_rtf(narrative_text)
     marker = "Outage Summary:"
     if marker in plain_text:
         start = plain_text.find(marker) + len(marker)
-        remainder = plain_text[start:].strip()
+        remainder = plain_text[start:].lstrip("*").strip()
+        if not remainder:
+            return ""
         summary_line = remainder.splitlines()[0]
         return summary_line.strip()
     return ""
@@ -75,14 +107,15 @@ def extract_outage_summary(narrative_text):
 def extract_incident_details(narrative_text):
     """
     Extracts the detailed Incident Narrative from the narrative text.
-    Assumes the narrative contains a section starting with "**Incident Narrative**"
-    and ending at the next section marker (e.g., "**The Response**" or "**Talk Track**").
+    Assumes the narrative contains a section starting with "**Incident Narrative**" (or
+    "**Incident Narrative:**") and ending at the next section marker (e.g., "**The Response"
+    or "**Talk Track").
     """
-    marker = "**Incident Narrative**"
-    if marker in narrative_text:
-        start = narrative_text.find(marker) + len(marker)
+    match = re.search(r"\*\*Incident Narrative:?\*\*:?", narrative_text)
+    if match:
+        start = match.end()
         # Define possible end markers
-        end_markers = ["**The Response**", "**Talk Track**"]
+        end_markers = ["**The Response", "**Talk Track"]
         end = len(narrative_text)
         for m in end_markers:
             idx = narrative_text.find(m, start)
@@ -91,24 +124,242 @@ def extract_incident_details(narrative_text):
         return narrative_text[start:end].strip()
     return ""
 
+#########################
+# HELPER: FOREGROUND / BACKGROUND TRACKING
+#########################
+
+# Count of in-flight LLM calls made on behalf of interactive requests. Background
+# workers (e.g. SOP prefetch) wait for this to reach zero before issuing calls.
+_foreground_calls = 0
+_foreground_cv = threading.Condition()
+_thread_state = threading.local()
+
+@contextmanager
+def background_work():
+    """Mark LLM calls made in this thread as background work."""
+    previous = getattr(_thread_state, "background", False)
+    _thread_state.background = True
+    try:
+        yield
+    finally:
+        _thread_state.background = previous
+
+def is_background_thread():
+    return getattr(_thread_state, "background", False)
+
+@contextmanager
+def _track_llm_call():
+    global _foreground_calls
+    if is_background_thread():
+        yield
+        return
+    with _foreground_cv:
+        _foreground_calls += 1
+    try:
+        yield
+    finally:
+        with _foreground_cv:
+            _foreground_calls -= 1
+            _foreground_cv.notify_all()
+
+def wait_for_foreground_idle(timeout=None):
+    """Block until no foreground LLM calls are in flight. Returns False on timeout."""
+    with _foreground_cv:
+        return _foreground_cv.wait_for(lambda: _foreground_calls == 0, timeout=timeout)
+
 #########################
 # HELPER: RETRY LOGIC
 #########################
 
-def run_chain_with_retry(chain, inputs, max_attempts=3):
+def _apply_call_timeout(chain, deadline):
+    # Bound the underlying HTTP request by the time left on the deadline
+    try:
+        chain.llm.request_timeout = max(1.0, deadline.remaining())
+    except (AttributeError, ValueError, TypeError):
+        pass
+
+def run_chain_with_retry(chain, inputs, max_attempts=3, policy=None, deadline=None):
     """
-    Runs an LLMChain with provided inputs, retrying if the result is blank.
+    Runs an LLMChain with provided inputs under a retry policy:
+      - transient errors (rate limits, timeouts, 5xx, connection drops) are retried
+        with jittered exponential backoff, honouring Retry-After;
+      - blank output is retried;
+      - every attempt is bounded by the request deadline (deadline_scope) or,
+        outside a request, by LLM_CALL_DEADLINE; optional hedging via LLM_HEDGE.
     """
+    policy = policy or default_policy(max_attempts)
+    deadline = deadline or current_deadline() or Deadline(LLM_CALL_DEADLINE)
+    task = llm_task(chain.llm)
+    latency_key = task or getattr(chain.llm, "model_name", None) or "default"
     attempt = 0
     result = ""
-    while attempt < max_attempts:
-        result = chain.run(**inputs)
+    while attempt < policy.max_attempts:
+        attempt += 1
+        if deadline.expired():
+            raise DeadlineExceeded("Request deadline exceeded before LLM call.")
+        _apply_call_timeout(chain, deadline)
+        try:
+            # Each call (and hedge) holds a process-wide LLM slot while it runs (raises LLMOverloaded when saturated)
+            with _track_llm_call():
+                result = call_with_deadline(lambda: chain.run(**inputs), deadline, latency_key=latency_key, slot=llm_slot)
+        except Exception as e:
+            if not is_transient(e) or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt, e)
+            if delay >= deadline.remaining():
+                raise DeadlineExceeded(f"No time left to retry after transient error: {e}") from e
+            logging.warning(f"Transient LLM error on attempt {attempt}: {e}. Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
         if result.strip():
+            output_stats.record(task, len(result))
             return result
-        attempt += 1
         logging.warning(f"Chain output blank on attempt {attempt}. Retrying...")
     return result
 
+def run_json_chain(chain, inputs, expect=list, max_attempts=3, label="output"):
+    """
+    Run an LLMChain and parse its JSON output with the tolerant repair parser.
+    Only regenerates when the output cannot be repaired at all. The first call gets the
+    retry policy's full budget for transient errors and blank output; each regeneration
+    is a single call, so nested retries cannot multiply.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        raw = run_chain_with_retry(chain, inputs, max_attempts=max_attempts if attempt == 1 else 1)
+        try:
+            return parse_json_output(raw, expect=expect)
+        except StructuredOutputError as e:
+            if attempt >= max_attempts:
+                logging.error(f"Failed to parse JSON {label}: {e}\nRaw output: {raw}")
+                raise
+            logging.warning(f"Unrepairable JSON {label} on attempt {attempt}: {e}. Regenerating...")
+
+#########################
+# HELPER: STREAMING EVENT GENERATION
+#########################
+
+def stream_events_enabled():
+    """OPENAI_STREAM_EVENTS (default on) toggles streamed event generation when writing to a file."""
+    return os.getenv("OPENAI_STREAM_EVENTS", "true").strip().lower() not in ("0", "false", "off", "no")
+
+def stream_chain(chain, inputs, max_attempts=3, policy=None, deadline=None):
+    """
+    Yield text chunks from an LLMChain as the model produces them.
+    Transient errors before the first chunk are retried with backoff; the deadline
+    is checked between chunks. Falls back to a single chunk when the LLM does not
+    support streaming.
+    """
+    llm = chain.llm
+    if not hasattr(llm, "stream") or not hasattr(chain.prompt, "format_messages"):
+        yield run_chain_with_retry(chain, inputs, max_attempts=max_attempts, policy=policy, deadline=deadline)
+        return
+    policy = policy or default_policy(max_attempts)
+    deadline = deadline or current_deadline() or Deadline(LLM_CALL_DEADLINE)
+    messages = chain.prompt.format_messages(**inputs)
+    task = llm_task(llm)
+    attempt = 0
+    while True:
+        attempt += 1
+        _apply_call_timeout(chain, deadline)
+        yielded = False
+        size = 0
+        try:
+            with llm_slot(deadline.remaining()), _track_llm_call():
+                for chunk in llm.stream(messages):
+                    if deadline.expired():
+                        raise DeadlineExceeded("Request deadline exceeded while streaming.")
+                    text = getattr(chunk, "content", chunk)
+                    if text:
+                        yielded = True
+                        size += len(text)
+                        yield text
+            output_stats.record(task, size)
+            return
+        except Exception as e:
+            if yielded or not is_transient(e) or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt, e)
+            if delay >= deadline.remaining():
+                raise DeadlineExceeded(f"No time left to retry after transient error: {e}") from e
+            logging.warning(f"Transient LLM streaming error on attempt {attempt}: {e}. Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def iter_streamed_json_array(chain, inputs):
+    """
+    Stream the chain and yield each element of the JSON array as soon as its object closes.
+    Raises StructuredOutputError after the stream ends if the array never closed (output
+    cut off, e.g. by the token cap) or held no elements, so callers can discard what was
+    yielded and regenerate.
+    """
+    parser = IncrementalJSONArrayParser()
+    for chunk in stream_chain(chain, inputs):
+        yield from parser.feed(chunk)
+    if parser.count == 0 and not parser.closed:
+        text = parser.pending_text()
+        if text.strip():
+            # No array streamed (e.g. a bare object); fall back to the repair parser
+            elements = parse_json_output(text, expect=list)
+            if elements:
+                yield from elements
+                return
+    if not parser.closed and parser.count:
+        raise StructuredOutputError(f"Streamed array was cut off after {parser.count} elements.")
+    if parser.count == 0:
+        raise StructuredOutputError("Streamed output held no array elements.")
+
+def iter_streamed_events(chain, inputs, label="events"):
+    """Stream the chain and yield each post-processed alert event as soon as its object closes."""
+    yield from pipeline_for("alert").process(iter_streamed_json_array(chain, inputs))
+
+def expand_alert_events(templates, expand_to, seed=None, label="events"):
+    """Expand post-processed alert templates locally to expand_to events (see event_expansion)."""
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    events = expand_events(templates, expand_to, seed=seed)
+    logging.info(f"Expanded {len(templates)} {label} templates to {len(events)} alerts / {expand_to} sends (seed={seed})")
+    return events
+
+def generate_alert_events(chain, inputs, label, output_path=None, expand_to=None, seed=None):
+    """
+    Shared driver for the alert event generators. When output_path is given, events are
+    streamed, post-processed and appended to the file as they arrive; otherwise the
+    full array is generated and parsed at once. With expand_to, the generated events are
+    treated as templates and expanded locally (seeded) to that many events.
+    Returns the post-processed events as Event objects.
+    """
+    pipeline = pipeline_for("alert")
+    if expand_to:
+        templates = pipeline.process_all(run_json_chain(chain, inputs, expect=list, label=label))
+        events = expand_alert_events(templates, expand_to, seed=seed, label=label)
+        if output_path:
+            write_events_file(output_path, events)
+        return wrap_events(events)
+    if output_path and stream_events_enabled():
+        writer = open_event_writer(output_path)
+        events = []
+        try:
+            for ev in iter_streamed_events(chain, inputs, label=label):
+                writer.write(ev)
+                events.append(ev)
+        except StructuredOutputError as e:
+            # Truncated or empty stream: discard the partial file and regenerate in full
+            writer.abort()
+            logging.warning(f"Streamed {label} incomplete ({e}); regenerating without streaming.")
+        except Exception as e:
+            writer.abort()
+            logging.error(f"Streaming generation of {label} failed: {e}")
+            raise
+        else:
+            writer.close()
+            logging.info(f"Streamed {writer.count} {label} to {output_path}")
+            return wrap_events(events)
+    events = pipeline.process_events(run_json_chain(chain, inputs, expect=list, label=label))
+    if output_path:
+        write_events_file(output_path, events)
+    return events
+
 #########################
 # INCIDENT NARRATIVE FUNCTIONS
 #########################
@@ -161,24 +412,17 @@ Return a **JSON** object with keys:
 Do **NOT** wrap the JSON in code fences.
 """)
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="narrative", task="narrative_major")
     chain = LLMChain(llm=llm, prompt=major_incident_template, verbose=True)
-    raw = chain.run(
-        organization=organization,
-        symptom_input=symptom_input,
-        root_cause_input=root_cause_input,
-        itsm_tools=itsm_tools,
-        observability_tools=observability_tools,
-        service_names=service_names
-    ).strip()
-    if raw.startswith("```") and raw.endswith("```"):
-        raw = raw.strip("`").strip()
-    try:
-        data = json.loads(raw)
-    except ValueError as e:
-        logging.error(f"Failed to parse JSON from model output: {e}")
-        raise
-    return data
+    inputs = {
+        "organization": organization,
+        "symptom_input": symptom_input,
+        "root_cause_input": root_cause_input,
+        "itsm_tools": itsm_tools,
+        "observability_tools": observability_tools,
+        "service_names": service_names
+    }
+    return run_json_chain(chain, inputs, expect=dict, label="narrative")
 
 def generate_partial(
     organization,
@@ -231,24 +475,17 @@ Return a **JSON** object with keys:
 Do **NOT** wrap the JSON in code fences.
 """)
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="narrative", task="narrative_partial")
     chain = LLMChain(llm=llm, prompt=partial_incident_template, verbose=True)
-    raw = chain.run(
-        organization=organization,
-        symptom_input=symptom_input,
-        root_cause_input=root_cause_input,
-        itsm_tools=itsm_tools,
-        observability_tools=observability_tools,
-        service_names=service_names
-    ).strip()
-    if raw.startswith("```") and raw.endswith("```"):
-        raw = raw.strip("`").strip()
-    try:
-        data = json.loads(raw)
-    except ValueError as e:
-        logging.error(f"Failed to parse JSON from model output: {e}")
-        raise
-    return data
+    inputs = {
+        "organization": organization,
+        "symptom_input": symptom_input,
+        "root_cause_input": root_cause_input,
+        "itsm_tools": itsm_tools,
+        "observability_tools": observability_tools,
+        "service_names": service_names
+    }
+    return run_json_chain(chain, inputs, expect=dict, label="narrative")
 
 def generate_well(
     organization,
@@ -300,48 +537,23 @@ Return a **JSON** object with keys:
 Do **NOT** wrap the JSON in code fences.
 """)
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="narrative", task="narrative_well")
     chain = LLMChain(llm=llm, prompt=well_incident_template, verbose=True)
-    raw = chain.run(
-        organization=organization,
-        symptom_input=symptom_input,
-        root_cause_input=root_cause_input,
-        itsm_tools=itsm_tools,
-        observability_tools=observability_tools,
-        service_names=service_names
-    ).strip()
-    if raw.startswith("```") and raw.endswith("```"):
-        raw = raw.strip("`").strip()
-    try:
-        data = json.loads(raw)
-    except ValueError as e:
-        logging.error(f"Failed to parse JSON from model output: {e}")
-        raise
-    return data
+    inputs = {
+        "organization": organization,
+        "symptom_input": symptom_input,
+        "root_cause_input": root_cause_input,
+        "itsm_tools": itsm_tools,
+        "observability_tools": observability_tools,
+        "service_names": service_names
+    }
+    return run_json_chain(chain, inputs, expect=dict, label="narrative")
 
 #########################
 # EVENT GENERATION FUNCTIONS
 #########################
 
-def generate_major_events(
-    organization,
-    api_key,
-    itsm_tools,
-    observability_tools,
-    outage_summary,
-    service_names,
-    incident_details,
-    unique_alerts=None,
-    max_events=None
-):
-    """
-    Generate **8–10 unique events** for a MAJOR incident scenario, with a total event count between **50 and 70**.
-    Each event’s custom_details must include "metric_name", "current_value", "threshold", and "service_name".
-    """
-    # Prepare override inputs with defaults
-    unique_alerts_input = unique_alerts or "8-10"
-    max_events_input = max_events or "50-70"
-    major_events_template = ChatPromptTemplate.from_template("""
+MAJOR_EVENTS_PROMPT = """
 Generate a JSON **array** of events for a **MAJOR** incident at {organization}.
 Every event object must include the top-level key `"event_action"` set to `"trigger"`, and in its `"payload"` include the keys `"summary"`, `"source"`, and `"severity"` appropriate for each alert.
 
@@ -363,9 +575,33 @@ Every event object must include the top-level key `"event_action"` set to `"trig
 8. Do not include the organization name in any `summary` field.
 
 Return only the JSON array — no code fences.
-""")
+"""
+
+def generate_major_events(
+    organization,
+    api_key,
+    itsm_tools,
+    observability_tools,
+    outage_summary,
+    service_names,
+    incident_details,
+    unique_alerts=None,
+    max_events=None,
+    output_path=None,
+    seed=None
+):
+    """
+    Generate **8–10 unique events** for a MAJOR incident scenario, with a total event count between **50 and 70**.
+    Each event’s custom_details must include "metric_name", "current_value", "threshold", and "service_name".
+    """
+    # Prepare override inputs with defaults
+    unique_alerts_input = unique_alerts or "8-10"
+    # Large volumes: the LLM writes a compact template set that is expanded locally
+    expand_to = expansion_target(max_events, seed)
+    max_events_input = "50-70" if expand_to else (max_events or "50-70")
+    major_events_template = ChatPromptTemplate.from_template(MAJOR_EVENTS_PROMPT)
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="alert_events", task="events_major")
     chain = LLMChain(llm=llm, prompt=major_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -377,34 +613,32 @@ Return only the JSON array — no code fences.
         "outage_summary": outage_summary,
         "incident_details": incident_details
     }
-    # Generate raw JSON array string (may include placeholder tokens)
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse the JSON array
-    try:
-        events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON major events: {e}\nRaw output: {raw}")
-        raise
-    # Swap payload.summary with custom_details.description so description drives the alert title
-    for ev in events:
-        ev_payload = ev.setdefault('payload', {})
-        cd = ev_payload.setdefault('custom_details', {})
-        if 'description' in cd:
-            # Swap summary and description
-            old_summary = ev_payload.get('summary', '')
-            ev_payload['summary'] = cd['description']
-            cd['description'] = old_summary
-        # Inject faker placeholder metadata into custom_details
-        cd['event_id'] = '{{ faker.datatype.uuid() }}'
-        cd['hostname'] = '{{ faker.internet.domainName() }}'
-        cd['ip_address'] = '{{ faker.internet.ip() }}'
-        cd['cluster_name'] = '{{ faker.commerce.department() + "-cluster" }}'
-        ev_payload['custom_details'] = cd
-    # Return the augmented JSON with placeholders intact
-    return json.dumps(events, indent=2)
+    # Generate, parse and post-process the JSON array (streamed to output_path when given)
+    return generate_alert_events(chain, inputs, "major events", output_path=output_path, expand_to=expand_to, seed=seed)
+
+PARTIAL_EVENTS_PROMPT = """
+Generate a JSON **array** of events for a **PARTIALLY UNDERSTOOD** incident at {organization}.
+
+**Inputs**
+- unique_alerts: {unique_alerts_input}
+- max_events: {max_events_input}
+- service_names: {service_names}
+- incident_details: {incident_details}
+- outage_summary: {outage_summary}
+Every event object must include the top-level key `"event_action"` set to `"trigger"`, and in its `"payload"` include the keys `"summary"`, `"severity"`, `"source"`, `"component"`, `"group"`, `"class"`, and `"custom_details"`.
+
+**Rules**
+1. Use only these observability tools for `"source"`: {observability_tools}.
+2. Create **{unique_alerts_input} unique alert objects** spanning 420 s (`timing_metadata.schedule_offset` 0–420).
+3. Each event must have `"severity"` set to `"warning" or "critical"`.
+4. Provide `"repeat_schedule"` as an **array of objects** each with integer fields `repeat_count` and `repeat_offset` so the total events land **between {max_events_input}**.
+5. `payload.custom_details` MUST include  
+   `"metric_name"`, `"current_value"`, `"threshold"`, and `"service_name"` and service_name must use a value from {service_names}.
+6. Do not reference the customer name `{organization}` and the services `{service_names}` in the summary.
+7. Infer realistic alert information from Incident Details: `{incident_details}`
+8. Infer additional context from: `{outage_summary}`
+Return only the JSON array — no code fences.
+"""
 
 def generate_partial_events(
     organization,
@@ -415,7 +649,9 @@ def generate_partial_events(
     service_names,
     incident_details,
     unique_alerts=None,
-    max_events=None
+    max_events=None,
+    output_path=None,
+    seed=None
 ):
     """
     Generate a JSON array of demo events for a PARTIALLY UNDERSTOOD incident scenario.
@@ -430,37 +666,13 @@ def generate_partial_events(
     """
     # Prepare override inputs with defaults
     unique_alerts_input = unique_alerts or "4-5"
-    max_events_input = max_events or "50-70"
-    partial_events_template = ChatPromptTemplate.from_template("""
-Generate a JSON **array** of events for a **PARTIALLY UNDERSTOOD** incident at {organization}.
-    # Prepare override inputs with defaults
-    unique_alerts_input = unique_alerts or "4-5"
-    max_events_input = max_events or "50-70"
-Generate a JSON **array** of events for a **PARTIALLY UNDERSTOOD** incident at {organization}.
-
-**Inputs**
-- unique_alerts: {unique_alerts_input}
-- max_events: {max_events_input}
-- service_names: {service_names}
-- incident_details: {incident_details}
-- outage_summary: {outage_summary}
-Every event object must include the top-level key `"event_action"` set to `"trigger"`, and in its `"payload"` include the keys `"summary"`, `"severity"`, `"source"`, `"component"`, `"group"`, `"class"`, and `"custom_details"`.
-
-**Rules**
-1. Use only these observability tools for `"source"`: {observability_tools}.
-2. Create **{unique_alerts_input} unique alert objects** spanning 420 s (`timing_metadata.schedule_offset` 0–420).
-3. Each event must have `"severity"` set to `"warning" or "critical"`.
-4. Provide `"repeat_schedule"` as an **array of objects** each with integer fields `repeat_count` and `repeat_offset` so the total events land **between {max_events_input}**.
-5. `payload.custom_details` MUST include  
-   `"metric_name"`, `"current_value"`, `"threshold"`, and `"service_name"` and service_name must use a value from {service_names}.
-6. Do not reference the customer name `{organization}` and the services `{service_names}` in the summary.
-7. Infer realistic alert information from Incident Details: `{incident_details}`
-8. Infer additional context from: `{outage_summary}`
-Return only the JSON array — no code fences.
-""")
+    # Large volumes: the LLM writes a compact template set that is expanded locally
+    expand_to = expansion_target(max_events, seed)
+    max_events_input = "50-70" if expand_to else (max_events or "50-70")
+    partial_events_template = ChatPromptTemplate.from_template(PARTIAL_EVENTS_PROMPT)
 
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="alert_events", task="events_partial")
     chain = LLMChain(llm=llm, prompt=partial_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -472,42 +684,10 @@ Return only the JSON array — no code fences.
         "incident_details": incident_details,
         "outage_summary": outage_summary
     }
-    # Generate raw JSON array string (may include placeholder tokens)
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse the JSON array
-    try:
-        events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON partial events: {e}\nRaw output: {raw}")
-        raise
-    # Inject faker placeholder metadata into each event's custom_details
-    for ev in events:
-        ev_payload = ev.setdefault('payload', {})
-        cd = ev_payload.setdefault('custom_details', {})
-        # If a description field is present, swap it with the summary to drive alert titles
-        if 'description' in cd:
-            old_summary = ev_payload.get('summary', '')
-            ev_payload['summary'] = cd.get('description', old_summary)
-            cd['description'] = old_summary
-        # Inject placeholder metadata into custom_details
-        cd['event_id'] = '{{ faker.datatype.uuid() }}'
-        cd['hostname'] = '{{ faker.internet.domainName() }}'
-        cd['ip_address'] = '{{ faker.internet.ip() }}'
-        cd['cluster_name'] = '{{ faker.commerce.department() + "-cluster" }}'
-        ev_payload['custom_details'] = cd
-    # Return the augmented JSON with placeholders intact
-    return json.dumps(events, indent=2)
+    # Generate, parse and post-process the JSON array (streamed to output_path when given)
+    return generate_alert_events(chain, inputs, "partial events", output_path=output_path, expand_to=expand_to, seed=seed)
 
-def generate_partial_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
-    """
-    Generate a JSON array with exactly one PagerDuty Change Event API v2 object representing the root cause
-    of a PARTIALLY UNDERSTOOD incident scenario.
-    """
-    # Prompt for a single change event reflecting the root cause
-    change_events_template = ChatPromptTemplate.from_template("""
+PARTIAL_CHANGE_EVENTS_PROMPT = """
 Generate **one** PagerDuty Change Event (API v2 JSON) that MINUTES EARLIER introduced a config drift.
 
 **Context**
@@ -522,8 +702,16 @@ routing_key, event_action="trigger", payload.summary (≤90 chars), payload.time
 payload.custom_details: {{"change_ticket": "<SN CHG-ID>", "environment": "<prod|stage>", "author": "<name>"}}
 
 Return a JSON array with that single object, no code fences.
-""")
-    llm = get_llm()
+"""
+
+def generate_partial_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
+    """
+    Generate a JSON array with exactly one PagerDuty Change Event API v2 object representing the root cause
+    of a PARTIALLY UNDERSTOOD incident scenario.
+    """
+    # Prompt for a single change event reflecting the root cause
+    change_events_template = ChatPromptTemplate.from_template(PARTIAL_CHANGE_EVENTS_PROMPT)
+    llm = get_llm(response_schema="change_events", task="change_events_partial")
     chain = LLMChain(llm=llm, prompt=change_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -533,35 +721,12 @@ Return a JSON array with that single object, no code fences.
         "outage_summary": outage_summary,
         "incident_details": incident_details
     }
-    # Generate and retry if blank
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse JSON output
-    try:
-        change_events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON partial change events: {e}\nRaw output: {raw}")
-        raise
-    # Inject placeholder tokens for timestamp and custom details
-    for ev in change_events:
-        ev_payload = ev.setdefault('payload', {})
-        # Use a timestamp placeholder between 30m and 60s before now
-        ev_payload['timestamp'] = '{{ timestamp(-1800, -60) }}'
-        cd = ev_payload.setdefault('custom_details', {})
-        cd['change_ticket'] = "{{ 'CHG' + faker.datatype.number({ min: 10000, max: 999999 }) }}"
-        cd['environment'] = "{{ faker.helpers.arrayElement(['production','staging','development','testing']) }}"
-        ev_payload['custom_details'] = cd
-    return json.dumps(change_events, indent=2)
+    # Generate and parse the JSON array, repairing malformed output where possible
+    return pipeline_for("change", "partial").process_events(
+        run_json_chain(chain, inputs, expect=list, label="partial change events")
+    )
   
-def generate_well_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
-    """
-    Generate a JSON array with exactly one PagerDuty Change Event API v2 object representing the automated remediation
-    or configuration change for a WELL-UNDERSTOOD incident scenario.
-    """
-    # Prompt for a single change event reflecting the automated remediation action
-    change_events_template = ChatPromptTemplate.from_template("""
+WELL_CHANGE_EVENTS_PROMPT = """
 Generate **ONE** PagerDuty Change Event (API v2 JSON) that represents the automated remediation for a WELL-UNDERSTOOD incident.
 
 **Context**
@@ -574,8 +739,16 @@ routing_key, event_action="trigger", payload.summary (≤90 chars), payload.time
 payload.custom_details: {{"automation_job_id": "<job-ID>", "environment": "<prod|stage>", "author": "<automation-system>"}}
 
 Return a JSON array with that single object, no code fences.
-""")
-    llm = get_llm()
+"""
+
+def generate_well_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
+    """
+    Generate a JSON array with exactly one PagerDuty Change Event API v2 object representing the automated remediation
+    or configuration change for a WELL-UNDERSTOOD incident scenario.
+    """
+    # Prompt for a single change event reflecting the automated remediation action
+    change_events_template = ChatPromptTemplate.from_template(WELL_CHANGE_EVENTS_PROMPT)
+    llm = get_llm(response_schema="change_events", task="change_events_well")
     chain = LLMChain(llm=llm, prompt=change_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -585,27 +758,24 @@ Return a JSON array with that single object, no code fences.
         "outage_summary": outage_summary,
         "incident_details": incident_details
     }
-    # Generate and retry if blank
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse JSON output
-    try:
-        change_events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON well change events: {e}\nRaw output: {raw}")
-        raise
-    # Inject placeholder tokens for timestamp and custom details
-    for ev in change_events:
-        ev_payload = ev.setdefault('payload', {})
-        # Use a timestamp placeholder between 30m and 60s before now
-        ev_payload['timestamp'] = '{{ timestamp(-1800, -60) }}'
-        cd = ev_payload.setdefault('custom_details', {})
-        cd['automation_job_id'] = '{{ faker.datatype.uuid() }}'
-        cd['action_type'] = "{{ faker.helpers.arrayElement(['autoscale','hotfix_deploy','config_rollback']) }}"
-        ev_payload['custom_details'] = cd
-    return json.dumps(change_events, indent=2)
+    # Generate and parse the JSON array, repairing malformed output where possible
+    return pipeline_for("change", "well").process_events(
+        run_json_chain(chain, inputs, expect=list, label="well change events")
+    )
+
+WELL_EVENTS_PROMPT = """
+Generate a JSON **array** of events for a **WELL-UNDERSTOOD** incident at {organization}.
+Every event object must include the top-level key `"event_action"` set to `"trigger"`, and in its `"payload"` include the keys `"summary"`, `"source"`, `"severity"`, and `"custom_details"`.
+
+**Rules**
+1. Use only these observability tools for `"source"`: {observability_tools}.
+2. Create **2–3 unique alert objects** spanning 120 s (`timing_metadata.schedule_offset` 0–120).
+3. Use severities `"info"` or `"warning"` only.
+    4. Provide `"repeat_schedule"` as an **array of objects** each with integer fields `repeat_count` and `repeat_offset` (for example, one element with repeat_count=2 and repeat_offset=60) so the total events land **between 4 and 6**.
+5. `payload.custom_details` MUST include `"metric_name"`, `"current_value"`, `"threshold"`, and `"service_name"` (value from {service_names}).
+
+Return only the JSON array — no code fences.
+"""
 
 def generate_well_events(
     organization,
@@ -616,7 +786,9 @@ def generate_well_events(
     service_names,
     incident_details,
     unique_alerts=None,
-    max_events=None
+    max_events=None,
+    output_path=None,
+    seed=None
 ):
     """
     Generate a JSON **array** of events for a **WELL-UNDERSTOOD** incident at {organization}.
@@ -633,22 +805,12 @@ def generate_well_events(
     """
     # Override inputs with defaults
     unique_alerts_input = unique_alerts or "2-3"
-    max_events_input = max_events or "4-6"
-    well_events_template = ChatPromptTemplate.from_template("""
-Generate a JSON **array** of events for a **WELL-UNDERSTOOD** incident at {organization}.
-Every event object must include the top-level key `"event_action"` set to `"trigger"`, and in its `"payload"` include the keys `"summary"`, `"source"`, `"severity"`, and `"custom_details"`.
-
-**Rules**
-1. Use only these observability tools for `"source"`: {observability_tools}.
-2. Create **2–3 unique alert objects** spanning 120 s (`timing_metadata.schedule_offset` 0–120).
-3. Use severities `"info"` or `"warning"` only.
-    4. Provide `"repeat_schedule"` as an **array of objects** each with integer fields `repeat_count` and `repeat_offset` (for example, one element with repeat_count=2 and repeat_offset=60) so the total events land **between 4 and 6**.
-5. `payload.custom_details` MUST include `"metric_name"`, `"current_value"`, `"threshold"`, and `"service_name"` (value from {service_names}).
-
-Return only the JSON array — no code fences.
-""")
+    # Large volumes: the LLM writes a compact template set that is expanded locally
+    expand_to = expansion_target(max_events, seed)
+    max_events_input = "4-6" if expand_to else (max_events or "4-6")
+    well_events_template = ChatPromptTemplate.from_template(WELL_EVENTS_PROMPT)
     # Instantiate LLM
-    llm = get_llm()
+    llm = get_llm(response_schema="alert_events", task="events_well")
     chain = LLMChain(llm=llm, prompt=well_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -660,41 +822,10 @@ Return only the JSON array — no code fences.
         "incident_details": incident_details,
         "outage_summary": outage_summary
     }
-    # Generate raw JSON array string (may include placeholder tokens)
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse the JSON array
-    try:
-        events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON well events: {e}\nRaw output: {raw}")
-        raise
-    # Enhance each event: swap description into summary, inject faker placeholders
-    for ev in events:
-        ev_payload = ev.setdefault('payload', {})
-        # Ensure custom_details exists
-        cd = ev_payload.setdefault('custom_details', {})
-        # Swap summary and description if description field is present
-        if 'description' in cd:
-            old_summary = ev_payload.get('summary', '')
-            ev_payload['summary'] = cd.get('description', old_summary)
-            cd['description'] = old_summary
-        # Inject placeholder metadata
-        cd['event_id'] = '{{ faker.datatype.uuid() }}'
-        cd['hostname'] = '{{ faker.internet.domainName() }}'
-        cd['ip_address'] = '{{ faker.internet.ip() }}'
-        cd['cluster_name'] = '{{ faker.commerce.department() + "-cluster" }}'
-        ev_payload['custom_details'] = cd
-    # Return the augmented JSON with placeholders intact
-    return json.dumps(events, indent=2)
+    # Generate, parse and post-process the JSON array (streamed to output_path when given)
+    return generate_alert_events(chain, inputs, "well events", output_path=output_path, expand_to=expand_to, seed=seed)
 
-def generate_major_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
-    """
-    Generate **three** PagerDuty Change Event (API v2 JSON) that occurred minutes before the incident and introduced the fault.
-    """
-    change_events_template = ChatPromptTemplate.from_template("""
+MAJOR_CHANGE_EVENTS_PROMPT = """
 Generate **three** PagerDuty Change Event (API v2 JSON) that occurred minutes before the incident and introduced the fault.
 
 **Context**
@@ -708,8 +839,14 @@ routing_key, event_action="trigger", payload.summary (≤90 chars), payload.ti
 payload.custom_details: {{"change_ticket": "<SN CHG‑ID>", "environment": "<prod|stage>", "author": "<name>"}}
 
 Return a JSON array with that single object, no code fences.
-""")
-    llm = get_llm()
+"""
+
+def generate_major_change_events(organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details):
+    """
+    Generate **three** PagerDuty Change Event (API v2 JSON) that occurred minutes before the incident and introduced the fault.
+    """
+    change_events_template = ChatPromptTemplate.from_template(MAJOR_CHANGE_EVENTS_PROMPT)
+    llm = get_llm(response_schema="change_events", task="change_events_major")
     chain = LLMChain(llm=llm, prompt=change_events_template, verbose=True)
     inputs = {
         "organization": organization,
@@ -719,33 +856,123 @@ Return a JSON array with that single object, no code fences.
         "outage_summary": outage_summary,
         "incident_details": incident_details
     }
-    # Generate and retry if blank
-    # Generate raw JSON array string (may contain placeholders)
-    raw = run_chain_with_retry(chain, inputs, max_attempts=3).strip()
-    # Strip markdown fences if present
-    if raw.startswith('```') and raw.endswith('```'):
-        raw = raw.strip('`').strip()
-    # Parse JSON output to overlay placeholder tokens
-    try:
-        events = json.loads(raw)
-    except Exception as e:
-        logging.error(f"Failed to parse JSON change events: {e}\nRaw output: {raw}")
-        raise
+    # Generate and parse the JSON array, repairing malformed output where possible
     # Replace actual values with template placeholders for backend resolution
-    for ev in events:
-        # Use template placeholder for timestamp between 30m and 60s before send time
-        ev_payload = ev.setdefault('payload', {})
-        ev_payload['timestamp'] = '{{ timestamp(-1800, -60) }}'
-        # Inject faker placeholders into custom_details
-        cd = ev_payload.setdefault('custom_details', {})
-        cd['build_number'] = '{{ faker.datatype.number({ min: 10000, max: 99999 }) }}'
-        cd['change_ticket'] = "{{ 'CHG' + faker.datatype.number({ min: 10000, max: 999999 }) }}"
-        cd['environment'] = "{{ faker.helpers.arrayElement(['production','staging','development','testing']) }}"
-        # Inject faker placeholders into link href and text
-        links = ev.get('links')
-        if isinstance(links, list) and links:
-            link = links[0]
-            link['href'] = "{{ faker.internet.url() }}"
-            link['text'] = "{{ 'View Change ' + ('CHG' + faker.datatype.number({ min: 10000, max: 999999 })) }}"
-    # Return the augmented JSON with placeholders
-    return json.dumps(events, indent=2)
\ No newline at end of file
+    return pipeline_for("change", "major").process_events(
+        run_json_chain(chain, inputs, expect=list, label="change events")
+    )
+
+#########################
+# FUSED EVENT + CHANGE EVENT GENERATION
+#########################
+
+def fused_events_enabled():
+    """OPENAI_FUSED_EVENTS (default off) generates a scenario's alert and change events in one LLM call."""
+    return os.getenv("OPENAI_FUSED_EVENTS", "false").strip().lower() in ("1", "true", "on", "yes")
+
+# Per-scenario prompts, input defaults and standalone generators
+SCENARIO_EVENT_SPECS = {
+    "major": {
+        "events_prompt": MAJOR_EVENTS_PROMPT,
+        "change_prompt": MAJOR_CHANGE_EVENTS_PROMPT,
+        "unique_alerts": "8-10",
+        "max_events": "50-70",
+        "events": generate_major_events,
+        "change_events": generate_major_change_events,
+    },
+    "partial": {
+        "events_prompt": PARTIAL_EVENTS_PROMPT,
+        "change_prompt": PARTIAL_CHANGE_EVENTS_PROMPT,
+        "unique_alerts": "4-5",
+        "max_events": "50-70",
+        "events": generate_partial_events,
+        "change_events": generate_partial_change_events,
+    },
+    "well": {
+        "events_prompt": WELL_EVENTS_PROMPT,
+        "change_prompt": WELL_CHANGE_EVENTS_PROMPT,
+        "unique_alerts": "2-3",
+        "max_events": "4-6",
+        "events": generate_well_events,
+        "change_events": generate_well_change_events,
+    },
+}
+
+def _fused_events_prompt(events_prompt, change_prompt):
+    # Both prompts are already ChatPromptTemplate text (literal braces escaped)
+    return f"""
+Generate the alert events AND the change events for one incident scenario in a single response.
+Both parts describe the same incident and share the inputs below.
+
+## Part 1: alert events
+{events_prompt}
+## Part 2: change events
+{change_prompt}
+## Output format
+Ignore the output instructions at the end of Parts 1 and 2. Return a single JSON object with exactly two keys:
+- "events": the JSON array of alert events from Part 1
+- "change_events": the JSON array of change events from Part 2
+Return only the JSON object — no code fences.
+"""
+
+def generate_scenario_events(
+    scenario,
+    organization,
+    api_key,
+    itsm_tools,
+    observability_tools,
+    outage_summary,
+    service_names,
+    incident_details,
+    unique_alerts=None,
+    max_events=None,
+    output_path=None,
+    seed=None
+):
+    """
+    Generate the alert events and change events for a major, partial or well scenario.
+    Returns (events, change_events) as lists of post-processed Event objects.
+
+    With OPENAI_FUSED_EVENTS enabled both arrays come from one structured LLM response,
+    sending the shared context once, and are split and post-processed exactly like the
+    standalone generators; a part missing from the fused response is regenerated on its
+    own. Otherwise the standalone event and change-event generators are called in turn.
+    """
+    spec = SCENARIO_EVENT_SPECS[scenario]
+    args = (organization, api_key, itsm_tools, observability_tools, outage_summary, service_names, incident_details)
+    if not fused_events_enabled():
+        events = spec["events"](*args, unique_alerts, max_events, output_path=output_path, seed=seed)
+        return events, spec["change_events"](*args)
+
+    prompt = ChatPromptTemplate.from_template(_fused_events_prompt(spec["events_prompt"], spec["change_prompt"]))
+    llm = get_llm(response_schema="scenario_events", task=f"scenario_events_{scenario}")
+    chain = LLMChain(llm=llm, prompt=prompt, verbose=True)
+    expand_to = expansion_target(max_events, seed)
+    inputs = {
+        "organization": organization,
+        "unique_alerts_input": unique_alerts or spec["unique_alerts"],
+        "max_events_input": spec["max_events"] if expand_to else (max_events or spec["max_events"]),
+        "itsm_tools": itsm_tools,
+        "observability_tools": observability_tools,
+        "service_names": service_names,
+        "outage_summary": outage_summary,
+        "incident_details": incident_details
+    }
+    result = run_json_chain(chain, inputs, expect=dict, label=f"{scenario} scenario events")
+
+    events = pipeline_for("alert").process_all(result.get("events"))
+    if events:
+        if expand_to:
+            events = expand_alert_events(events, expand_to, seed=seed, label=f"{scenario} events")
+        if output_path:
+            write_events_file(output_path, events)
+        events = wrap_events(events)
+    else:
+        logging.warning(f"Fused {scenario} response had no alert events; generating them separately.")
+        events = spec["events"](*args, unique_alerts, max_events, output_path=output_path, seed=seed)
+
+    change_events = pipeline_for("change", scenario).process_events(result.get("change_events"))
+    if not change_events:
+        logging.warning(f"Fused {scenario} response had no change events; generating them separately.")
+        change_events = spec["change_events"](*args)
+    return events, change_events